@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""Benchmark dei percorsi critici di LayerExporter su dati sintetici.
+
+Genera layer sintetici di punti, linee e poligoni (provider memory e GeoPackage) e
+misura i tempi di _union_polygon_geometries, _features_within, _all_features,
+_export_layer e ExportedProjectBuilder.build, riportando feature al secondo, picco di
+memoria (RSS) e dimensione dell'output. I risultati possono essere salvati come
+baseline e confrontati con le esecuzioni successive.
+
+Esempi:
+    python3 benchmark_exporter.py --sizes 10000,100000
+    python3 benchmark_exporter.py --sizes 1000000 --providers gpkg --save-baseline
+    python3 benchmark_exporter.py --sizes 10000000 --geometries point --fail-on-regression
+
+Richiede un'installazione di QGIS (viene avviata una QgsApplication senza interfaccia).
+"""
+
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from qgis.core import (
+    Qgis,
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransformContext,
+    QgsFeature,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsPointXY,
+    QgsProject,
+    QgsRectangle,
+    QgsVectorFileWriter,
+    QgsVectorLayer,
+    QgsWkbTypes,
+)
+from qgis.PyQt.QtCore import QVariant
+
+# Il plugin usa import relativi: viene importato come pacchetto dalla cartella superiore
+plugin_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(plugin_dir))
+PLUGIN_PACKAGE = os.path.basename(plugin_dir)
+
+DEFAULT_BASELINE = os.path.join(plugin_dir, "benchmark_baseline.json")
+
+# Area dei dati sintetici in EPSG:3857 (quadrato di 100 km)
+EXTENT = 100000.0
+CRS = "EPSG:3857"
+GENERATION_BATCH_SIZE = 10000
+COMPLEX_SELECTION_VERTICES = 100000
+
+
+class _RssSampler:
+    """Campiona la memoria residente del processo in un thread separato e ne registra il picco."""
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.peak_bytes = 0
+
+    def __enter__(self):
+        self.peak_bytes = _current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, _current_rss())
+        return False
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self._interval):
+            self.peak_bytes = max(self.peak_bytes, _current_rss())
+
+
+def _current_rss() -> int:
+    """Memoria residente attuale in byte (/proc su Linux, altrimenti il picco del processo)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss è in kB su Linux e in byte su macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _synthetic_fields() -> QgsFields:
+    fields = QgsFields()
+    fields.append(QgsField("id", QVariant.Int))
+    fields.append(QgsField("name", QVariant.String, len=20))
+    fields.append(QgsField("value", QVariant.Double))
+    return fields
+
+
+def _synthetic_geometry(geometry_type: str, rng: random.Random) -> QgsGeometry:
+    x = rng.uniform(0, EXTENT)
+    y = rng.uniform(0, EXTENT)
+    if geometry_type == "point":
+        return QgsGeometry.fromPointXY(QgsPointXY(x, y))
+    if geometry_type == "line":
+        points = [QgsPointXY(x, y)]
+        for _ in range(rng.randint(1, 4)):
+            x += rng.uniform(-200, 200)
+            y += rng.uniform(-200, 200)
+            points.append(QgsPointXY(x, y))
+        return QgsGeometry.fromPolylineXY(points)
+    size = rng.uniform(10, 100)
+    return QgsGeometry.fromRect(QgsRectangle(x, y, x + size, y + size))
+
+
+def _synthetic_features(geometry_type: str, count: int, fields: QgsFields, seed: int = 42):
+    """Genera le feature sintetiche a blocchi, in modo deterministico."""
+    rng = random.Random(seed)
+    batch = []
+    for index in range(count):
+        feature = QgsFeature(fields)
+        feature.setGeometry(_synthetic_geometry(geometry_type, rng))
+        feature.setAttributes([index, f"feature_{index}", rng.random() * 1000])
+        batch.append(feature)
+        if len(batch) >= GENERATION_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_WKB_TYPES = {
+    "point": QgsWkbTypes.Point,
+    "line": QgsWkbTypes.LineString,
+    "polygon": QgsWkbTypes.Polygon,
+}
+
+
+def create_dataset(provider: str, geometry_type: str, count: int, data_directory: str) -> QgsVectorLayer:
+    """Crea (o riutilizza, per i GeoPackage) un layer sintetico."""
+    name = f"synthetic_{geometry_type}_{count}"
+    fields = _synthetic_fields()
+
+    if provider == "memory":
+        uri = f"{QgsWkbTypes.displayString(_WKB_TYPES[geometry_type])}?crs={CRS}"
+        layer = QgsVectorLayer(uri, name, "memory")
+        layer.dataProvider().addAttributes(fields.toList())
+        layer.updateFields()
+        for batch in _synthetic_features(geometry_type, count, layer.fields()):
+            layer.dataProvider().addFeatures(batch)
+        layer.updateExtents()
+        return layer
+
+    path = os.path.join(data_directory, f"{name}.gpkg")
+    if not os.path.exists(path):
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = "GPKG"
+        options.layerName = name
+        writer = QgsVectorFileWriter.create(
+            path,
+            fields,
+            _WKB_TYPES[geometry_type],
+            QgsCoordinateReferenceSystem(CRS),
+            QgsCoordinateTransformContext(),
+            options,
+        )
+        for batch in _synthetic_features(geometry_type, count, fields):
+            writer.addFeatures(batch)
+        del writer
+    layer = QgsVectorLayer(f"{path}|layername={name}", name, "ogr")
+    if not layer.isValid():
+        raise RuntimeError(f"Impossibile aprire il dataset sintetico {path}")
+    return layer
+
+
+def _star_polygon(center_x: float, center_y: float, radius: float, vertices: int) -> QgsGeometry:
+    """Poligono a stella con il numero di vertici indicato (selezione complessa)."""
+    points = []
+    for index in range(vertices):
+        angle = 2 * math.pi * index / vertices
+        current_radius = radius * (0.8 if index % 2 else 1.0)
+        points.append(QgsPointXY(center_x + current_radius * math.cos(angle), center_y + current_radius * math.sin(angle)))
+    return QgsGeometry.fromPolygonXY([points])
+
+
+def create_selection(kind: str) -> QgsVectorLayer:
+    """Layer di poligoni di selezione: quattro quadrati sovrapposti oppure due stelle da 100k vertici."""
+    layer = QgsVectorLayer(f"Polygon?crs={CRS}", f"selection_{kind}", "memory")
+    if kind == "simple":
+        quarter = EXTENT / 4
+        geometries = [
+            QgsGeometry.fromRect(QgsRectangle(x, y, x + quarter * 1.1, y + quarter * 1.1))
+            for x in (quarter, 2 * quarter)
+            for y in (quarter, 2 * quarter)
+        ]
+    else:
+        geometries = [
+            _star_polygon(EXTENT * 0.45, EXTENT / 2, EXTENT / 4, COMPLEX_SELECTION_VERTICES),
+            _star_polygon(EXTENT * 0.55, EXTENT / 2, EXTENT / 4, COMPLEX_SELECTION_VERTICES),
+        ]
+    features = []
+    for geometry in geometries:
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(geometry)
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    layer.updateExtents()
+    return layer
+
+
+@contextmanager
+def _measure(results: List[dict], case: str, function: str):
+    """Misura tempo e picco di memoria del blocco; il blocco valorizza features e output_bytes."""
+    metrics = {"features": 0, "output_bytes": None}
+    with _RssSampler() as sampler:
+        start = time.perf_counter()
+        yield metrics
+        seconds = time.perf_counter() - start
+
+    features = metrics["features"]
+    result = {
+        "id": f"{function}[{case}]",
+        "function": function,
+        "case": case,
+        "seconds": round(seconds, 4),
+        "features": features,
+        "features_per_second": round(features / seconds, 1) if features and seconds > 0 else None,
+        "peak_rss_mb": round(sampler.peak_bytes / (1024 * 1024), 1),
+        "output_bytes": metrics["output_bytes"],
+    }
+    results.append(result)
+    print(_format_result(result), flush=True)
+
+
+def _format_result(result: dict) -> str:
+    throughput = f"{result['features_per_second']:>12,.0f} f/s" if result["features_per_second"] else " " * 16
+    output = f"{result['output_bytes'] / (1024 * 1024):>9.1f} MB" if result["output_bytes"] else " " * 12
+    return (
+        f"{result['id']:<62} {result['seconds']:>9.3f} s {throughput} "
+        f"{result['peak_rss_mb']:>9.1f} MB RSS {output}"
+    )
+
+
+def _output_size(uri: Optional[str]) -> Optional[int]:
+    if not uri:
+        return None
+    path = uri.split("|", 1)[0]
+    return os.path.getsize(path) if os.path.exists(path) else None
+
+
+def run_benchmarks(args, work_directory: str) -> List[dict]:
+    exporter_module = importlib.import_module(f"{PLUGIN_PACKAGE}.exporter")
+    # Il progetto viene creato direttamente dal builder, senza istanziare il plugin (che richiede l'interfaccia)
+    project_builder_module = importlib.import_module(f"{PLUGIN_PACKAGE}.project_builder")
+    LayerExporter = exporter_module.LayerExporter
+
+    data_directory = args.data_directory or os.path.join(work_directory, "data")
+    output_directory = os.path.join(work_directory, "output")
+    os.makedirs(data_directory, exist_ok=True)
+    os.makedirs(output_directory, exist_ok=True)
+
+    results: List[dict] = []
+    selections = {kind: create_selection(kind) for kind in args.selections}
+    exported_data = []
+
+    for provider in args.providers:
+        for geometry_type in args.geometries:
+            for size in args.sizes:
+                dataset_case = f"{provider}/{geometry_type}/{size}"
+                print(f"Generazione dataset {dataset_case}...", flush=True)
+                layer = create_dataset(provider, geometry_type, size, data_directory)
+                QgsProject.instance().addMapLayer(layer)
+
+                exporter = LayerExporter(None, [], [layer], output_directory, f"{provider}_{geometry_type}_{size}")
+                prepared = LayerExporter.prepare_layers([layer])[layer.id()]
+                with _measure(results, dataset_case, "_all_features") as metrics:
+                    metrics["features"] = sum(1 for _ in exporter._all_features(layer, prepared))
+
+                for kind, selection_layer in selections.items():
+                    case = f"{dataset_case}/{kind}"
+                    polygon_features = list(selection_layer.getFeatures())
+                    exporter = LayerExporter(
+                        selection_layer,
+                        polygon_features,
+                        [layer],
+                        output_directory,
+                        f"{provider}_{geometry_type}_{size}_{kind}",
+                        bulk_load=args.bulk_load,
+                    )
+
+                    # La cache dell'unione falserebbe le misure successive alla prima
+                    exporter_module._union_cache.clear()
+                    with _measure(results, case, "_union_polygon_geometries") as metrics:
+                        union_geom = exporter._union_polygon_geometries()
+                        metrics["features"] = len(polygon_features)
+
+                    selection = exporter._selection_for_crs(layer.crs(), union_geom)
+                    with _measure(results, case, "_features_within") as metrics:
+                        metrics["features"] = sum(1 for _ in exporter._features_within(layer, prepared, selection))
+
+                    counted = {"features": 0}
+
+                    def counting(features):
+                        for feature in features:
+                            counted["features"] += 1
+                            yield feature
+
+                    with _measure(results, case, "_export_layer") as metrics:
+                        uri = exporter._export_layer(
+                            layer,
+                            counting(exporter._features_within(layer, prepared, selection)),
+                            output_name=layer.name(),
+                        )
+                        metrics["features"] = counted["features"]
+                        metrics["output_bytes"] = _output_size(uri)
+                    if uri:
+                        exported_data.append((uri, layer))
+
+    if exported_data:
+        project_directory = os.path.join(output_directory, "project")
+        os.makedirs(project_directory, exist_ok=True)
+        with _measure(results, f"{len(exported_data)} layers", "ExportedProjectBuilder.build") as metrics:
+            builder = project_builder_module.ExportedProjectBuilder(QgsProject.instance())
+            builder.build(exported_data, project_directory)
+            project_files = [name for name in os.listdir(project_directory) if name.endswith(".qgz")]
+            metrics["features"] = len(exported_data)
+            metrics["output_bytes"] = sum(
+                os.path.getsize(os.path.join(project_directory, name)) for name in project_files
+            )
+
+    QgsProject.instance().removeAllMapLayers()
+    return results
+
+
+def compare_with_baseline(results: List[dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Stampa le variazioni rispetto alla baseline e restituisce i casi peggiorati oltre la tolleranza."""
+    regressions = []
+    print("\nConfronto con la baseline:")
+    for result in results:
+        reference = baseline.get(result["id"])
+        if not reference or not reference.get("seconds"):
+            print(f"  {result['id']:<62} (nessuna baseline)")
+            continue
+        change = (result["seconds"] - reference["seconds"]) / reference["seconds"]
+        marker = ""
+        if change > tolerance:
+            marker = "  << PEGGIORATO"
+            regressions.append(result["id"])
+        print(f"  {result['id']:<62} {reference['seconds']:>9.3f} s -> {result['seconds']:>9.3f} s ({change:+.1%}){marker}")
+    return regressions
+
+
+def _csv_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in _csv_list(value)], default=[10000, 100000],
+                        help="Numero di feature dei dataset sintetici (es. 10000,1000000,10000000)")
+    parser.add_argument("--geometries", type=_csv_list, default=["point", "line", "polygon"])
+    parser.add_argument("--providers", type=_csv_list, default=["memory", "gpkg"])
+    parser.add_argument("--selections", type=_csv_list, default=["simple", "complex"])
+    parser.add_argument("--bulk-load", action="store_true", help="Usa il profilo di scrittura bulk load")
+    parser.add_argument("--data-directory", help="Cartella in cui conservare i GeoPackage sintetici tra le esecuzioni")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="File JSON della baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="Salva i risultati come nuova baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Peggioramento ammesso (0.15 = 15%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Esce con codice 1 se un caso peggiora")
+    parser.add_argument("--json", help="Scrive i risultati in questo file JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_arguments(argv)
+
+    app = QgsApplication([], False)
+    app.initQgis()
+    work_directory = tempfile.mkdtemp(prefix="export_layers_benchmark_")
+    try:
+        results = run_benchmarks(args, work_directory)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(results, json_file, indent=2)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file).get("results", {})
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        baseline = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "qgis_version": Qgis.QGIS_VERSION,
+            "results": {result["id"]: result for result in results},
+        }
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print(f"\nBaseline salvata in {args.baseline}")
+
+    app.exitQgis()
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
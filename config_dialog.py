@@ -9,16 +9,20 @@ from qgis.PyQt.QtWidgets import (
     QDialog,
     QDialogButtonBox,
     QFileDialog,
+    QGroupBox,
     QHBoxLayout,
     QLabel,
     QLineEdit,
     QPushButton,
+    QSpinBox,
     QVBoxLayout,
 )
 
 from qgis.PyQt.QtCore import QCoreApplication
 from qgis.core import QgsMapLayer, QgsProject, QgsWkbTypes
 
+from .export_logger import LOG_LEVEL_DEBUG, LOG_LEVEL_INFO
+
 
 class ConfigDialog(QDialog):
     """Dialog per selezionare il layer poligonale di riferimento."""
@@ -27,7 +31,7 @@ class ConfigDialog(QDialog):
         """Traduzione delle stringhe."""
         return QCoreApplication.translate("ConfigDialog", message)
 
-    def __init__(self, parent=None, current_layer_id: Optional[str] = None, current_output_dir: Optional[str] = None, logging_enabled: bool = True) -> None:
+    def __init__(self, parent=None, current_layer_id: Optional[str] = None, current_output_dir: Optional[str] = None, logging_enabled: bool = True, export_options: Optional[dict] = None, log_level: str = LOG_LEVEL_INFO, show_export_plan: bool = True) -> None:
         super().__init__(parent)
         self.setWindowTitle(self.tr("Export Layers Within Area Configuration"))
 
@@ -54,6 +58,128 @@ class ConfigDialog(QDialog):
         self._logging_checkbox.setChecked(logging_enabled)
         self._logging_checkbox.setToolTip(self.tr("Enable/disable detailed log messages during export"))
 
+        self._log_level_combo = QComboBox(self)
+        self._log_level_combo.addItem(self.tr("Normal"), LOG_LEVEL_INFO)
+        self._log_level_combo.addItem(self.tr("Debug"), LOG_LEVEL_DEBUG)
+        self._log_level_combo.setCurrentIndex(max(0, self._log_level_combo.findData(log_level)))
+        self._log_level_combo.setEnabled(logging_enabled)
+        self._logging_checkbox.toggled.connect(self._log_level_combo.setEnabled)
+        logging_layout = QHBoxLayout()
+        logging_layout.addWidget(self._logging_checkbox)
+        logging_layout.addStretch()
+        logging_layout.addWidget(QLabel(self.tr("Log level:")))
+        logging_layout.addWidget(self._log_level_combo)
+
+        self._export_plan_checkbox = QCheckBox(self.tr("Show the export plan with estimates before exporting"), self)
+        self._export_plan_checkbox.setChecked(show_export_plan)
+
+        # Opzioni avanzate di esportazione
+        export_options = export_options or {}
+        self._server_side_filter_checkbox = QCheckBox(self.tr("Run the spatial filter on the database server"), self)
+        self._server_side_filter_checkbox.setChecked(export_options.get("server_side_filter", False))
+        self._server_side_filter_checkbox.setToolTip(
+            self.tr("For PostGIS and SpatiaLite layers, only features actually intersecting the selection are transferred")
+        )
+
+        self._parallel_layers_spin = QSpinBox(self)
+        self._parallel_layers_spin.setRange(1, 16)
+        self._parallel_layers_spin.setValue(export_options.get("max_parallel_layers", 4))
+        self._parallel_layers_spin.setToolTip(
+            self.tr("Number of layers exported at the same time, each to its own file")
+        )
+        parallel_layout = QHBoxLayout()
+        parallel_layout.addWidget(QLabel(self.tr("Layers exported in parallel:")))
+        parallel_layout.addWidget(self._parallel_layers_spin)
+
+        self._connections_per_host_spin = QSpinBox(self)
+        self._connections_per_host_spin.setRange(1, 16)
+        self._connections_per_host_spin.setValue(export_options.get("max_connections_per_host", 3))
+        self._connections_per_host_spin.setToolTip(
+            self.tr("Maximum number of layers read at the same time from the same database server")
+        )
+        connections_layout = QHBoxLayout()
+        connections_layout.addWidget(QLabel(self.tr("Parallel queries per database server:")))
+        connections_layout.addWidget(self._connections_per_host_spin)
+
+        self._single_geopackage_checkbox = QCheckBox(self.tr("Write all layers into a single GeoPackage"), self)
+        self._single_geopackage_checkbox.setChecked(export_options.get("single_geopackage", False))
+        self._single_geopackage_checkbox.setToolTip(
+            self.tr("Faster for exports with many small layers; layers are then written one at a time")
+        )
+
+        self._bulk_load_checkbox = QCheckBox(self.tr("Fast bulk load (build spatial index at the end)"), self)
+        self._bulk_load_checkbox.setChecked(export_options.get("bulk_load", False))
+        self._bulk_load_checkbox.setToolTip(
+            self.tr("Writes in large transactions with relaxed SQLite durability and builds the spatial index in one pass")
+        )
+
+        self._incremental_checkbox = QCheckBox(self.tr("Reuse outputs of layers unchanged since the previous export"), self)
+        self._incremental_checkbox.setChecked(export_options.get("incremental", False))
+        self._incremental_checkbox.setToolTip(
+            self.tr("Applies when exporting again into a folder with the same name")
+        )
+        self._change_tracking_field_edit = QLineEdit(self)
+        self._change_tracking_field_edit.setText(export_options.get("change_tracking_field", "updated_at"))
+        self._change_tracking_field_edit.setToolTip(
+            self.tr("Field holding the last modification time of database records")
+        )
+        self._change_tracking_field_edit.setEnabled(self._incremental_checkbox.isChecked())
+        self._incremental_checkbox.toggled.connect(self._change_tracking_field_edit.setEnabled)
+        change_tracking_layout = QHBoxLayout()
+        change_tracking_layout.addWidget(QLabel(self.tr("Last modification field:")))
+        change_tracking_layout.addWidget(self._change_tracking_field_edit)
+
+        self._clip_rasters_checkbox = QCheckBox(self.tr("Clip file-based raster layers to the selection"), self)
+        self._clip_rasters_checkbox.setChecked(export_options.get("clip_rasters", True))
+        self._clip_rasters_checkbox.setToolTip(
+            self.tr("Writes a compressed tiled GeoTIFF with overviews instead of referencing the original raster")
+        )
+
+        self._tile_cache_checkbox = QCheckBox(self.tr("Download XYZ tiles of the area for offline use"), self)
+        self._tile_cache_checkbox.setChecked(export_options.get("tile_cache", False))
+        self._tile_cache_checkbox.setToolTip(
+            self.tr("Tiles intersecting the selection are stored in an MBTiles file used by the exported project")
+        )
+        self._tile_min_zoom_spin = QSpinBox(self)
+        self._tile_min_zoom_spin.setRange(0, 22)
+        self._tile_min_zoom_spin.setValue(export_options.get("tile_cache_min_zoom", 10))
+        self._tile_max_zoom_spin = QSpinBox(self)
+        self._tile_max_zoom_spin.setRange(0, 22)
+        self._tile_max_zoom_spin.setValue(export_options.get("tile_cache_max_zoom", 17))
+        self._tile_min_zoom_spin.valueChanged.connect(self._tile_max_zoom_spin.setMinimum)
+        self._tile_max_zoom_spin.setMinimum(self._tile_min_zoom_spin.value())
+        tile_zoom_layout = QHBoxLayout()
+        tile_zoom_layout.addWidget(QLabel(self.tr("Zoom levels:")))
+        tile_zoom_layout.addWidget(self._tile_min_zoom_spin)
+        tile_zoom_layout.addWidget(QLabel("-"))
+        tile_zoom_layout.addWidget(self._tile_max_zoom_spin)
+        for widget in (self._tile_min_zoom_spin, self._tile_max_zoom_spin):
+            widget.setEnabled(self._tile_cache_checkbox.isChecked())
+            self._tile_cache_checkbox.toggled.connect(widget.setEnabled)
+
+        self._related_tables_checkbox = QCheckBox(
+            self.tr("Export only table rows related to the exported features"), self
+        )
+        self._related_tables_checkbox.setChecked(export_options.get("related_tables_only", True))
+        self._related_tables_checkbox.setToolTip(
+            self.tr("Tables without geometry that are children of a project relation keep only the rows "
+                    "referencing the exported parent features")
+        )
+
+        advanced_box = QGroupBox(self.tr("Advanced options"), self)
+        advanced_layout = QVBoxLayout(advanced_box)
+        advanced_layout.addWidget(self._server_side_filter_checkbox)
+        advanced_layout.addWidget(self._related_tables_checkbox)
+        advanced_layout.addLayout(parallel_layout)
+        advanced_layout.addLayout(connections_layout)
+        advanced_layout.addWidget(self._single_geopackage_checkbox)
+        advanced_layout.addWidget(self._bulk_load_checkbox)
+        advanced_layout.addWidget(self._incremental_checkbox)
+        advanced_layout.addLayout(change_tracking_layout)
+        advanced_layout.addWidget(self._clip_rasters_checkbox)
+        advanced_layout.addWidget(self._tile_cache_checkbox)
+        advanced_layout.addLayout(tile_zoom_layout)
+
         buttons = QDialogButtonBox(
             QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel,
             self,
@@ -66,7 +192,9 @@ class ConfigDialog(QDialog):
         layout.addWidget(self._combo)
         layout.addWidget(QLabel(self.tr("Export folder:")))
         layout.addLayout(output_dir_layout)
-        layout.addWidget(self._logging_checkbox)
+        layout.addLayout(logging_layout)
+        layout.addWidget(self._export_plan_checkbox)
+        layout.addWidget(advanced_box)
         layout.addWidget(buttons)
 
     def _build_layer_list(self, current_layer_id: Optional[str]) -> None:
@@ -102,6 +230,29 @@ class ConfigDialog(QDialog):
     def logging_enabled(self) -> bool:
         return self._logging_checkbox.isChecked()
 
+    def log_level(self) -> str:
+        return self._log_level_combo.currentData()
+
+    def show_export_plan(self) -> bool:
+        return self._export_plan_checkbox.isChecked()
+
+    def export_options(self) -> dict:
+        """Restituisce le opzioni avanzate di esportazione selezionate."""
+        return {
+            "server_side_filter": self._server_side_filter_checkbox.isChecked(),
+            "max_parallel_layers": self._parallel_layers_spin.value(),
+            "max_connections_per_host": self._connections_per_host_spin.value(),
+            "single_geopackage": self._single_geopackage_checkbox.isChecked(),
+            "bulk_load": self._bulk_load_checkbox.isChecked(),
+            "incremental": self._incremental_checkbox.isChecked(),
+            "change_tracking_field": self._change_tracking_field_edit.text().strip(),
+            "clip_rasters": self._clip_rasters_checkbox.isChecked(),
+            "tile_cache": self._tile_cache_checkbox.isChecked(),
+            "tile_cache_min_zoom": self._tile_min_zoom_spin.value(),
+            "tile_cache_max_zoom": self._tile_max_zoom_spin.value(),
+            "related_tables_only": self._related_tables_checkbox.isChecked(),
+        }
+
     def _choose_output_dir(self) -> None:
         directory = QFileDialog.getExistingDirectory(
             self, self.tr("Select destination folder"), self._output_dir_edit.text()
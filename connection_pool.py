@@ -0,0 +1,160 @@
+"""Raggruppamento dei layer per connessione al database e limiti di concorrenza per server."""
+
+import contextlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from qgis.core import QgsDataSourceUri, QgsMapLayer, QgsProviderConnectionException, QgsProviderRegistry
+
+# Provider i cui layer condividono connessioni a un server di database
+DATABASE_PROVIDERS = ("postgres", "mssql", "oracle", "hana")
+
+# Query minima con cui verificare una connessione, nel dialetto SQL di ciascun provider
+_PROBE_QUERIES = {
+    "postgres": "SELECT 1",
+    "mssql": "SELECT 1",
+    "oracle": "SELECT 1 FROM DUAL",
+    "hana": "SELECT 1 FROM DUMMY",
+}
+
+# Secondi di attesa massima per la verifica di una connessione
+CONNECTION_CHECK_TIMEOUT = 10.0
+
+# Verifiche di connessione eseguite contemporaneamente
+CONNECTION_CHECK_WORKERS = 8
+
+
+def connection_key(layer: QgsMapLayer) -> Optional[Tuple[str, ...]]:
+    """Identifica la connessione al database del layer (server, database, utente), senza la tabella.
+
+    Restituisce None per i layer che non sono su un database.
+    """
+    if layer.type() != QgsMapLayer.VectorLayer or layer.providerType() not in DATABASE_PROVIDERS:
+        return None
+    uri = QgsDataSourceUri(layer.source())
+    return (
+        layer.providerType(),
+        uri.service(),
+        uri.host(),
+        uri.port(),
+        uri.database(),
+        uri.username(),
+        uri.authConfigId(),
+    )
+
+
+def host_key(layer: QgsMapLayer) -> Optional[Tuple[str, ...]]:
+    """Identifica il server di database del layer, oppure None per i layer non su database."""
+    key = connection_key(layer)
+    if key is None:
+        return None
+    provider, service, host, port = key[:4]
+    return provider, service, host, port
+
+
+def group_layers_by_connection(layers: Iterable[QgsMapLayer]) -> Dict[Optional[Tuple[str, ...]], List[QgsMapLayer]]:
+    """Raggruppa i layer per connessione; i layer non su database sono sotto la chiave None."""
+    groups: Dict[Optional[Tuple[str, ...]], List[QgsMapLayer]] = {}
+    for layer in layers:
+        groups.setdefault(connection_key(layer), []).append(layer)
+    return groups
+
+
+def interleave_by_host(layers: Iterable[QgsMapLayer]) -> List[QgsMapLayer]:
+    """Ordina i layer alternando i server, così le esportazioni parallele si distribuiscono
+    sui diversi database invece di attendere tutte il limite dello stesso server."""
+    queues: Dict[Optional[Tuple[str, ...]], List[QgsMapLayer]] = {}
+    for layer in layers:
+        queues.setdefault(host_key(layer), []).append(layer)
+
+    ordered = []
+    queues_list = list(queues.values())
+    while queues_list:
+        for queue in queues_list:
+            ordered.append(queue.pop(0))
+        queues_list = [queue for queue in queues_list if queue]
+    return ordered
+
+
+class HostConcurrencyLimiter:
+    """Limita il numero di letture contemporanee verso lo stesso server di database."""
+
+    def __init__(self, max_per_host: int) -> None:
+        self.max_per_host = max(1, int(max_per_host))
+        self._semaphores: Dict[Tuple[str, ...], threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def slot(self, layer: QgsMapLayer):
+        """Context manager che occupa uno slot del server del layer (nessun limite per i file)."""
+        key = host_key(layer)
+        if key is None:
+            return contextlib.nullcontext()
+        with self._lock:
+            semaphore = self._semaphores.get(key)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_per_host)
+                self._semaphores[key] = semaphore
+        return semaphore
+
+
+def _check_connection(layer: QgsMapLayer) -> Optional[str]:
+    """Esegue una query minima sulla connessione del layer; restituisce l'errore o None."""
+    probe_query = _PROBE_QUERIES.get(layer.providerType())
+    metadata = QgsProviderRegistry.instance().providerMetadata(layer.providerType())
+    try:
+        connection = (
+            metadata.createConnection(layer.source(), {})
+            if metadata is not None and probe_query is not None
+            else None
+        )
+    except QgsProviderConnectionException:
+        connection = None
+
+    if connection is None:
+        # Provider senza API di connessione o senza query di prova: il conteggio delle
+        # feature verifica l'accesso
+        if layer.featureCount() < 0:  # -1 indica errore
+            return "conteggio features fallito"
+        return None
+
+    try:
+        connection.executeSql(probe_query)
+    except QgsProviderConnectionException as e:
+        return str(e)
+    return None
+
+
+def check_connections(
+    layers: Iterable[QgsMapLayer], timeout: float = CONNECTION_CHECK_TIMEOUT
+) -> Dict[Tuple[str, ...], Tuple[List[QgsMapLayer], str]]:
+    """Verifica in parallelo una sola volta ogni connessione usata dai layer.
+
+    Returns:
+        Connessione -> (layer che la usano, descrizione del problema) per le sole
+        connessioni non raggiungibili o che non rispondono entro timeout secondi
+    """
+    groups = {key: group for key, group in group_layers_by_connection(layers).items() if key is not None}
+    if not groups:
+        return {}
+
+    problems = {}
+    executor = ThreadPoolExecutor(max_workers=min(CONNECTION_CHECK_WORKERS, len(groups)))
+    try:
+        futures = {key: executor.submit(_check_connection, group[0]) for key, group in groups.items()}
+        # Le verifiche sono avviate insieme e condividono la stessa scadenza
+        deadline = time.monotonic() + timeout
+        for key, future in futures.items():
+            try:
+                error = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                error = f"nessuna risposta entro {timeout:.0f} secondi"
+            except Exception as e:
+                error = str(e)
+            if error:
+                problems[key] = (groups[key], error)
+    finally:
+        # Una verifica bloccata non deve trattenere l'interfaccia
+        executor.shutdown(wait=False)
+    return problems
@@ -1,30 +1,61 @@
 """Plugin QGIS per esportare layer all'interno di un poligono selezionato."""
 
+import json
 import os
-from typing import List, Optional, Tuple, Union, Iterable
+from typing import Dict, List, Optional, Tuple, Union, Iterable
 
-from qgis.PyQt.QtCore import QCoreApplication, QSettings, QTranslator, QLocale
+from qgis.PyQt.QtCore import QCoreApplication, QEventLoop, QSettings, QTranslator, QLocale, Qt
 from qgis.PyQt.QtGui import QIcon
-from qgis.PyQt.QtWidgets import QAction, QMessageBox, QProgressBar, QPushButton
+from qgis.PyQt.QtWidgets import QAction, QMessageBox, QProgressBar, QProgressDialog, QPushButton
 
-from qgis.core import Qgis, QgsFeatureRequest, QgsMessageLog, QgsProject, QgsVectorLayer, QgsLayerTreeGroup, QgsLayerTreeLayer, QgsLayerTree, QgsRasterLayer, QgsMapLayer, QgsMapSettings, QgsReferencedRectangle, QgsBrightnessContrastFilter, QgsApplication, QgsRelation, QgsRelationManager
+from qgis.core import Qgis, QgsFeatureRequest, QgsGeometry, QgsProject, QgsVectorLayer, QgsLayerTreeLayer, QgsRasterLayer, QgsMapLayer, QgsMapSettings, QgsReferencedRectangle, QgsBrightnessContrastFilter, QgsApplication, QgsRelation, QgsRelationManager
 
 from .config_dialog import ConfigDialog
+from .connection_pool import check_connections
+from .export_logger import LOG_LEVEL_INFO, ExportLogger
+from .export_plan import EstimateTask, ExportStatistics, LayerEstimator
 from .exporter import ExportError, LayerExporter
 from .export_worker import ExportWorker
 from .main_dialog import MainDialog
+from .plan_dialog import ExportPlanDialog
+from .project_builder import ExportedProjectBuilder, ProjectBuildError
 
 
 class ExportLayersWithinAreaPlugin:
     """Classe principale del plugin."""
 
+    # Opzioni avanzate di esportazione: chiave nelle impostazioni (e argomento di
+    # LayerExporter) -> valore predefinito, il cui tipo guida la lettura da QSettings
+    EXPORT_OPTION_DEFAULTS = {
+        "server_side_filter": False,
+        "max_parallel_layers": 4,
+        "max_connections_per_host": 3,
+        "single_geopackage": False,
+        "bulk_load": False,
+        "incremental": False,
+        "change_tracking_field": "updated_at",
+        "clip_rasters": True,
+        "tile_cache": False,
+        "tile_cache_min_zoom": 10,
+        "tile_cache_max_zoom": 17,
+        "related_tables_only": True,
+    }
+
     def __init__(self, iface) -> None:
         self.iface = iface
         self.plugin_dir = os.path.dirname(__file__)
         self.actions: List[QAction] = []
         self.menu = self.tr("&Export Layers Within Area")
-        self.toolbar = self.iface.addToolBar("Export Layers Within Area")
-        self.toolbar.setObjectName("ExportLayersWithinAreaToolbar")
+        self.toolbar = None
+        self.processing_provider = None
+        if self.iface is not None:
+            # Senza interfaccia (qgis_process) viene caricato solo il provider Processing
+            self.toolbar = self.iface.addToolBar("Export Layers Within Area")
+            self.toolbar.setObjectName("ExportLayersWithinAreaToolbar")
+
+        # Impostazioni di log lette una volta (e di nuovo al salvataggio della configurazione);
+        # fuori dall'esportazione i messaggi vengono scritti subito
+        self._logger = ExportLogger.from_settings(flush_size=1)
 
         # Attributi per il progresso
         self.progress_bar = None
@@ -99,10 +130,19 @@ class ExportLayersWithinAreaPlugin:
 
         self._log_message("Nessun file di traduzione trovato, uso lingua inglese di default", Qgis.Warning)
 
+    def initProcessing(self) -> None:
+        """Registra il provider Processing (chiamato anche da qgis_process, senza interfaccia)."""
+        from .processing_provider import ExportLayersWithinAreaProvider
+
+        self.processing_provider = ExportLayersWithinAreaProvider()
+        QgsApplication.processingRegistry().addProvider(self.processing_provider)
+
     def initGui(self) -> None:
         # Carica le traduzioni
         self._load_translations()
 
+        self.initProcessing()
+
         # Icona esportazione personalizzata
         export_icon_path = os.path.join(self.plugin_dir, "icons", "export_map.svg")
         export_action = QAction(QIcon(export_icon_path), self.tr("Export layers within selected area"), self.iface.mainWindow())
@@ -124,12 +164,18 @@ class ExportLayersWithinAreaPlugin:
             self.iface.removePluginMenu(self.menu, action)
             self.toolbar.removeAction(action)
         del self.toolbar
+        if self.processing_provider is not None:
+            QgsApplication.processingRegistry().removeProvider(self.processing_provider)
+            self.processing_provider = None
 
     def open_configuration(self) -> None:
         current_layer_id = self._configured_polygon_layer_id()
         current_output_dir = self._output_directory()
         current_logging_enabled = self._logging_enabled()
-        dialog = ConfigDialog(self.iface.mainWindow(), current_layer_id, current_output_dir, current_logging_enabled)
+        dialog = ConfigDialog(
+            self.iface.mainWindow(), current_layer_id, current_output_dir, current_logging_enabled, self._export_options(),
+            self._settings().value("log_level", LOG_LEVEL_INFO, type=str), self._show_export_plan(),
+        )
         if dialog.exec_() == dialog.Accepted:
             layer_id = dialog.selected_layer_id()
             output_dir = dialog.output_directory()
@@ -139,7 +185,12 @@ class ExportLayersWithinAreaPlugin:
                 settings.setValue("polygon_layer_id", layer_id)
                 settings.setValue("output_directory", output_dir)
                 settings.setValue("logging_enabled", logging_enabled)
+                settings.setValue("log_level", dialog.log_level())
+                settings.setValue("show_export_plan", dialog.show_export_plan())
+                for key, value in dialog.export_options().items():
+                    settings.setValue(key, value)
                 settings.sync()
+                self._logger = ExportLogger.from_settings(flush_size=1)
                 QMessageBox.information(
                     self.iface.mainWindow(), self.tr("Configuration"), self.tr("Settings saved successfully."),
                 )
@@ -164,7 +215,10 @@ class ExportLayersWithinAreaPlugin:
             return
         
         previously_selected_layer_ids = self._selected_layers_ids_for_export()
-        dialog = MainDialog(self.iface.mainWindow(), polygon_layer, previously_selected_layer_ids, self._logging_enabled(), self._last_export_mode())
+        dialog = MainDialog(
+            self.iface.mainWindow(), polygon_layer, previously_selected_layer_ids, ExportLogger.from_settings(),
+            self._last_export_mode(), self._field_selection_for_export(),
+        )
         if dialog.exec_() != dialog.Accepted:
             return
 
@@ -174,7 +228,7 @@ class ExportLayersWithinAreaPlugin:
         self._save_export_mode(export_mode)
 
         features = []
-        if export_mode == "within_area":
+        if export_mode in ("within_area", "atlas"):
             # Modalità tradizionale: esporta solo gli elementi nei poligoni selezionati
             selected_ids = dialog.selected_feature_ids()
             if not selected_ids:
@@ -210,6 +264,7 @@ class ExportLayersWithinAreaPlugin:
             return
 
         self._save_selected_layers_for_export(dialog.layers_to_export())
+        self._save_field_selection_for_export(dialog.field_selection())
 
         # Verifica l'accessibilità dei layer connessi a database prima di iniziare l'esportazione
         db_layers_issues = self._check_database_layers_accessibility(layers)
@@ -227,6 +282,13 @@ class ExportLayersWithinAreaPlugin:
             if reply == QMessageBox.StandardButton.No:
                 return
 
+        # Piano di esportazione: stime per layer, con la possibilità di escludere i più onerosi
+        feature_estimates = {}
+        if self._show_export_plan():
+            layers, feature_estimates = self._review_export_plan(polygon_layer, features, layers, output_directory)
+            if not layers:
+                return
+
         # Controlla se c'è già un'esportazione in corso
         if self.export_worker is not None and self.export_worker.isRunning():
             reply = QMessageBox.question(
@@ -240,254 +302,132 @@ class ExportLayersWithinAreaPlugin:
                 return
 
         # Mostra la barra di progresso
-        mode_text = "tutti gli elementi" if export_mode == "all_features" else "elementi nei poligoni selezionati"
+        mode_text = {
+            "all_features": "tutti gli elementi",
+            "atlas": "per ciascun poligono selezionato",
+        }.get(export_mode, "elementi nei poligoni selezionati")
         self._show_progress(f"Esportazione {mode_text}...")
 
         # Crea il worker thread
         export_directory_name = dialog.export_directory_name()
-        self.export_worker = ExportWorker(polygon_layer, features, layers, output_directory, export_directory_name)
+        export_options = self._export_options()
+        export_options["attribute_subsets"] = dialog.selected_field_subsets()
+        export_options["atlas"] = export_mode == "atlas"
+        self.export_worker = ExportWorker(
+            polygon_layer, features, layers, output_directory, export_directory_name,
+            export_options=export_options,
+            feature_estimates=feature_estimates,
+        )
 
         # Connette i segnali del worker
         self.export_worker.progress_updated.connect(self._on_export_progress)
         self.export_worker.export_finished.connect(self._on_export_finished)
+        self.export_worker.atlas_finished.connect(self._on_atlas_finished)
         self.export_worker.export_error.connect(self._on_export_error)
         self.export_worker.export_cancelled.connect(self._on_export_cancelled)
 
         # Avvia l'esportazione in background
         self.export_worker.start()
 
-    def _create_qgis_project_v2(self, exported_data: List[Tuple[str, QgsMapLayer]], output_directory: str) -> None:
-        """Crea una copia del progetto QGIS corrente e la modifica per contenere solo i layer esportati.
+    def _review_export_plan(
+        self, polygon_layer: QgsVectorLayer, features: List, layers: List[QgsMapLayer], output_directory: str
+    ) -> Tuple[List[QgsMapLayer], Dict[str, int]]:
+        """Mostra il piano di esportazione stimato e restituisce i layer confermati dall'utente
+        con le righe da leggere stimate per layer (id layer -> righe), usate per il progresso.
 
-        APPROCCIO v2.0.0:
-        1. Salva il progetto corrente in una nuova posizione
-        2. Carica il progetto appena salvato
-        3. Rimuove tutti i layer non esportati
-        4. Rimuove i gruppi vuoti
-        5. Salva il progetto modificato
-
-        Args:
-            exported_data: Lista di tuple (percorso_file, layer_originale)
-            output_directory: Directory dove salvare il progetto
+        Restituisce una lista di layer vuota se l'utente annulla.
         """
-        import tempfile
-        import os
-
-        original_project = QgsProject.instance()
-
-        # Crea il nome del file di destinazione
-        current_project_name = original_project.baseName() or "exported_project"
-        qgz_filename = f"{current_project_name}_exported.qgz"
-        final_project_path = os.path.join(output_directory, qgz_filename)
-
-        # PASSO 1: Crea una copia completa del progetto corrente
-        # Salva temporaneamente il progetto originale
-        with tempfile.NamedTemporaryFile(suffix='.qgz', delete=False) as temp_file:
-            temp_path = temp_file.name
-
-        if not original_project.write(temp_path):
-            self._log_message(
-                f"Impossibile salvare il progetto temporaneo: {original_project.error().message()}",
-                Qgis.Critical,
-            )
-            QMessageBox.critical(
-                self.iface.mainWindow(),
-                self.tr("Export Layers Within Area"),
-                self.tr("Errore nel salvataggio temporaneo del progetto."),
-            )
-            return
-
-        # Carica il progetto in un nuovo oggetto (copia completa)
-        new_project = QgsProject()
-        if not new_project.read(temp_path):
-            self._log_message(
-                "Impossibile caricare la copia del progetto",
-                Qgis.Critical,
-            )
-            QMessageBox.critical(
-                self.iface.mainWindow(),
-                self.tr("Export Layers Within Area"),
-                self.tr("Error loading the copied project."),
-            )
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
-            return
-
-        # PASSO 2.5: Identifica quali layer sono stati esportati
-        exported_layer_ids = {original_layer.id() for _, original_layer in exported_data}
-
-        # PASSO 4: Rimuovi tutti i layer che non sono stati esportati
-        layers_to_remove = []
-        for layer_id, layer in new_project.mapLayers().items():
-            if layer_id not in exported_layer_ids:
-                layers_to_remove.append(layer_id)
-
-        layer_names_removed = []
-        for layer_id in layers_to_remove:
-            layer = new_project.mapLayer(layer_id)
-            if layer:
-                layer_names_removed.append(layer.name())
-            new_project.removeMapLayer(layer_id)
-
-        if layer_names_removed:
-            self._log_message(
-                f"Layer rimossi dal progetto esportato: {', '.join(layer_names_removed)}",
-                Qgis.Info,
-            )
+        selection = None
+        if features:
+            # Le stime usano solo la bbox della selezione: non serve l'unione dei poligoni
+            selection = QgsGeometry.collectGeometry([feature.geometry() for feature in features])
+
+        # Conteggi ed estensioni dei layer vengono letti in un task, senza bloccare l'interfaccia
+        estimator = LayerEstimator(layers, selection, polygon_layer.crs(), ExportStatistics(output_directory))
+        if not self._run_estimate_task(estimator):
+            return [], {}
+        estimates = estimator.estimates
+
+        dialog = ExportPlanDialog(
+            self.iface.mainWindow(), estimates, self._export_options()["max_parallel_layers"]
+        )
+        if dialog.exec_() != dialog.Accepted:
+            return [], {}
+        feature_estimates = {
+            estimate.layer.id(): estimate.candidates for estimate in estimates if estimate.candidates is not None
+        }
+        return dialog.selected_layers(), feature_estimates
 
-        # PASSO 5: Aggiorna i datasource dei layer esportati per puntare ai GeoPackage
-        self._update_exported_project_datasources(new_project, exported_data)
+    def _run_estimate_task(self, estimator: LayerEstimator) -> bool:
+        """Esegue i conteggi del piano in un QgsTask con una finestra di avanzamento.
 
-        # PASSO 6: Rimuovi i gruppi vuoti dall'albero dei layer
-        self._remove_empty_groups(new_project.layerTreeRoot())
+        Returns:
+            False se l'utente ha annullato la stima
+        """
+        description = self.tr("Estimating the export plan...")
+        progress_dialog = QProgressDialog(description, self.tr("Cancel"), 0, 100, self.iface.mainWindow())
+        progress_dialog.setWindowTitle(self.tr("Export plan"))
+        progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_dialog.setMinimumDuration(500)
+
+        task = EstimateTask(description, estimator)
+        loop = QEventLoop()
+        task.progressChanged.connect(lambda value: progress_dialog.setValue(int(value)))
+        task.taskCompleted.connect(loop.quit)
+        task.taskTerminated.connect(loop.quit)
+        progress_dialog.canceled.connect(task.cancel)
+
+        QgsApplication.taskManager().addTask(task)
+        loop.exec_()
+
+        # Il task viene eliminato dal gestore: la finestra non deve più riferirsi a esso
+        progress_dialog.canceled.disconnect()
+        progress_dialog.close()
+        return estimator.completed
+
+    def _create_qgis_project_v2(
+        self,
+        exported_data: List[Tuple[str, QgsMapLayer]],
+        output_directory: str,
+        show_message: bool = True,
+        builder: Optional[ExportedProjectBuilder] = None,
+    ) -> bool:
+        """Crea una copia del progetto QGIS corrente che contiene solo i layer esportati.
+
+        Il progetto viene costruito sull'XML del progetto corrente (vedi
+        ExportedProjectBuilder): i layer non esportati vengono rimossi e le sorgenti
+        aggiornate senza ricaricare il progetto, per cui nessun layer del progetto
+        originale viene riconnesso.
 
-        # PASSO 7: Salva il progetto modificato
-        new_project.setFileName(final_project_path)
-        self._log_message(
-            f"Salvataggio progetto modificato in: {final_project_path}",
-            Qgis.Info,
-        )
+        Args:
+            exported_data: Lista di tuple (percorso_file, layer_originale)
+            output_directory: Directory dove salvare il progetto
+            show_message: Mostra nella barra dei messaggi il percorso del progetto creato
+            builder: Builder già creato, per riusare l'XML del progetto su più esportazioni
 
-        if not new_project.write():
-            error_msg = new_project.error().message() or "Errore sconosciuto"
-            self._log_message(
-                f"Impossibile salvare il progetto QGIS modificato: {error_msg}",
-                Qgis.Critical,
-            )
+        Returns:
+            True se il progetto è stato creato
+        """
+        try:
+            if builder is None:
+                builder = ExportedProjectBuilder(QgsProject.instance(), self._logger)
+            project_path = builder.build(exported_data, output_directory)
+        except ProjectBuildError as e:
+            self._log_message(f"Impossibile creare il progetto esportato: {str(e)}", Qgis.Critical)
             QMessageBox.critical(
                 self.iface.mainWindow(),
                 self.tr("Export Layers Within Area"),
                 self.tr("Error saving the modified QGIS project."),
             )
-            return
-
-        # Verifica che il file sia stato creato
-        if os.path.exists(final_project_path):
-            file_size = os.path.getsize(final_project_path)
-            self._log_message(
-                f"Progetto salvato correttamente: {final_project_path} (dimensione: {file_size} bytes)",
-                Qgis.Info,
-            )
-        else:
-            self._log_message(
-                f"ATTENZIONE: File progetto non trovato dopo il salvataggio: {final_project_path}",
-                Qgis.Warning,
-            )
-
-        # Log di completamento
-        num_layers = len(new_project.mapLayers())
-        num_relations = len(new_project.relationManager().relations())
-        self._log_message(
-            f"Progetto v2.0.0 completato - Layer esportati: {len(exported_layer_ids)}, Layer totali: {num_layers}, Relazioni: {num_relations}, File: {qgz_filename}",
-            Qgis.Info,
-        )
-
-        # Rimuovi il file temporaneo
-        try:
-            os.unlink(temp_path)
-        except:
-            pass
+            return False
 
         # Mostra messaggio di successo con percorso del progetto creato
-        self.iface.messageBar().pushSuccess(
-            self.tr("Export Layers Within Area"),
-            self.tr("QGIS project created: {project_path}").format(project_path=final_project_path),
-        )
-
-    def _update_exported_project_datasources(self, exported_project: QgsProject, exported_data: List[Tuple[str, QgsMapLayer]]) -> None:
-        """Aggiorna i datasource dei layer nel progetto esportato per puntare ai GeoPackage esportati.
-
-        Args:
-            exported_project: Il progetto esportato da modificare
-            exported_data: Lista di tuple (percorso_file, layer_originale)
-        """
-        # Crea una mappatura da layer originale a percorso esportato
-        exported_paths = {original_layer.id(): path for path, original_layer in exported_data}
-
-        updated_layers = []
-
-        # Aggiorna i datasource dei layer nel progetto esportato
-        for layer_id, layer in exported_project.mapLayers().items():
-            if layer_id in exported_paths:
-                new_path = exported_paths[layer_id]
-
-                if layer.type() == QgsMapLayer.VectorLayer:
-                    # Aggiorna il datasource del layer vettoriale
-                    old_datasource = layer.source()
-                    layer.setDataSource(new_path, layer.name(), "ogr")
-
-                    if layer.isValid():
-                        updated_layers.append(layer.name())
-                        self._log_message(
-                            f"Datasource aggiornato nel progetto esportato per layer '{layer.name()}': {os.path.basename(new_path)}",
-                            Qgis.Info,
-                        )
-                    else:
-                        # Se l'aggiornamento fallisce, mostra un warning
-                        self._log_message(
-                            f"Impossibile aggiornare datasource per layer '{layer.name()}' nel progetto esportato",
-                            Qgis.Warning,
-                        )
-                        # Ripristina il datasource (anche se potrebbe non funzionare)
-                        layer.setDataSource(old_datasource, layer.name(), layer.providerType())
-
-        if updated_layers:
-            layer_list = ", ".join(updated_layers)
-            self._log_message(
-                f"Progetto esportato aggiornato: {len(updated_layers)} layer ora puntano ai GeoPackage ({layer_list})",
-                Qgis.Info,
+        if show_message:
+            self.iface.messageBar().pushSuccess(
+                self.tr("Export Layers Within Area"),
+                self.tr("QGIS project created: {project_path}").format(project_path=project_path),
             )
-
-    def _remove_empty_groups(self, root_group: QgsLayerTreeGroup) -> None:
-        """Rimuove ricorsivamente i gruppi vuoti dall'albero dei layer.
-
-        Args:
-            root_group: Il gruppo radice da cui iniziare la pulizia
-        """
-        # Lista per tenere traccia dei gruppi da rimuovere
-        groups_to_remove = []
-
-        def collect_empty_groups(group):
-            """Raccoglie ricorsivamente i gruppi vuoti."""
-            for child in group.children():
-                if child.nodeType() == QgsLayerTree.NodeGroup:
-                    # Ricorsione sui sottogruppi
-                    collect_empty_groups(child)
-
-                    # Controlla se questo gruppo è vuoto
-                    if not child.children():
-                        groups_to_remove.append(child)
-                        self._log_message(
-                            f"Gruppo vuoto trovato e contrassegnato per rimozione: {child.name()}",
-                            Qgis.Info,
-                        )
-
-        # Raccogli tutti i gruppi vuoti
-        collect_empty_groups(root_group)
-
-        # Rimuovi i gruppi vuoti (dal più profondo al più superficiale)
-        # Invertiamo l'ordine per rimuovere prima i gruppi più profondi
-        groups_to_remove.reverse()
-
-        for empty_group in groups_to_remove:
-            group_name = empty_group.name()  # Salva il nome prima della rimozione
-            try:
-                # Trova il gruppo padre
-                parent = empty_group.parent()
-                if parent:
-                    # Rimuovi il gruppo dal padre
-                    parent.removeChildNode(empty_group)
-                    self._log_message(
-                        f"Gruppo vuoto rimosso: {group_name}",
-                        Qgis.Info,
-                    )
-            except Exception as e:
-                self._log_message(
-                    f"Errore nella rimozione del gruppo vuoto {group_name}: {str(e)}",
-                    Qgis.Warning,
-                )
+        return True
 
     def _fetch_feature_by_id(self, layer: QgsVectorLayer, feature_id: int):
         request = QgsFeatureRequest().setFilterFid(feature_id)
@@ -516,6 +456,17 @@ class ExportLayersWithinAreaPlugin:
         settings = self._settings()
         return settings.value("logging_enabled", True, type=bool)
 
+    def _show_export_plan(self) -> bool:
+        settings = self._settings()
+        return settings.value("show_export_plan", True, type=bool)
+
+    def _export_options(self) -> dict:
+        settings = self._settings()
+        return {
+            key: settings.value(key, default, type=type(default))
+            for key, default in self.EXPORT_OPTION_DEFAULTS.items()
+        }
+
     def _last_export_mode(self) -> str:
         settings = self._settings()
         return settings.value("last_export_mode", "all_features", type=str)
@@ -527,8 +478,7 @@ class ExportLayersWithinAreaPlugin:
 
     def _log_message(self, message: str, level: Qgis.MessageLevel = Qgis.Info) -> None:
         """Logga un messaggio solo se il logging è abilitato."""
-        if self._logging_enabled():
-            QgsMessageLog.logMessage(message, "ExportLayersWithinArea", level)
+        self._logger.log(message, level)
 
     def _selected_layers_ids_for_export(self) -> List[str]:
         settings = self._settings()
@@ -541,6 +491,20 @@ class ExportLayersWithinAreaPlugin:
         settings.setValue("selected_layers_for_export", ",".join(layer_ids))
         settings.sync()
 
+    def _field_selection_for_export(self) -> Dict[str, List[str]]:
+        settings = self._settings()
+        # La selezione dei campi è salvata come JSON: id layer -> nomi dei campi
+        try:
+            selection = json.loads(settings.value("selected_fields_for_export", "{}") or "{}")
+        except ValueError:
+            return {}
+        return selection if isinstance(selection, dict) else {}
+
+    def _save_field_selection_for_export(self, selection: Dict[str, List[str]]) -> None:
+        settings = self._settings()
+        settings.setValue("selected_fields_for_export", json.dumps(selection))
+        settings.sync()
+
     def _settings(self) -> QSettings:
         return QSettings("ExportLayersWithinArea", "Plugin")
 
@@ -613,6 +577,39 @@ class ExportLayersWithinAreaPlugin:
         # Crea il progetto QGIS usando il nuovo approccio v2.0.0
         self._create_qgis_project_v2(exported_data, export_directory)
 
+    def _on_atlas_finished(self, atlas_results: List[Tuple[str, List[Tuple[str, QgsMapLayer]]]], export_directory: str) -> None:
+        """Gestisce il completamento di un'esportazione in modalità atlante: un progetto per area."""
+        self._hide_progress()
+
+        if self.export_worker is not None:
+            self.export_worker = None
+
+        # L'XML del progetto viene letto una sola volta per tutte le aree
+        builder = None
+        try:
+            builder = ExportedProjectBuilder(QgsProject.instance(), self._logger)
+        except ProjectBuildError as e:
+            self._log_message(f"Impossibile leggere il progetto corrente: {str(e)}", Qgis.Critical)
+            QMessageBox.critical(
+                self.iface.mainWindow(),
+                self.tr("Export Layers Within Area"),
+                self.tr("Error saving the modified QGIS project."),
+            )
+
+        areas_exported = 0
+        for area_directory, exported_data in atlas_results:
+            if exported_data and builder is not None and self._create_qgis_project_v2(
+                exported_data, area_directory, show_message=False, builder=builder
+            ):
+                areas_exported += 1
+
+        self.iface.messageBar().pushSuccess(
+            self.tr("Export Layers Within Area"),
+            self.tr("Atlas export completed: {count} areas in {path}").format(
+                count=areas_exported, path=export_directory
+            ),
+        )
+
     def _on_export_error(self, error_message: str) -> None:
         """Gestisce gli errori durante l'esportazione."""
         self._hide_progress()
@@ -645,30 +642,20 @@ class ExportLayersWithinAreaPlugin:
     def _check_database_layers_accessibility(self, layers: List[QgsMapLayer]) -> List[str]:
         """Verifica l'accessibilità dei layer connessi a database prima dell'esportazione.
 
+        I layer vengono raggruppati per connessione: ogni connessione viene verificata una
+        sola volta, in parallelo alle altre e con un tempo massimo di attesa.
+
         Returns:
             Lista di stringhe con i problemi riscontrati per ciascun layer
         """
         issues = []
 
-        for layer in layers:
-            if not isinstance(layer, QgsVectorLayer):
-                continue
-
-            # Verifica se il layer è connesso a un database PostgreSQL/PostGIS
-            provider = layer.dataProvider()
-            if provider.name().lower() in ['postgres', 'postgis']:
-                try:
-                    # Prova a contare le features per verificare la connessione
-                    # Questo è un'operazione leggera che verifica l'accesso al database
-                    feature_count = layer.featureCount()
-                    if feature_count < 0:  # -1 indica errore
-                        issues.append(f"• {layer.name()}: Impossibile accedere al database (conteggio features fallito)")
-                except Exception as e:
-                    error_str = str(e).lower()
-                    if any(keyword in error_str for keyword in ['password', 'authentication', 'fe_sendauth', 'connection']):
-                        issues.append(f"• {layer.name()}: Problema di autenticazione al database ({str(e)[:50]}...)")
-                    else:
-                        issues.append(f"• {layer.name()}: Errore di connessione al database ({str(e)[:50]}...)")
+        for group, error in check_connections(layers).values():
+            error_str = error.lower()
+            for layer in group:
+                if any(keyword in error_str for keyword in ['password', 'authentication', 'fe_sendauth']):
+                    issues.append(f"• {layer.name()}: Problema di autenticazione al database ({error[:50]}...)")
+                else:
+                    issues.append(f"• {layer.name()}: Impossibile accedere al database ({error[:50]}...)")
 
         return issues
-
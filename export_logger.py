@@ -0,0 +1,105 @@
+"""Logger del plugin: impostazioni lette una sola volta e messaggi scritti a blocchi."""
+
+import threading
+import time
+from typing import List, Tuple
+
+from qgis.PyQt.QtCore import QSettings
+from qgis.core import Qgis, QgsMessageLog
+
+LOG_TAG = "ExportLayersWithinArea"
+
+# Livelli di dettaglio selezionabili nelle impostazioni
+LOG_LEVEL_INFO = "info"
+LOG_LEVEL_DEBUG = "debug"
+
+# Messaggi accumulati prima di scriverli nel log di QGIS
+FLUSH_SIZE = 50
+# Età massima (secondi) dei messaggi in attesa di essere scritti
+FLUSH_INTERVAL = 1.0
+
+
+class ExportLogger:
+    """Scrive i messaggi del plugin nel pannello dei log di QGIS.
+
+    Le impostazioni vengono lette una sola volta alla creazione, per cui un logger
+    disabilitato non costa nulla. I messaggi informativi vengono accumulati e scritti
+    a blocchi (righe consecutive dello stesso livello in un'unica voce), riducendo i
+    segnali verso l'interfaccia; avvisi ed errori svuotano subito il buffer. Chi crea
+    il logger deve chiamare flush() al termine dell'operazione.
+    """
+
+    def __init__(self, enabled: bool = True, level: str = LOG_LEVEL_INFO, flush_size: int = FLUSH_SIZE) -> None:
+        self.enabled = enabled
+        self.debug_enabled = enabled and level == LOG_LEVEL_DEBUG
+        self._flush_size = max(1, flush_size)
+        self._buffer: List[Tuple[str, Qgis.MessageLevel]] = []
+        self._buffer_started = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, flush_size: int = FLUSH_SIZE) -> "ExportLogger":
+        """Crea un logger configurato secondo le impostazioni del plugin."""
+        settings = QSettings("ExportLayersWithinArea", "Plugin")
+        return cls(
+            settings.value("logging_enabled", True, type=bool),
+            settings.value("log_level", LOG_LEVEL_INFO, type=str),
+            flush_size,
+        )
+
+    def debug(self, message: str, *args) -> None:
+        """Messaggio di dettaglio, scritto solo con il livello "debug".
+
+        Gli argomenti vengono inseriti nel messaggio (formattazione con %) solo se il
+        messaggio viene effettivamente scritto.
+        """
+        if self.debug_enabled:
+            self._append("[DEBUG] " + (message % args if args else message), Qgis.Info)
+
+    def info(self, message: str, *args) -> None:
+        if self.enabled:
+            self._append(message % args if args else message, Qgis.Info)
+
+    def warning(self, message: str, *args) -> None:
+        if self.enabled:
+            self._append(message % args if args else message, Qgis.Warning)
+
+    def critical(self, message: str, *args) -> None:
+        if self.enabled:
+            self._append(message % args if args else message, Qgis.Critical)
+
+    def log(self, message: str, level: Qgis.MessageLevel = Qgis.Info) -> None:
+        """Equivalente di QgsMessageLog.logMessage con il livello QGIS indicato."""
+        if self.enabled:
+            self._append(message, level)
+
+    def _append(self, message: str, level: Qgis.MessageLevel) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if not self._buffer:
+                self._buffer_started = now
+            self._buffer.append((message, level))
+            if (
+                level in (Qgis.Warning, Qgis.Critical)
+                or len(self._buffer) >= self._flush_size
+                or now - self._buffer_started >= FLUSH_INTERVAL
+            ):
+                self._flush_locked()
+
+    def flush(self) -> None:
+        """Scrive nel log di QGIS i messaggi in attesa."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        buffer, self._buffer = self._buffer, []
+        lines: List[str] = []
+        current_level = None
+        for message, level in buffer:
+            if level != current_level and lines:
+                QgsMessageLog.logMessage("\n".join(lines), LOG_TAG, current_level)
+                lines = []
+            current_level = level
+            lines.append(message)
+        if lines:
+            QgsMessageLog.logMessage("\n".join(lines), LOG_TAG, current_level)
@@ -0,0 +1,88 @@
+"""Manifest delle esportazioni incrementali."""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+MANIFEST_FILENAME = "export_manifest.json"
+MANIFEST_VERSION = 1
+
+
+class ExportManifest:
+    """Registra, per ogni layer esportato, l'impronta della sorgente e il relativo output.
+
+    Il manifest risiede nella cartella di esportazione. Gli output sono salvati con
+    percorsi relativi alla cartella, così l'esportazione può essere spostata senza
+    perdere la possibilità di riutilizzarla.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+        self._path = os.path.join(directory, MANIFEST_FILENAME)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self._path, encoding="utf-8") as manifest_file:
+                data = json.load(manifest_file)
+        except (OSError, ValueError):
+            return
+
+        if data.get("version") == MANIFEST_VERSION:
+            self._entries = data.get("layers", {})
+
+    def lookup(self, layer_id: str, fingerprint: str) -> Optional[dict]:
+        """Restituisce la voce del layer se l'impronta coincide e l'output esiste ancora.
+
+        La voce restituita contiene "output" con l'URI assoluto del file esportato,
+        oppure None se nell'esportazione precedente il layer non aveva feature.
+        """
+        with self._lock:
+            entry = self._entries.get(layer_id)
+        if not entry or entry.get("fingerprint") != fingerprint:
+            return None
+
+        output = entry.get("output")
+        if output is None:
+            return dict(entry)
+
+        absolute_output = self._to_absolute(output)
+        if not os.path.exists(absolute_output.split("|", 1)[0]):
+            return None
+        return dict(entry, output=absolute_output)
+
+    def record(self, layer_id: str, fingerprint: str, output: Optional[str], details: Optional[dict] = None) -> None:
+        """Registra l'output appena prodotto per il layer."""
+        entry = {
+            "fingerprint": fingerprint,
+            "output": self._to_relative(output) if output else None,
+            "details": details or {},
+            "exported_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with self._lock:
+            self._entries[layer_id] = entry
+
+    def discard(self, layer_id: str) -> None:
+        """Rimuove la voce del layer, il cui output viene riscritto."""
+        with self._lock:
+            self._entries.pop(layer_id, None)
+
+    def save(self) -> None:
+        with self._lock:
+            data = {"version": MANIFEST_VERSION, "layers": dict(self._entries)}
+        temp_path = f"{self._path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(data, manifest_file, indent=2, sort_keys=True, default=str)
+        os.replace(temp_path, self._path)
+
+    def _to_relative(self, uri: str) -> str:
+        path, separator, options = uri.partition("|")
+        return os.path.relpath(path, self._directory) + separator + options
+
+    def _to_absolute(self, uri: str) -> str:
+        path, separator, options = uri.partition("|")
+        return os.path.normpath(os.path.join(self._directory, path)) + separator + options
@@ -0,0 +1,330 @@
+"""Piano di esportazione: stima di righe, dimensione e durata di ogni layer prima di esportare."""
+
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from qgis.core import (
+    QgsCoordinateTransform,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsMapLayer,
+    QgsProject,
+    QgsRectangle,
+    QgsTask,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
+    QgsWkbTypes,
+)
+
+from .export_report import LayerReport
+
+STATISTICS_FILENAME = "export_statistics.json"
+STATISTICS_VERSION = 1
+
+# Peso dell'ultima esportazione nella media mobile delle statistiche
+_SMOOTHING = 0.5
+
+# Fino a questo numero di feature le righe nell'area vengono contate esattamente;
+# oltre si stimano dalla frazione dell'estensione del layer coperta dalla selezione
+EXACT_COUNT_LIMIT = 20000
+
+# Feature contate tra due controlli di cancellazione
+_COUNT_CHECK_INTERVAL = 1000
+
+# Valori usati in assenza di esportazioni precedenti dello stesso layer o provider
+_DEFAULT_SECONDS_PER_FEATURE = {"postgres": 1e-4, "mssql": 1e-4, "oracle": 1e-4, "hana": 1e-4}
+_DEFAULT_LOCAL_SECONDS_PER_FEATURE = 2e-5
+_DEFAULT_BYTES_PER_FEATURE = 300.0
+
+
+class ExportStatistics:
+    """Statistiche delle esportazioni precedenti, salvate nella cartella di output.
+
+    Per ogni layer (e, come ripiego, per ogni provider) vengono mantenute le medie
+    mobili di secondi per feature letta, byte per feature scritta e frazione delle
+    feature lette che supera il test spaziale.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self._path = os.path.join(directory, STATISTICS_FILENAME)
+        self._layers: Dict[str, dict] = {}
+        self._providers: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self._path, encoding="utf-8") as statistics_file:
+                data = json.load(statistics_file)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == STATISTICS_VERSION:
+            self._layers = data.get("layers", {})
+            self._providers = data.get("providers", {})
+
+    def layer(self, layer: QgsMapLayer) -> Optional[dict]:
+        """Statistiche del layer, oppure quelle medie del suo provider, oppure None."""
+        return self._layers.get(layer.id()) or self._providers.get(layer.providerType())
+
+    def update(self, reports: Iterable[LayerReport]) -> None:
+        """Aggiorna le medie con i layer effettivamente letti nell'ultima esportazione."""
+        with self._lock:
+            for report in reports:
+                if report.status not in ("exported", "empty") or not report.candidates:
+                    continue
+                sample = {
+                    "seconds_per_feature": report.total_seconds / report.candidates,
+                    "acceptance_ratio": report.accepted / report.candidates,
+                }
+                if report.written and report.bytes_written:
+                    sample["bytes_per_feature"] = report.bytes_written / report.written
+                self._layers[report.layer_id] = self._blend(self._layers.get(report.layer_id), sample)
+                self._providers[report.provider] = self._blend(self._providers.get(report.provider), sample)
+
+    @staticmethod
+    def _blend(previous: Optional[dict], sample: dict) -> dict:
+        if not previous:
+            return dict(sample, runs=1)
+        blended = dict(previous)
+        for key, value in sample.items():
+            old = previous.get(key)
+            blended[key] = value if old is None else old + (value - old) * _SMOOTHING
+        blended["runs"] = previous.get("runs", 0) + 1
+        return blended
+
+    def save(self) -> None:
+        with self._lock:
+            data = {"version": STATISTICS_VERSION, "layers": dict(self._layers), "providers": dict(self._providers)}
+        temp_path = f"{self._path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as statistics_file:
+            json.dump(data, statistics_file, indent=2, sort_keys=True)
+        os.replace(temp_path, self._path)
+
+
+class LayerEstimate:
+    """Stima dei costi di esportazione di un layer."""
+
+    def __init__(self, layer: QgsMapLayer) -> None:
+        self.layer = layer
+        self.candidates: Optional[int] = None  # Righe nella bbox della selezione
+        self.exact_count = False  # True se candidates è un conteggio e non una stima
+        self.features: Optional[int] = None  # Feature attese nell'output
+        self.bytes: Optional[int] = None
+        self.seconds: Optional[float] = None
+        self.from_history = False  # True se basata su esportazioni precedenti
+
+
+class _PendingCount:
+    """Layer vettoriale da contare, con quanto viene letto dal layer sul thread principale.
+
+    Numero di feature ed estensione, che su un database senza metadati stimati
+    costano un COUNT(*) e una scansione dell'estensione, vengono letti da totals()
+    tramite una copia del layer creata dal thread che la usa.
+    """
+
+    def __init__(self, estimate: LayerEstimate, layer: QgsVectorLayer, bbox: Optional[QgsRectangle]) -> None:
+        self.estimate = estimate
+        self.bbox = bbox  # Bbox della selezione nel CRS del layer, None per contare tutte le righe
+        self.source = QgsVectorLayerFeatureSource(layer)
+        self._uri = layer.source()
+        self._provider = layer.providerType()
+        self._name = layer.name()
+        self._totals = None
+        if self._provider == "memory":
+            # Un layer in memoria non può essere riaperto dalla sorgente, ma non interroga alcun database
+            self._totals = (layer.featureCount(), layer.extent())
+
+    def totals(self) -> Tuple[int, QgsRectangle]:
+        """Numero di feature (-1 se non disponibile) ed estensione del layer."""
+        if self._totals is None:
+            options = QgsVectorLayer.LayerOptions(False, False)
+            options.skipCrsValidation = True
+            layer = QgsVectorLayer(self._uri, self._name, self._provider, options)
+            if not layer.isValid():
+                self._totals = (-1, QgsRectangle())
+            else:
+                total = layer.featureCount()
+                # L'estensione serve solo per stimare le righe nell'area dei layer grandi
+                needs_extent = self.bbox is not None and total > EXACT_COUNT_LIMIT
+                self._totals = (total, layer.extent() if needs_extent else QgsRectangle())
+        return self._totals
+
+
+class LayerEstimator:
+    """Stima righe, dimensione e durata dell'esportazione di ciascun layer.
+
+    Il costruttore legge sul thread principale solo le statistiche e quanto serve per
+    leggere i layer da un altro thread (vedi _PendingCount); count() ricava numero di
+    feature, estensioni e righe nella bbox della selezione e può essere eseguito in
+    background (vedi EstimateTask).
+    """
+
+    def __init__(
+        self,
+        layers: Iterable[QgsMapLayer],
+        selection: Optional[QgsGeometry],
+        selection_crs,
+        statistics: ExportStatistics,
+    ) -> None:
+        """
+        Args:
+            layers: Layer da esportare
+            selection: Poligoni selezionati (ne viene usata la bbox), oppure None per esportare tutto
+            selection_crs: CRS della selezione
+            statistics: Statistiche delle esportazioni precedenti
+        """
+        self.estimates: List[LayerEstimate] = []
+        self.completed = False
+        self._selection = selection
+        self._histories = {}  # id layer -> statistiche del layer o del provider
+        self._counts: List[_PendingCount] = []  # Layer vettoriali da contare
+        for layer in layers:
+            self.estimates.append(self._prepare(layer, selection, selection_crs, statistics))
+
+    def _prepare(self, layer: QgsMapLayer, selection, selection_crs, statistics: ExportStatistics) -> LayerEstimate:
+        estimate = LayerEstimate(layer)
+        if layer.type() != QgsMapLayer.VectorLayer:
+            return estimate
+
+        self._histories[layer.id()] = statistics.layer(layer)
+        bbox = None
+        if selection is not None and self._has_geometry(layer):
+            bbox = selection.boundingBox()
+            if layer.crs() != selection_crs:
+                transform = QgsCoordinateTransform(selection_crs, layer.crs(), QgsProject.instance().transformContext())
+                bbox = transform.transformBoundingBox(bbox)
+        # Conteggi rimandati a count(), che può essere eseguito in un altro thread
+        self._counts.append(_PendingCount(estimate, layer, bbox))
+        return estimate
+
+    @staticmethod
+    def _has_geometry(layer: QgsVectorLayer) -> bool:
+        return layer.geometryType() not in (QgsWkbTypes.NoGeometry, QgsWkbTypes.NullGeometry)
+
+    def count(
+        self,
+        is_canceled: Optional[Callable[[], bool]] = None,
+        progress: Optional[Callable[[float], None]] = None,
+    ) -> bool:
+        """Conta le righe di ciascun layer e completa le stime.
+
+        Le esportazioni complete (e le tabelle) leggono tutte le righe; nell'area della
+        selezione le righe vengono contate fino a EXACT_COUNT_LIMIT feature, oltre
+        stimate dalla frazione dell'estensione del layer coperta.
+
+        Returns:
+            False se il conteggio è stato cancellato
+        """
+        for index, pending in enumerate(self._counts):
+            estimate = pending.estimate
+            total, extent = pending.totals()
+            if total >= 0:
+                if pending.bbox is None:
+                    estimate.candidates = total
+                    estimate.exact_count = True
+                elif total <= EXACT_COUNT_LIMIT:
+                    estimate.candidates = _count_in_rectangle(pending.source, pending.bbox, is_canceled)
+                    estimate.exact_count = True
+                else:
+                    estimate.candidates = _extent_ratio_count(extent, pending.bbox, total)
+            if is_canceled and is_canceled():
+                return False
+            if progress is not None:
+                progress((index + 1) * 100.0 / len(self._counts))
+
+        for estimate in self.estimates:
+            if estimate.candidates is not None:
+                self._apply_history(estimate)
+        self.completed = True
+        return True
+
+    def _apply_history(self, estimate: LayerEstimate) -> None:
+        layer = estimate.layer
+        history = self._histories.get(layer.id())
+        estimate.from_history = history is not None
+        history = history or {}
+        clipped = self._selection is not None and self._has_geometry(layer)
+        acceptance = history.get("acceptance_ratio", 1.0) if clipped else 1.0
+        seconds_per_feature = history.get(
+            "seconds_per_feature",
+            _DEFAULT_SECONDS_PER_FEATURE.get(layer.providerType(), _DEFAULT_LOCAL_SECONDS_PER_FEATURE),
+        )
+        bytes_per_feature = history.get("bytes_per_feature", _DEFAULT_BYTES_PER_FEATURE)
+
+        estimate.features = int(round(estimate.candidates * acceptance))
+        estimate.bytes = int(estimate.features * bytes_per_feature)
+        estimate.seconds = estimate.candidates * seconds_per_feature
+
+
+class EstimateTask(QgsTask):
+    """Esegue in background i conteggi di un LayerEstimator.
+
+    I risultati restano nell'estimatore (estimates, completed), che sopravvive al task
+    eliminato dal gestore dei task al termine.
+    """
+
+    def __init__(self, description: str, estimator: LayerEstimator) -> None:
+        super().__init__(description, QgsTask.CanCancel)
+        self._estimator = estimator
+
+    def run(self) -> bool:
+        return self._estimator.count(self.isCanceled, self.setProgress)
+
+
+def _count_in_rectangle(
+    source: QgsVectorLayerFeatureSource, rectangle: QgsRectangle, is_canceled: Optional[Callable[[], bool]] = None
+) -> int:
+    """Conta le feature nella bbox usando l'indice spaziale del provider, senza attributi né geometrie."""
+    request = QgsFeatureRequest()
+    request.setFilterRect(rectangle)
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setNoAttributes()
+    count = 0
+    for _ in source.getFeatures(request):
+        count += 1
+        if count % _COUNT_CHECK_INTERVAL == 0 and is_canceled and is_canceled():
+            break
+    return count
+
+
+def _extent_ratio_count(extent: QgsRectangle, rectangle: QgsRectangle, total: int) -> int:
+    """Stima le feature nella bbox dalla frazione dell'estensione del layer che copre."""
+    if extent.isEmpty() or extent.area() <= 0:
+        return total
+    overlap = extent.intersect(rectangle)
+    if overlap.isEmpty():
+        return 0
+    return int(round(total * min(1.0, overlap.area() / extent.area())))
+
+
+def total_seconds(estimates: Iterable[LayerEstimate], parallel_layers: int) -> float:
+    """Durata complessiva stimata tenendo conto dei layer esportati in parallelo."""
+    durations = [estimate.seconds for estimate in estimates if estimate.seconds is not None]
+    if not durations:
+        return 0.0
+    return max(max(durations), sum(durations) / max(1, parallel_layers))
+
+
+def format_size(size: int) -> str:
+    """Dimensione leggibile in byte, KB, MB o GB."""
+    value = float(size)
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+def format_duration(seconds: float) -> str:
+    """Durata leggibile (es. "< 1 s", "45 s", "3 min", "1 h 05 min")."""
+    if seconds < 1:
+        return "< 1 s"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    minutes = seconds // 60
+    if minutes < 60:
+        return f"{minutes} min"
+    return f"{minutes // 60} h {minutes % 60:02d} min"
@@ -0,0 +1,118 @@
+"""Report delle prestazioni dell'esportazione."""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_FILENAME = "export_report.json"
+REPORT_VERSION = 1
+
+# Fasi misurate per ogni layer vettoriale
+PHASES = ("request_setup", "fetch", "predicate", "write", "index_build")
+
+
+def peak_memory_bytes() -> Optional[int]:
+    """Picco di memoria residente del processo in byte, se il sistema lo rende disponibile."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss è in byte su macOS e in kB sugli altri sistemi
+        return peak if sys.platform == "darwin" else peak * 1024
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return None
+
+
+class LayerReport:
+    """Tempi e conteggi raccolti durante l'esportazione di un singolo layer.
+
+    Ogni layer è esportato da un solo thread alla volta, per cui il report non
+    richiede sincronizzazione.
+    """
+
+    def __init__(self, layer_id: str, layer_name: str, provider: str) -> None:
+        self.layer_id = layer_id
+        self.layer_name = layer_name
+        self.provider = provider
+        self.status = None
+        self.output = None
+        self.bytes_written = None
+        self.total_seconds = 0.0
+        self.peak_memory_bytes = None
+        self.attempts = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """Azzera tempi e conteggi all'inizio di un (nuovo) tentativo di esportazione."""
+        self.attempts += 1
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.candidates = 0
+        self.accepted = 0
+        self.written = 0
+
+    @contextmanager
+    def timed(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[phase] += time.perf_counter() - start
+
+    def fetched(self, features: Iterable) -> Iterator:
+        """Itera le feature del provider sommando il tempo di lettura e contando i candidati."""
+        iterator = iter(features)
+        while True:
+            start = time.perf_counter()
+            try:
+                feature = next(iterator)
+            except StopIteration:
+                self.seconds["fetch"] += time.perf_counter() - start
+                return
+            self.seconds["fetch"] += time.perf_counter() - start
+            self.candidates += 1
+            yield feature
+
+    def to_dict(self) -> dict:
+        return {
+            "layer_id": self.layer_id,
+            "layer_name": self.layer_name,
+            "provider": self.provider,
+            "status": self.status,
+            "output": self.output,
+            "attempts": self.attempts,
+            "seconds": dict({phase: round(value, 4) for phase, value in self.seconds.items()},
+                            total=round(self.total_seconds, 4)),
+            "candidate_features": self.candidates,
+            "accepted_features": self.accepted,
+            "written_features": self.written,
+            "bytes_written": self.bytes_written,
+            "process_peak_memory_bytes": self.peak_memory_bytes,
+        }
+
+
+def write_report(directory: str, reports: List[LayerReport], summary: dict) -> str:
+    """Scrive il report JSON nella cartella di esportazione e ne restituisce il percorso."""
+    path = os.path.join(directory, REPORT_FILENAME)
+    data = dict(
+        summary,
+        version=REPORT_VERSION,
+        created=datetime.now().isoformat(timespec="seconds"),
+        process_peak_memory_bytes=peak_memory_bytes(),
+        layers=[report.to_dict() for report in reports],
+    )
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as report_file:
+        json.dump(data, report_file, indent=2, default=str)
+    os.replace(temp_path, path)
+    return path
@@ -1,11 +1,17 @@
 """Worker thread per l'esportazione in background."""
 
-from typing import List, Tuple, Optional
+import threading
+import time
+from typing import Dict, List, Tuple, Optional
 from qgis.PyQt.QtCore import QThread, pyqtSignal
-from qgis.core import QgsMapLayer, QgsVectorLayer, QgsFeature, QgsMessageLog, Qgis
+from qgis.core import QgsMapLayer, QgsVectorLayer, QgsFeature, QgsMessageLog, QgsWkbTypes, Qgis
 
+from .export_plan import format_duration
 from .exporter import LayerExporter, ExportError
 
+# Intervallo minimo tra due aggiornamenti del progresso (al massimo 10 segnali al secondo)
+PROGRESS_MIN_INTERVAL = 0.1
+
 
 class ExportWorker(QThread):
     """Thread worker per eseguire l'esportazione in background."""
@@ -13,6 +19,7 @@ class ExportWorker(QThread):
     # Segnali per comunicare con il thread principale
     progress_updated = pyqtSignal(int, str)  # progresso (0-100), messaggio
     export_finished = pyqtSignal(list, str)  # exported_data, export_directory
+    atlas_finished = pyqtSignal(list, str)  # [(cartella area, exported_data)], export_directory
     export_error = pyqtSignal(str)  # messaggio di errore
     export_cancelled = pyqtSignal()  # esportazione cancellata
 
@@ -23,6 +30,8 @@ class ExportWorker(QThread):
         layers: List[QgsMapLayer],
         output_directory: str,
         export_directory_name: str = "",
+        export_options: Optional[dict] = None,
+        feature_estimates: Optional[Dict[str, int]] = None,
         parent=None
     ) -> None:
         super().__init__(parent)
@@ -31,8 +40,27 @@ class ExportWorker(QThread):
         self.layers = layers
         self.output_directory = output_directory
         self.export_directory_name = export_directory_name
+        self.export_options = export_options or {}  # Opzioni avanzate passate a LayerExporter
         self.is_cancelled = False
 
+        # Stato del progresso per feature, aggiornato anche dai thread dei layer paralleli
+        self._progress_lock = threading.Lock()
+        # id layer -> feature da leggere, stimate dal piano di esportazione (se mostrato)
+        self._feature_estimates: Dict[str, int] = dict(feature_estimates or {})
+        self._features_read = {}  # id layer -> feature lette finora
+        self._finished_layers = set()
+        self._progress_start = 0.0
+        self._last_progress_emit = 0.0
+
+        # Sorgenti e metadati dei layer letti qui, sul thread principale che possiede i layer:
+        # l'esportazione legge le feature solo dalle sorgenti preparate
+        incremental = self.export_options.get("incremental", False) and not (
+            self.export_options.get("atlas", False) and polygon_features
+        )
+        self._prepared_layers = LayerExporter.prepare_layers(
+            layers, incremental, self.export_options.get("change_tracking_field", "updated_at")
+        )
+
     def run(self) -> None:
         """Esegue l'esportazione nel thread separato."""
         try:
@@ -46,23 +74,40 @@ class ExportWorker(QThread):
                 self.layers,
                 self.output_directory,
                 self.export_directory_name,
-                cancellation_check=lambda: self.is_cancelled
+                cancellation_check=lambda: self.is_cancelled,
+                layer_finished_callback=self._on_layer_finished,
+                feature_progress_callback=self._on_feature_progress,
+                prepared_layers=self._prepared_layers,
+                **self.export_options
             )
 
-            # Patch del metodo export per aggiungere il progresso
-            original_export = exporter.export
-            def export_with_progress():
-                return self._export_with_progress(exporter, original_export)
-
-            exporter.export = export_with_progress
+            # Feature da leggere, usate per avanzamento e tempo rimanente: dal piano di
+            # esportazione oppure, per i soli layer esportati per intero, da featureCount().
+            # Per i layer ritagliati il conteggio dell'intera tabella sovrastimerebbe il tempo
+            # (e su PostGIS senza metadati stimati costa un COUNT(*)): si mostra solo la velocità
+            for layer in self.layers:
+                if (
+                    layer.type() == QgsMapLayer.VectorLayer
+                    and layer.id() not in self._feature_estimates
+                    and self._exported_in_full(layer)
+                ):
+                    count = layer.featureCount()
+                    if count >= 0:
+                        self._feature_estimates[layer.id()] = count
+            self._progress_start = time.monotonic()
 
             # Esegue l'esportazione
+            self.progress_updated.emit(10, "Preparazione layer...")
             exported_data = exporter.export()
             export_directory = exporter.get_export_directory()
 
             if not self.is_cancelled:
                 self.progress_updated.emit(100, "Esportazione completata")
-                self.export_finished.emit(exported_data, export_directory)
+                atlas_results = exporter.atlas_results()
+                if atlas_results:
+                    self.atlas_finished.emit(atlas_results, export_directory)
+                else:
+                    self.export_finished.emit(exported_data, export_directory)
             else:
                 self.export_cancelled.emit()
 
@@ -73,32 +118,62 @@ class ExportWorker(QThread):
             if not self.is_cancelled:
                 self.export_error.emit(f"Errore imprevisto: {str(e)}")
 
-    def _export_with_progress(self, exporter: LayerExporter, original_export) -> List[Tuple[str, QgsMapLayer]]:
-        """Versione dell'export con monitoraggio del progresso."""
-        total_layers = len(exporter._target_layers)
-        completed_layers = 0
-
-        # Sovrascrivi temporaneamente il metodo per intercettare i progressi
-        original_export_layer = exporter._export_layer
-
-        def export_layer_with_progress(layer, features):
-            # Controlla cancellazione prima di ogni layer
-            if self.is_cancelled:
-                raise Exception("Esportazione cancellata dall'utente")
-
-            result = original_export_layer(layer, features)
-            nonlocal completed_layers
-            completed_layers += 1
-            progress = int((completed_layers / total_layers) * 90)  # 90% per l'esportazione, 10% per il setup
-            self.progress_updated.emit(progress, f"Esportazione layer: {layer.name()}")
-            return result
-
-        exporter._export_layer = export_layer_with_progress
-
-        # Esegue l'esportazione originale
-        self.progress_updated.emit(10, "Preparazione layer...")
-        result = original_export()
-        return result
+    def _exported_in_full(self, layer: QgsVectorLayer) -> bool:
+        """Indica se tutte le feature del layer vengono lette (nessun ritaglio sull'area)."""
+        if not self.polygon_features:
+            return True
+        is_table = layer.geometryType() in (QgsWkbTypes.NoGeometry, QgsWkbTypes.NullGeometry)
+        # Le tabelle collegate da relazioni possono essere ridotte alle righe dei genitori
+        return is_table and not self.export_options.get("related_tables_only", True)
+
+    def _on_layer_finished(self, layer: QgsMapLayer, completed_layers: int, total_layers: int) -> None:
+        """Aggiorna il progresso al termine di ogni layer (anche da thread paralleli)."""
+        with self._progress_lock:
+            self._finished_layers.add(layer.id())
+            self._emit_progress(layer, force=True)
+
+    def _on_feature_progress(self, layer: QgsMapLayer, features_read: int) -> None:
+        """Registra le feature lette dal layer; il segnale viene emesso al massimo ogni PROGRESS_MIN_INTERVAL."""
+        with self._progress_lock:
+            self._features_read[layer.id()] = features_read
+            self._emit_progress(layer)
+
+    def _emit_progress(self, layer: QgsMapLayer, force: bool = False) -> None:
+        """Emette il progresso complessivo con velocità e tempo stimato (da chiamare con il lock)."""
+        now = time.monotonic()
+        if not force and now - self._last_progress_emit < PROGRESS_MIN_INTERVAL:
+            return
+        self._last_progress_emit = now
+
+        # Ogni layer pesa allo stesso modo; quelli in corso in proporzione alle feature lette
+        done = 0.0
+        remaining_features = 0
+        eta_available = True  # Solo se tutti i layer vettoriali in corso hanno una stima
+        for target in self.layers:
+            if target.id() in self._finished_layers:
+                done += 1.0
+                continue
+            estimate = self._feature_estimates.get(target.id())
+            read = self._features_read.get(target.id(), 0)
+            if estimate:
+                done += min(read / estimate, 1.0)
+                remaining_features += max(estimate - read, 0)
+            elif estimate is None and target.type() == QgsMapLayer.VectorLayer:
+                eta_available = False
+
+        total_layers = len(self.layers)
+        progress = 10 + int(done / total_layers * 85)  # 10% per il setup, 5% per la chiusura
+        message = f"Esportazione layer: {layer.name()} ({len(self._finished_layers)}/{total_layers})"
+
+        elapsed = now - self._progress_start
+        features_read = sum(self._features_read.values())
+        if features_read and elapsed > 0:
+            rate = features_read / elapsed
+            message += f" - {rate:,.0f} feature/s".replace(",", ".")
+            if remaining_features and eta_available:
+                message += f", circa {format_duration(remaining_features / rate)} rimanenti"
+
+        self.progress_updated.emit(progress, message)
 
     def cancel(self) -> None:
         """Cancella l'esportazione."""
@@ -1,49 +1,131 @@
 """Logica di esportazione dei layer."""
 
+import contextlib
+import hashlib
+import json
+import math
 import os
+import threading
 import time
-from typing import Iterable, List, Union, Tuple, Callable
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from qgis.PyQt.QtCore import QVariant
 from qgis.core import (
+    QgsCoordinateReferenceSystem,
     QgsCoordinateTransform,
+    QgsDataSourceUri,
+    QgsExpression,
+    QgsExpressionContext,
+    QgsExpressionContextUtils,
     QgsFeature,
     QgsFeatureRequest,
+    QgsFields,
     QgsGeometry,
     QgsMapLayer,
     QgsProject,
+    QgsProviderRegistry,
     QgsRasterLayer,
+    QgsRectangle,
+    QgsRelation,
+    QgsSpatialIndex,
     QgsVectorFileWriter,
     QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
     QgsWkbTypes,
     Qgis,
-    QgsMessageLog,
 )
-from qgis.PyQt.QtCore import QSettings
 
+from .connection_pool import HostConcurrencyLimiter, interleave_by_host
+from .export_logger import ExportLogger
+from .export_manifest import ExportManifest
+from .export_plan import ExportStatistics
+from .export_report import LayerReport, peak_memory_bytes, write_report
+from .tile_cache import (
+    MBTilesStore,
+    TileCacheError,
+    build_tile_cache,
+    count_tiles_in_bbox,
+    tile_bounds_mercator,
+    tiles_in_bbox,
+)
 
-class ExportError(RuntimeError):
-    """Errore generico durante l'esportazione."""
+try:
+    from osgeo import gdal
+except ImportError:  # GDAL Python non disponibile: pragma di bulk load non applicati e raster non ritagliati
+    gdal = None
+
+
+# Numero di feature accumulate prima di ogni scrittura su disco: la memoria di picco
+# dipende da questo valore e non dalla dimensione del layer esportato
+FEATURE_BATCH_SIZE = 1000
+
+# Feature scritte in ciascuna transazione quando tutti i layer confluiscono in un unico GeoPackage
+GPKG_TRANSACTION_BATCH_SIZE = 50000
+
+
+# Opzioni GDAL applicate durante il caricamento massivo solo nei GeoPackage creati dalla
+# scrittura in corso: journal in memoria e nessun fsync, un file interrotto non contiene
+# altri layer ed è comunque da rigenerare (vedi LayerExporter._writes_new_files)
+_BULK_LOAD_GDAL_OPTIONS = {
+    "OGR_SQLITE_JOURNAL": "MEMORY",
+    "OGR_SQLITE_SYNCHRONOUS": "OFF",
+    "OGR_SQLITE_CACHE": "512",
+}
+
+
+# Numero massimo di tile scaricabili per layer nella cache offline
+MAX_TILE_CACHE_TILES = 200000
+
+# Download di tile contemporanei per ciascun layer
+TILE_CACHE_WORKERS = 8
+
+
+# Chiavi dei genitori esportati inserite in ciascuna richiesta "campo IN (...)" sulle tabelle collegate
+RELATION_KEY_BATCH_SIZE = 1000
 
 
-def _is_logging_enabled() -> bool:
-    """Controlla se il logging è abilitato nelle impostazioni del plugin."""
-    settings = QSettings("ExportLayersWithinArea", "Plugin")
-    return settings.value("logging_enabled", True, type=bool)
+# Clausole SQL con cui i provider database eseguono il test spaziale esatto lato server.
+# {column}: colonna geometrica, {wkb}: geometria di selezione in WKB esadecimale, {srid}: SRID
+_SERVER_SIDE_FILTERS = {
+    "postgres": "ST_Intersects({column}, ST_GeomFromWKB(decode('{wkb}', 'hex'), {srid}))",
+    "spatialite": "Intersects({column}, GeomFromWKB(X'{wkb}', {srid}))",
+}
 
 
-def _log_message(message: str, level: Qgis.MessageLevel = Qgis.Info) -> None:
-    """Logga un messaggio solo se il logging è abilitato."""
-    if _is_logging_enabled():
-        QgsMessageLog.logMessage(message, "ExportLayersWithinArea", level)
+# Oltre questo numero di poligoni selezionati non se ne calcola l'unione: le feature vengono
+# confrontate, tramite un indice spaziale, solo con i poligoni di cui intersecano la bbox
+POLYGON_INDEX_THRESHOLD = 50
 
 
-def _execute_with_retry(operation: Callable, max_retries: int = 3, delay: float = 1.0) -> any:
+# Cache delle unioni dei poligoni di selezione, condivisa tra le esportazioni della sessione
+_UNION_CACHE_SIZE = 8
+_union_cache: "OrderedDict[tuple, QgsGeometry]" = OrderedDict()
+_union_cache_lock = threading.Lock()
+
+
+class ExportError(RuntimeError):
+    """Errore generico durante l'esportazione."""
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """Indica se l'errore è dovuto alla connessione al database (e merita un nuovo tentativo)."""
+    error_str = str(error).lower()
+    return any(keyword in error_str for keyword in ['password', 'connection', 'timeout', 'fe_sendauth'])
+
+
+def _execute_with_retry(
+    operation: Callable, max_retries: int = 3, delay: float = 1.0, logger: Optional[ExportLogger] = None
+) -> any:
     """Esegue un'operazione con retry automatico per gestire timeout di connessione.
 
     Args:
         operation: Funzione da eseguire
         max_retries: Numero massimo di tentativi
         delay: Ritardo tra tentativi in secondi
+        logger: Logger su cui segnalare i tentativi falliti
 
     Returns:
         Risultato dell'operazione
@@ -58,15 +140,12 @@ def _execute_with_retry(operation: Callable, max_retries: int = 3, delay: float
             return operation()
         except Exception as e:
             last_error = e
-            error_str = str(e).lower()
 
             # Controlla se è un errore di connessione che merita un retry
-            if any(keyword in error_str for keyword in ['password', 'connection', 'timeout', 'fe_sendauth']):
+            if _is_connection_error(e):
                 if attempt < max_retries - 1:
-                    _log_message(
-                        f"Tentativo {attempt + 1} fallito, riprovo tra {delay} secondi: {str(e)}",
-                        Qgis.Warning,
-                    )
+                    if logger is not None:
+                        logger.warning(f"Tentativo {attempt + 1} fallito, riprovo tra {delay} secondi: {str(e)}")
                     time.sleep(delay)
                     continue
                 else:
@@ -85,6 +164,483 @@ def _execute_with_retry(operation: Callable, max_retries: int = 3, delay: float
     raise ExportError(f"Errore imprevisto: {str(last_error)}")
 
 
+# Provider di database per cui, dopo una perdita di connessione, la lettura riprende
+# dall'ultima chiave primaria letta invece di ricominciare l'esportazione del layer
+_RESUMABLE_PROVIDERS = ("postgres", "mssql", "oracle", "hana")
+
+# Riprese consentite per ciascuna richiesta e attesa (secondi) prima di riprendere
+RESUME_MAX_RETRIES = 3
+RESUME_DELAY = 1.0
+
+
+# Due gruppi di poligoni vengono interrogati con un'unica richiesta solo se la bbox
+# complessiva non supera di questo fattore la somma delle loro bbox
+_CLUSTER_AREA_RATIO = 1.5
+
+# Richieste al provider al massimo per layer: oltre, le bbox vengono raccolte in una
+# griglia grossolana e il filtro esatto resta all'indice spaziale dei poligoni
+_MAX_REQUEST_RECTANGLES = 16
+
+# Oltre questo numero di bbox (es. migliaia di particelle) il raggruppamento parte da
+# una griglia di _CLUSTER_GRID_CELLS x _CLUSTER_GRID_CELLS celle, calcolata in O(n)
+_MAX_CLUSTERED_RECTANGLES = 256
+_CLUSTER_GRID_CELLS = 16
+
+
+def _mergeable(cluster: QgsRectangle, rect: QgsRectangle) -> bool:
+    combined = QgsRectangle(cluster)
+    combined.combineExtentWith(rect)
+    return combined.area() <= (cluster.area() + rect.area()) * _CLUSTER_AREA_RATIO
+
+
+def _grid_rectangles(rectangles: List[QgsRectangle], cells: int) -> List[QgsRectangle]:
+    """Raccoglie le bbox nelle celle di una griglia cells x cells sulla loro estensione
+    (in base al centro) e restituisce l'estensione delle bbox di ciascuna cella non vuota."""
+    extent = QgsRectangle(rectangles[0])
+    for rect in rectangles[1:]:
+        extent.combineExtentWith(rect)
+    cell_width = extent.width() / cells
+    cell_height = extent.height() / cells
+
+    grid = {}
+    for rect in rectangles:
+        center = rect.center()
+        column = min(int((center.x() - extent.xMinimum()) / cell_width), cells - 1) if cell_width > 0 else 0
+        row = min(int((center.y() - extent.yMinimum()) / cell_height), cells - 1) if cell_height > 0 else 0
+        cell = grid.get((column, row))
+        if cell is None:
+            grid[(column, row)] = QgsRectangle(rect)
+        else:
+            cell.combineExtentWith(rect)
+    return list(grid.values())
+
+
+def _cluster_rectangles(rectangles: List[QgsRectangle]) -> List[QgsRectangle]:
+    """Raggruppa le bbox vicine in modo da interrogare separatamente le aree distanti.
+
+    Due bbox vengono fuse quando la bbox risultante non è molto più grande della somma
+    delle due: poligoni adiacenti finiscono nella stessa richiesta, mentre due aree
+    distanti 100 km generano due richieste piccole invece di una enorme. Le richieste
+    sono al massimo _MAX_REQUEST_RECTANGLES anche con migliaia di poligoni sparsi.
+    """
+    if len(rectangles) > _MAX_CLUSTERED_RECTANGLES:
+        rectangles = _grid_rectangles(rectangles, _CLUSTER_GRID_CELLS)
+
+    # Scansione per x crescente: ogni bbox viene fusa nel primo gruppo compatibile
+    clusters: List[QgsRectangle] = []
+    for rect in sorted(rectangles, key=lambda r: (r.xMinimum(), r.yMinimum())):
+        for cluster in clusters:
+            if _mergeable(cluster, rect):
+                cluster.combineExtentWith(rect)
+                break
+        else:
+            clusters.append(QgsRectangle(rect))
+
+    # I gruppi cresciuti possono avvicinarsi tra loro: nuovi passaggi finché ne vengono fusi
+    merged = True
+    while merged and len(clusters) > 1:
+        merged = False
+        remaining: List[QgsRectangle] = []
+        for rect in clusters:
+            for cluster in remaining:
+                if _mergeable(cluster, rect):
+                    cluster.combineExtentWith(rect)
+                    merged = True
+                    break
+            else:
+                remaining.append(rect)
+        clusters = remaining
+
+    if len(clusters) > _MAX_REQUEST_RECTANGLES:
+        clusters = _grid_rectangles(clusters, int(math.sqrt(_MAX_REQUEST_RECTANGLES)))
+    return clusters
+
+
+class _PreparedSelection:
+    """Geometria di selezione in un determinato CRS, preparata per i test spaziali sulle feature.
+
+    Il motore GEOS preparato costruisce gli indici interni del poligono alla prima
+    valutazione e li riusa per tutte le feature, evitando di rianalizzare ad ogni
+    test un poligono con centinaia di migliaia di vertici. I motori preparati non
+    sono thread-safe, quindi ne viene creato uno per ogni thread che usa la selezione.
+    """
+
+    def __init__(self, geometry: QgsGeometry, rectangles: Optional[List[QgsRectangle]] = None) -> None:
+        self.geometry = geometry
+        self.bbox = geometry.boundingBox()
+        # Bbox delle singole richieste al provider (una per gruppo di poligoni vicini)
+        self.rectangles = _cluster_rectangles(rectangles) if rectangles else [QgsRectangle(self.bbox)]
+        self._local = threading.local()
+        self._wkb_hash = None
+
+    @property
+    def wkb_hash(self) -> str:
+        """Impronta della geometria, calcolata una sola volta."""
+        if self._wkb_hash is None:
+            self._wkb_hash = hashlib.sha1(bytes(self.geometry.asWkb())).hexdigest()
+        return self._wkb_hash
+
+    def _engine(self):
+        engine = getattr(self._local, "engine", None)
+        if engine is None:
+            engine = QgsGeometry.createGeometryEngine(self.geometry.constGet())
+            engine.prepareGeometry()
+            self._local.engine = engine
+        return engine
+
+    def intersects(self, geometry: QgsGeometry) -> bool:
+        """Verifica se la geometria interseca la selezione."""
+        bbox = geometry.boundingBox()
+        if not self.bbox.intersects(bbox):
+            return False
+
+        engine = self._engine()
+        if geometry.type() != QgsWkbTypes.PointGeometry:
+            # Accettazione rapida: se la bbox della feature è interamente contenuta nel
+            # poligono non serve valutare la geometria completa della feature
+            bbox_geom = QgsGeometry.fromRect(bbox)
+            if engine.contains(bbox_geom.constGet()):
+                return True
+
+        return engine.intersects(geometry.constGet())
+
+
+class _PreparedAreas:
+    """Poligoni di selezione in un determinato CRS, ciascuno preparato per i test spaziali.
+
+    Un indice spaziale delle bbox dei poligoni restituisce per ogni feature i soli
+    poligoni candidati, per cui il costo del test non cresce con il numero di poligoni.
+    Usato per le aree dell'atlante e, al posto di _PreparedSelection, per selezioni di
+    molti poligoni di cui non conviene calcolare l'unione.
+    """
+
+    def __init__(self, geometries: List[QgsGeometry]) -> None:
+        self.selections = [_PreparedSelection(geometry) for geometry in geometries]
+        self.bbox = QgsRectangle()
+        for selection in self.selections:
+            self.bbox.combineExtentWith(selection.bbox)
+        # Bbox delle richieste al provider, comuni a tutti i poligoni
+        self.rectangles = _cluster_rectangles([selection.bbox for selection in self.selections])
+        self._index, self._index_areas = self._bulk_loaded_index([selection.bbox for selection in self.selections])
+        self._geometry = None
+        self._geometry_lock = threading.Lock()
+        self._wkb_hash = None
+
+    @staticmethod
+    def _bulk_loaded_index(rectangles: List[QgsRectangle]) -> Tuple[QgsSpatialIndex, dict]:
+        """Costruisce l'indice R-tree in blocco (Sort-Tile-Recursive) invece che per inserimenti successivi.
+
+        Il caricamento in blocco di QgsSpatialIndex richiede un iteratore di feature: le
+        bbox vengono passate come rettangoli di un layer in memoria.
+
+        Returns:
+            Indice e mappa id nell'indice -> posizione del poligono
+        """
+        memory_layer = QgsVectorLayer("Polygon", "selection_index", "memory")
+        features = []
+        for rect in rectangles:
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromRect(rect))
+            features.append(feature)
+        _, added = memory_layer.dataProvider().addFeatures(features)
+        index_areas = {feature.id(): area for area, feature in enumerate(added)}
+        request = QgsFeatureRequest()
+        request.setNoAttributes()
+        return QgsSpatialIndex(memory_layer.getFeatures(request)), index_areas
+
+    @property
+    def geometry(self) -> QgsGeometry:
+        """Unione valida dei poligoni, per filtri lato server e ritagli raster.
+
+        Calcolata solo alla prima richiesta: la semplice raccolta dei poligoni non è
+        valida se poligoni adiacenti condividono i lati, e GDAL rifiuta una linea di
+        taglio non valida.
+        """
+        with self._geometry_lock:
+            if self._geometry is None:
+                geometries = [selection.geometry for selection in self.selections]
+                union = QgsGeometry.unaryUnion(geometries)
+                if not union or union.isEmpty():
+                    # Unione fallita (es. poligoni non validi): parti raccolte e rese valide
+                    union = QgsGeometry.collectGeometry(geometries).makeValid()
+                self._geometry = union
+            return self._geometry
+
+    @property
+    def wkb_hash(self) -> str:
+        """Impronta dei poligoni, calcolata senza unirli."""
+        if self._wkb_hash is None:
+            digest = hashlib.sha1()
+            for selection in self.selections:
+                digest.update(bytes(selection.geometry.asWkb()))
+            self._wkb_hash = digest.hexdigest()
+        return self._wkb_hash
+
+    def _candidates(self, bbox: QgsRectangle) -> List[int]:
+        return sorted(self._index_areas[index_id] for index_id in self._index.intersects(bbox))
+
+    def areas_for(self, geometry: QgsGeometry) -> List[int]:
+        """Poligoni (aree) intersecati dalla geometria, in ordine crescente."""
+        return [
+            area for area in self._candidates(geometry.boundingBox())
+            if self.selections[area].intersects(geometry)
+        ]
+
+    def intersects(self, geometry: QgsGeometry) -> bool:
+        """Verifica se la geometria interseca almeno uno dei poligoni."""
+        bbox = geometry.boundingBox()
+        if not self.bbox.intersects(bbox):
+            return False
+        return any(self.selections[area].intersects(geometry) for area in self._candidates(bbox))
+
+
+@contextlib.contextmanager
+def _bulk_load_environment():
+    """Applica i pragma SQLite di caricamento massivo ai dataset aperti nel thread corrente."""
+    if gdal is None:
+        yield
+        return
+
+    previous = {key: gdal.GetThreadLocalConfigOption(key, None) for key in _BULK_LOAD_GDAL_OPTIONS}
+    for key, value in _BULK_LOAD_GDAL_OPTIONS.items():
+        gdal.SetThreadLocalConfigOption(key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            gdal.SetThreadLocalConfigOption(key, value)
+
+
+class _RelationKeys:
+    """Chiavi delle feature esportate di un layer genitore lungo una relazione del progetto.
+
+    Le chiavi vengono raccolte mentre il genitore viene esportato e poi usate per
+    leggere dalla tabella figlia solo le righe che le referenziano.
+    """
+
+    def __init__(self, relation: QgsRelation) -> None:
+        self.name = relation.name() or relation.id()
+        self.parent_id = relation.referencedLayerId()
+        self.child_id = relation.referencingLayerId()
+        # fieldPairs(): campo della tabella figlia -> campo del genitore
+        pairs = relation.fieldPairs()
+        self.child_fields = list(pairs.keys())
+        self.parent_fields = list(pairs.values())
+        parent_fields = relation.referencedLayer().fields()
+        self.parent_indexes = [parent_fields.lookupField(name) for name in self.parent_fields]
+        self.keys = set()
+        self.key_areas = {}  # Modalità atlante: chiave -> aree in cui è esportata la feature genitore
+
+    def collect(self, feature: QgsFeature, areas: Optional[List[int]] = None) -> None:
+        """Registra la chiave della feature esportata (le chiavi nulle non referenziano nulla)."""
+        key = tuple(feature.attribute(index) for index in self.parent_indexes)
+        if all(value is not None and not (isinstance(value, QVariant) and value.isNull()) for value in key):
+            self.keys.add(key)
+            if areas is not None:
+                self.key_areas.setdefault(key, set()).update(areas)
+
+    def digest(self) -> str:
+        """Impronta delle chiavi raccolte, per l'esportazione incrementale della tabella figlia."""
+        return hashlib.sha1(repr(self._sorted_keys()).encode("utf-8")).hexdigest()
+
+    def _sorted_keys(self) -> list:
+        try:
+            return sorted(self.keys)
+        except TypeError:  # Chiavi di tipi non confrontabili
+            return sorted(self.keys, key=repr)
+
+    def filter_expressions(self, batch_size: int = RELATION_KEY_BATCH_SIZE) -> Iterator[str]:
+        """Espressioni di filtro sulla tabella figlia, ciascuna con al massimo batch_size chiavi."""
+        columns = [QgsExpression.quotedColumnRef(name) for name in self.child_fields]
+        keys = self._sorted_keys()
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            if len(columns) == 1:
+                values = ", ".join(QgsExpression.quotedValue(key[0]) for key in batch)
+                yield f"{columns[0]} IN ({values})"
+            else:
+                # Chiavi composte: una condizione per ogni combinazione di valori
+                yield " OR ".join(
+                    "(" + " AND ".join(
+                        f"{column} = {QgsExpression.quotedValue(value)}" for column, value in zip(columns, key)
+                    ) + ")"
+                    for key in batch
+                )
+
+
+class _FileLayerWriter:
+    """Scrive un layer in un proprio file GeoPackage tramite QgsVectorFileWriter.
+
+    Se output_fields è un sottoinsieme dei campi del layer, gli attributi delle feature
+    vengono riordinati sui soli campi esportati.
+    """
+
+    batch_size = FEATURE_BATCH_SIZE
+
+    def __init__(self, path: str, layer_name: str, layer: QgsVectorLayer, output_fields: Optional[QgsFields] = None) -> None:
+        self.uri = path
+        source_fields = layer.fields()
+        self._output_fields = output_fields if output_fields is not None else source_fields
+        if self._output_fields.names() == source_fields.names():
+            self._attribute_indexes = None
+        else:
+            self._attribute_indexes = [source_fields.lookupField(field.name()) for field in self._output_fields]
+
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = "GPKG"
+        options.fileEncoding = layer.dataProvider().encoding() or "UTF-8"
+        options.layerName = layer_name
+        options.symbologyExport = QgsVectorFileWriter.SymbologyExport.FeatureSymbology
+
+        transform_context = QgsProject.instance().transformContext()
+        self._writer = QgsVectorFileWriter.create(
+            path,
+            self._output_fields,
+            layer.wkbType(),
+            layer.crs(),
+            transform_context,
+            options,
+        )
+
+        if self._writer.hasError() != QgsVectorFileWriter.NoError:
+            raise ExportError(f"Errore nella creazione del file: {self._writer.errorMessage()}")
+
+    index_build_seconds = 0.0
+    index_build_failed = False
+
+    def add_features(self, features: List[QgsFeature]) -> None:
+        if self._attribute_indexes is not None:
+            features = [self._project_attributes(feature) for feature in features]
+        if not self._writer.addFeatures(features):
+            raise ExportError(f"Errore nella scrittura delle feature: {self._writer.errorMessage()}")
+
+    def _project_attributes(self, feature: QgsFeature) -> QgsFeature:
+        attributes = feature.attributes()
+        projected = QgsFeature(self._output_fields, feature.id())
+        projected.setAttributes([attributes[index] for index in self._attribute_indexes])
+        if feature.hasGeometry():
+            projected.setGeometry(feature.geometry())
+        return projected
+
+    def finish(self) -> None:
+        # L'indice spaziale viene aggiornato durante la scrittura
+        pass
+
+    def close(self) -> None:
+        # La distruzione del writer chiude il file
+        self._writer = None
+
+
+class _GeoPackageTransactionWriter:
+    """Scrive un layer in un GeoPackage condiviso con una transazione per ogni blocco.
+
+    Lo schema del layer viene creato con QgsVectorFileWriter (sovrascrivendo il solo
+    layer se il file esiste già), poi le feature vengono aggiunte tramite il provider
+    OGR, che racchiude ogni chiamata addFeatures in un'unica transazione SQLite.
+
+    Con bulk_load l'indice spaziale R-tree non viene aggiornato riga per riga ma
+    costruito in un solo passaggio da finish(), che ne misura la durata.
+    """
+
+    batch_size = GPKG_TRANSACTION_BATCH_SIZE
+
+    def __init__(
+        self,
+        path: str,
+        layer_name: str,
+        layer: QgsVectorLayer,
+        overwrite_file: bool,
+        bulk_load: bool = False,
+        output_fields: Optional[QgsFields] = None,
+    ) -> None:
+        self.uri = f"{path}|layername={layer_name}"
+        self.index_build_seconds = 0.0
+        self.index_build_failed = False
+        self._bulk_load = bulk_load
+
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = "GPKG"
+        options.fileEncoding = layer.dataProvider().encoding() or "UTF-8"
+        options.layerName = layer_name
+        if overwrite_file or not os.path.exists(path):
+            options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteFile
+        else:
+            options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
+        if bulk_load:
+            # Indice spaziale rimandato a finish()
+            options.layerOptions = ["SPATIAL_INDEX=NO"]
+
+        source_fields = layer.fields()
+        writer = QgsVectorFileWriter.create(
+            path,
+            output_fields if output_fields is not None else source_fields,
+            layer.wkbType(),
+            layer.crs(),
+            QgsProject.instance().transformContext(),
+            options,
+        )
+        if writer.hasError() != QgsVectorFileWriter.NoError:
+            raise ExportError(f"Errore nella creazione del layer {layer_name}: {writer.errorMessage()}")
+        del writer
+
+        self._layer = QgsVectorLayer(self.uri, layer_name, "ogr")
+        if not self._layer.isValid():
+            raise ExportError(f"Impossibile aprire il layer {layer_name} nel GeoPackage {path}")
+        self._provider = self._layer.dataProvider()
+
+        # Il GeoPackage ha una colonna fid aggiuntiva ed eventualmente solo un sottoinsieme
+        # dei campi: gli attributi vengono associati per nome
+        self._fields = self._provider.fields()
+        self._attribute_map = [source_fields.lookupField(field.name()) for field in self._fields]
+
+    def add_features(self, features: List[QgsFeature]) -> None:
+        converted = []
+        for feature in features:
+            attributes = feature.attributes()
+            new_feature = QgsFeature(self._fields)
+            new_feature.setAttributes([attributes[index] if index >= 0 else None for index in self._attribute_map])
+            if feature.hasGeometry():
+                new_feature.setGeometry(feature.geometry())
+            converted.append(new_feature)
+
+        success, _ = self._provider.addFeatures(converted)
+        if not success:
+            raise ExportError(f"Errore nella scrittura delle feature: {self._provider.lastError()}")
+
+    def finish(self) -> None:
+        """Completa il layer: in modalità bulk load costruisce l'indice spaziale."""
+        if not self._bulk_load or not self._layer.isSpatial():
+            return
+
+        start = time.perf_counter()
+        self.index_build_failed = not self._provider.createSpatialIndex()
+        self.index_build_seconds = time.perf_counter() - start
+
+    def close(self) -> None:
+        self._provider = None
+        self._layer = None
+
+
+class _PreparedLayer:
+    """Sorgente e metadati di un layer vettoriale, letti sul thread che possiede il layer.
+
+    I QgsVectorLayer del progetto non sono thread-safe: i thread dell'esportazione
+    leggono le feature solo da feature_source e usano i valori calcolati qui invece di
+    interrogare il layer o il suo provider (chiave primaria, conteggio, ultima modifica).
+    """
+
+    def __init__(
+        self,
+        feature_source: QgsVectorLayerFeatureSource,
+        keyset_field: Optional[str],
+        change_state: Optional[dict] = None,
+    ) -> None:
+        self.feature_source = feature_source
+        self.keyset_field = keyset_field  # Vedi LayerExporter._keyset_field
+        # Numero di feature e indicatore di ultima modifica per l'esportazione incrementale
+        self.change_state = change_state
+
+
 class LayerExporter:
     """Gestisce l'esportazione dei layer selezionati all'interno di uno o più poligoni."""
 
@@ -96,8 +652,29 @@ class LayerExporter:
         output_directory: str,
         export_directory_name: str = "",
         cancellation_check=None,
+        server_side_filter: bool = False,
+        max_parallel_layers: int = 1,
+        max_connections_per_host: int = 3,
+        single_geopackage: bool = False,
+        bulk_load: bool = False,
+        incremental: bool = False,
+        change_tracking_field: str = "updated_at",
+        attribute_subsets: Optional[dict] = None,
+        clip_rasters: bool = False,
+        tile_cache: bool = False,
+        tile_cache_min_zoom: int = 10,
+        tile_cache_max_zoom: int = 17,
+        related_tables_only: bool = True,
+        atlas: bool = False,
+        layer_finished_callback: Optional[Callable[[QgsMapLayer, int, int], None]] = None,
+        feature_progress_callback: Optional[Callable[[QgsMapLayer, int], None]] = None,
+        logger: Optional[ExportLogger] = None,
+        project: Optional[QgsProject] = None,
+        prepared_layers: Optional[Dict[str, _PreparedLayer]] = None,
     ) -> None:
         self._polygon_layer = polygon_layer
+        # Progetto da cui leggere le relazioni tra i layer (quello corrente se non indicato)
+        self._project = project if project is not None else QgsProject.instance()
 
         # Normalizza: accetta sia una singola feature che una lista
         if isinstance(polygon_features, QgsFeature):
@@ -109,6 +686,43 @@ class LayerExporter:
         self._output_directory = output_directory
         self._export_directory_name = export_directory_name
         self._cancellation_check = cancellation_check  # Funzione per controllare se l'operazione è stata cancellata
+        self._server_side_filter = server_side_filter  # Delega il test spaziale al database quando possibile
+        self._max_parallel_layers = max(1, int(max_parallel_layers))  # Layer esportati contemporaneamente
+        # Letture contemporanee sullo stesso server di database, per non esaurirne le connessioni
+        self._host_limiter = HostConcurrencyLimiter(max_connections_per_host)
+        self._layer_finished_callback = layer_finished_callback  # Chiamata con (layer, completati, totale)
+        self._feature_progress_callback = feature_progress_callback  # Chiamata con (layer, feature lette)
+        # Impostazioni di log lette una sola volta per esportazione
+        self._logger = logger if logger is not None else ExportLogger.from_settings()
+        self._aborted = False  # Impostato quando un'esportazione parallela fallisce
+        self._single_geopackage = single_geopackage  # Tutti i layer in un unico GeoPackage
+        self._created_geopackages = set()  # GeoPackage unici già creati in questa esportazione
+        self._bulk_load = bulk_load  # Indice spaziale differito e pragma SQLite rilassati
+        self._incremental = incremental  # Riutilizza gli output dei layer non modificati
+        self._change_tracking_field = change_tracking_field  # Campo con la data di ultima modifica
+        self._attribute_subsets = attribute_subsets or {}  # id layer -> nomi dei campi da esportare
+        self._clip_rasters = clip_rasters and gdal is not None  # Ritaglia i raster su file invece di referenziarli
+        self._tile_cache = tile_cache  # Scarica le tile XYZ dell'area in un MBTiles
+        self._tile_cache_min_zoom = int(tile_cache_min_zoom)
+        self._tile_cache_max_zoom = int(tile_cache_max_zoom)
+        # Tabelle esportate solo per le righe collegate alle feature esportate dei genitori
+        self._related_tables_only = related_tables_only
+        self._related_tables = {}  # id tabella figlia -> relazioni da cui ricavarne le righe
+        self._relation_keys = {}  # id layer genitore -> chiavi da raccogliere durante l'esportazione
+        self._completed_layers = 0
+        self._completed_lock = threading.Lock()
+        # Modalità atlante: un output per ogni poligono selezionato, con un'unica lettura per layer
+        self._atlas = atlas and bool(self._polygon_features)
+        # Con molti poligoni la selezione è un indice spaziale dei poligoni e non la loro unione
+        self._index_polygons = len(self._polygon_features) > POLYGON_INDEX_THRESHOLD
+        self._atlas_areas = {}  # Poligoni dell'atlante riproiettati per CRS
+        self._atlas_directories: List[str] = []  # Cartella di ciascuna area
+        self._atlas_outputs = {}  # id layer -> {area: output}
+        self._selections = {}  # Selezione riproiettata per CRS, valida per tutta l'esportazione
+        self._reports = {}  # id layer -> LayerReport con tempi e conteggi dell'esportazione
+        self._selections_lock = threading.Lock()
+        # id layer -> _PreparedLayer, da prepare_layers() sul thread che possiede i layer
+        self._prepared_layers = prepared_layers
 
         if not os.path.isdir(self._output_directory):
             raise ExportError("La cartella di destinazione non esiste.")
@@ -133,221 +747,1417 @@ class LayerExporter:
         self._export_subdirectory = os.path.join(self._output_directory, export_dir_name)
         os.makedirs(self._export_subdirectory, exist_ok=True)
 
-    def export(self) -> List[Tuple[str, QgsMapLayer]]:
-        exported_data: List[Tuple[str, QgsMapLayer]] = []
-        transform_context = QgsProject.instance().transformContext()
+        # Nomi di file/layer assegnati in ordine fisso, indipendente dall'esecuzione parallela
+        self._output_names = self._assign_output_names()
 
+        if clip_rasters and gdal is None:
+            self._logger.warning("GDAL Python non disponibile: i raster vengono referenziati invece che ritagliati")
+
+        if self._atlas and self._incremental:
+            # Le impronte sono per layer e non per area
+            self._logger.warning("L'esportazione incrementale non è disponibile in modalità atlante")
+            self._incremental = False
+
+        self._manifest = ExportManifest(self._export_subdirectory) if self._incremental else None
+        if self._incremental and self._single_geopackage and os.path.exists(self._single_geopackage_path()):
+            # Il GeoPackage unico contiene layer riutilizzabili: si sovrascrivono solo i layer
+            self._created_geopackages.add(self._single_geopackage_path())
+
+    def export(self) -> List[Tuple[str, QgsMapLayer]]:
         # Determina se dobbiamo applicare ritagli geometrici
         use_clipping = len(self._polygon_features) > 0
         union_geom = None
+        export_start = time.perf_counter()
+        union_seconds = 0.0
 
-        if use_clipping:
+        if self._atlas:
+            # Ogni poligono è un'area a sé: l'unione non serve
+            self._prepare_atlas()
+        elif use_clipping and self._index_polygons:
+            # Molti poligoni: nessuna unione, i test usano l'indice spaziale dei poligoni
+            # per CRS (_selection_for_crs). La raccolta delle geometrie indica solo che la
+            # selezione è attiva: ritaglio raster e filtro lato server usano l'unione valida
+            # calcolata da _PreparedAreas.geometry quando servono
+            union_geom = QgsGeometry.collectGeometry([feature.geometry() for feature in self._polygon_features])
+            self._logger.log(
+                f"{len(self._polygon_features)} poligoni di selezione: indice spaziale invece dell'unione",
+                Qgis.Info,
+            )
+        elif use_clipping:
             # Unisce tutte le geometrie dei poligoni selezionati in un'unica geometria
             union_geom = self._union_polygon_geometries()
+            union_seconds = time.perf_counter() - export_start
+        if use_clipping and self._related_tables_only:
+            self._plan_related_tables()
+        if self._prepared_layers is None:
+            # Esportazione eseguita sul thread che possiede i layer (es. Processing)
+            self._prepared_layers = self.prepare_layers(
+                self._target_layers, self._incremental, self._change_tracking_field
+            )
 
-        for layer in self._target_layers:
-            if layer.type() == QgsMapLayer.VectorLayer:
-                # I layer senza geometria (tabelle) vengono sempre esportati completamente
-                # Gestisce sia NoGeometry che NullGeometry
-                geom_type = layer.geometryType()
-                if geom_type == QgsWkbTypes.NoGeometry or geom_type == QgsWkbTypes.NullGeometry:
-                    _log_message(
-                        f"Esportazione layer senza geometria (tabella): {layer.name()}",
-                        Qgis.Info,
+        completed = False
+        try:
+            results = self._export_all_layers(union_geom)
+            completed = True
+        finally:
+            if self._manifest is not None:
+                self._manifest.save()
+            self._write_report(completed, union_seconds, time.perf_counter() - export_start)
+            self._logger.flush()
+
+        if self._atlas:
+            exported_data = [output for _, area_data in self.atlas_results() for output in area_data]
+        else:
+            exported_data = [result for result in results if result is not None]
+        if not exported_data:
+            raise ExportError("Nessuna feature è stata esportata. Verifica le selezioni.")
+
+        return exported_data
+
+    def atlas_results(self) -> List[Tuple[str, List[Tuple[str, QgsMapLayer]]]]:
+        """Per ogni area dell'atlante la cartella e le tuple (percorso, layer) esportate.
+
+        Restituisce una lista vuota fuori dalla modalità atlante.
+        """
+        results = []
+        for area, directory in enumerate(self._atlas_directories):
+            area_data = []
+            for layer in self._target_layers:
+                outputs = self._atlas_outputs.get(layer.id(), {})
+                if area in outputs:
+                    area_data.append((outputs[area], layer))
+            results.append((directory, area_data))
+        return results
+
+    def _prepare_atlas(self) -> None:
+        """Assegna a ogni poligono dell'atlante un nome e ne crea la cartella di output.
+
+        Il nome è il valore dell'espressione di visualizzazione del layer poligonale
+        (es. il nome del distretto), oppure area_<id> se vuoto.
+        """
+        expression = QgsExpression(self._polygon_layer.displayExpression())
+        context = QgsExpressionContext(QgsExpressionContextUtils.globalProjectLayerScopes(self._polygon_layer))
+        used = set()
+        for feature in self._polygon_features:
+            context.setFeature(feature)
+            value = expression.evaluate(context)
+            base_name = self._sanitize_filename(str(value)) if value not in (None, "") and not (
+                isinstance(value, QVariant) and value.isNull()
+            ) else f"area_{feature.id()}"
+            name = base_name
+            suffix = 2
+            while name.lower() in used:
+                name = f"{base_name}_{suffix}"
+                suffix += 1
+            used.add(name.lower())
+            directory = os.path.join(self._export_subdirectory, name)
+            os.makedirs(directory, exist_ok=True)
+            self._atlas_directories.append(directory)
+
+        self._logger.log(f"Modalità atlante: {len(self._atlas_directories)} aree", Qgis.Info)
+
+    def _areas_for_crs(self, crs) -> _PreparedAreas:
+        """Restituisce i singoli poligoni selezionati riproiettati nel CRS indicato, con il loro
+        indice spaziale (calcolati una volta per CRS)."""
+        key = crs.authid() or crs.toWkt()
+        with self._selections_lock:
+            areas = self._atlas_areas.get(key)
+            if areas is not None:
+                return areas
+
+            transform = None
+            if self._polygon_layer.crs() != crs:
+                transform = QgsCoordinateTransform(
+                    self._polygon_layer.crs(), crs, QgsProject.instance().transformContext()
+                )
+            geometries = []
+            for feature in self._polygon_features:
+                geometry = QgsGeometry(feature.geometry())
+                if transform is not None:
+                    geometry.transform(transform)
+                geometries.append(geometry)
+
+            areas = _PreparedAreas(geometries)
+            self._atlas_areas[key] = areas
+            return areas
+
+    def _export_all_layers(self, union_geom: Optional[QgsGeometry]) -> List[Optional[Tuple[str, QgsMapLayer]]]:
+        results: List[Optional[Tuple[str, QgsMapLayer]]] = [None] * len(self._target_layers)
+        indexes = {layer.id(): index for index, layer in enumerate(self._target_layers)}
+        # SQLite ammette un solo scrittore: con il GeoPackage unico i layer vengono scritti in sequenza
+        parallel = self._max_parallel_layers > 1 and not self._single_geopackage
+        for stage in self._export_stages():
+            if parallel and len(stage) > 1:
+                self._export_layers_in_parallel(stage, union_geom, results, indexes)
+            else:
+                for layer in stage:
+                    self._check_cancelled()
+                    result = self._export_and_report(layer, self._prepared_layers.get(layer.id()), union_geom)
+                    results[indexes[layer.id()]] = result
+                    self._layer_completed(layer)
+        return results
+
+    def _export_layers_in_parallel(
+        self,
+        layers: List[QgsMapLayer],
+        union_geom: Optional[QgsGeometry],
+        results: List[Optional[Tuple[str, QgsMapLayer]]],
+        indexes: dict,
+    ) -> None:
+        """Esporta i layer contemporaneamente, ciascuno nel proprio file, con al massimo
+        max_parallel_layers esportazioni attive.
+
+        I risultati vengono scritti in results alla posizione del layer tra quelli di
+        destinazione. Al primo errore le esportazioni ancora in coda vengono annullate
+        e quelle in corso interrotte al successivo controllo di cancellazione.
+        """
+        self._logger.log(
+            f"Esportazione parallela di {len(layers)} layer (max {self._max_parallel_layers} contemporanei)",
+            Qgis.Info,
+        )
+        # Layer di server diversi alternati, così i thread non attendono tutti lo stesso server
+        with ThreadPoolExecutor(max_workers=self._max_parallel_layers) as executor:
+            futures = {
+                executor.submit(
+                    self._export_and_report, layer, self._prepared_layers.get(layer.id()), union_geom
+                ): layer
+                for layer in interleave_by_host(layers)
+            }
+            try:
+                for future in as_completed(futures):
+                    layer = futures[future]
+                    results[indexes[layer.id()]] = future.result()
+                    self._layer_completed(layer)
+            except BaseException:
+                # Ferma le esportazioni in coda e quelle in corso, poi propaga il primo errore
+                self._aborted = True
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def _layer_completed(self, layer: QgsMapLayer) -> None:
+        with self._completed_lock:
+            self._completed_layers += 1
+            self._notify_layer_finished(layer, self._completed_layers, len(self._target_layers))
+
+    def _plan_related_tables(self) -> None:
+        """Individua le tabelle da esportare solo per le righe collegate alle feature esportate.
+
+        Una tabella senza geometria viene ridotta se è la tabella figlia (referencing) di
+        una relazione del progetto il cui genitore viene a sua volta ridotto: un layer
+        con geometria filtrato sull'area oppure, lungo catene di relazioni, un'altra
+        tabella ridotta. Le altre tabelle continuano a essere esportate per intero.
+        """
+        targets = {layer.id(): layer for layer in self._target_layers if layer.type() == QgsMapLayer.VectorLayer}
+        relations = [
+            relation
+            for relation in self._project.relationManager().relations().values()
+            if relation.isValid()
+            and relation.referencedLayerId() in targets
+            and relation.referencingLayerId() in targets
+            and relation.referencedLayerId() != relation.referencingLayerId()
+        ]
+        if not relations:
+            return
+
+        def is_table(layer_id: str) -> bool:
+            return targets[layer_id].geometryType() in (QgsWkbTypes.NoGeometry, QgsWkbTypes.NullGeometry)
+
+        reduced = {layer_id for layer_id in targets if not is_table(layer_id)}
+        changed = True
+        while changed:
+            changed = False
+            for relation in relations:
+                child_id = relation.referencingLayerId()
+                if child_id not in reduced and relation.referencedLayerId() in reduced and is_table(child_id):
+                    reduced.add(child_id)
+                    changed = True
+
+        for relation in relations:
+            child_id = relation.referencingLayerId()
+            if is_table(child_id) and relation.referencedLayerId() in reduced:
+                keys = _RelationKeys(relation)
+                self._related_tables.setdefault(child_id, []).append(keys)
+                self._relation_keys.setdefault(keys.parent_id, []).append(keys)
+                self._logger.debug(
+                    "Tabella %s ridotta alle righe collegate a %s (relazione %s)",
+                    targets[child_id].name(),
+                    targets[keys.parent_id].name(),
+                    keys.name,
+                )
+
+    def _export_stages(self) -> List[List[QgsMapLayer]]:
+        """Suddivide i layer in fasi successive: ogni tabella ridotta segue i suoi genitori.
+
+        Senza tabelle ridotte c'è un'unica fase con tutti i layer. Le tabelle che si
+        referenziano a vicenda (relazioni cicliche) vengono esportate per intero.
+        """
+        if not self._related_tables:
+            return [self._target_layers]
+
+        stages = []
+        exported = set()
+        remaining = list(self._target_layers)
+        while remaining:
+            stage = [
+                layer for layer in remaining
+                if all(keys.parent_id in exported for keys in self._related_tables.get(layer.id(), []))
+            ]
+            if not stage:
+                for layer in remaining:
+                    self._logger.warning(
+                        f"Relazioni cicliche per la tabella {layer.name()}: esportata per intero"
                     )
-                    features = self._all_features(layer)
-                    # I layer senza geometria vengono sempre esportati, anche se vuoti
-                elif use_clipping:
-                    # Logica di esportazione per layer vettoriali con geometria (con filtro spaziale)
-                    geom_for_layer = QgsGeometry(union_geom)
-
-                    if not geom_for_layer.isEmpty() and self._polygon_layer.crs() != layer.crs():
-                        transform = QgsCoordinateTransform(
-                            self._polygon_layer.crs(), layer.crs(), transform_context
-                        )
-                        geom_for_layer.transform(transform)
-
-                    features = self._features_within(layer, geom_for_layer)
-                    if not features:
-                        continue
+                    self._related_tables.pop(layer.id(), None)
+                stage = remaining
+            stages.append(stage)
+            exported.update(layer.id() for layer in stage)
+            remaining = [layer for layer in remaining if layer.id() not in exported]
+        return stages
+
+    def _notify_layer_finished(self, layer: QgsMapLayer, completed: int, total: int) -> None:
+        if self._layer_finished_callback is not None:
+            self._layer_finished_callback(layer, completed, total)
+
+    def _notify_feature_progress(self, layer: QgsMapLayer, report: LayerReport) -> None:
+        if self._feature_progress_callback is not None:
+            self._feature_progress_callback(layer, report.candidates)
+
+    def _export_and_report(
+        self,
+        layer: QgsMapLayer,
+        prepared: Optional[_PreparedLayer],
+        union_geom: Optional[QgsGeometry],
+    ) -> Optional[Tuple[str, QgsMapLayer]]:
+        """Esporta il layer registrandone durata, esito e memoria nel report.
+
+        La durata esclude l'attesa di uno slot del server: alimenta le stime dei tempi
+        delle esportazioni successive (vedi ExportStatistics).
+        """
+        report = self._report_for(layer)
+        start = time.perf_counter()
+        try:
+            with self._host_limiter.slot(layer):
+                start = time.perf_counter()
+                result = self._export_target_layer(layer, prepared, union_geom)
+        except BaseException:
+            report.status = "failed"
+            raise
+        finally:
+            report.total_seconds = time.perf_counter() - start
+            report.peak_memory_bytes = peak_memory_bytes()
+
+        if result is None:
+            report.status = report.status or "empty"
+        else:
+            report.status = report.status or "exported"
+            report.output = report.output or result[0]
+        return result
+
+    def _report_for(self, layer: QgsMapLayer) -> LayerReport:
+        report = self._reports.get(layer.id())
+        if report is None:
+            report = LayerReport(layer.id(), layer.name(), layer.providerType())
+            self._reports[layer.id()] = report
+        return report
+
+    def _write_report(self, completed: bool, union_seconds: float, total_seconds: float) -> None:
+        """Scrive il report delle prestazioni nella cartella di esportazione."""
+        reports = [self._reports[layer.id()] for layer in self._target_layers if layer.id() in self._reports]
+        summary = {
+            "completed": completed,
+            "polygons": len(self._polygon_features),
+            "atlas_areas": len(self._atlas_directories),
+            "union_seconds": round(union_seconds, 4),
+            "total_seconds": round(total_seconds, 4),
+            "options": {
+                "server_side_filter": self._server_side_filter,
+                "max_parallel_layers": self._max_parallel_layers,
+                "max_connections_per_host": self._host_limiter.max_per_host,
+                "single_geopackage": self._single_geopackage,
+                "bulk_load": self._bulk_load,
+                "incremental": self._incremental,
+                "related_tables_only": self._related_tables_only,
+                "atlas": self._atlas,
+            },
+        }
+        try:
+            path = write_report(self._export_subdirectory, reports, summary)
+            # Le statistiche accumulate alimentano le stime del piano di esportazione
+            statistics = ExportStatistics(self._output_directory)
+            statistics.update(reports)
+            statistics.save()
+        except OSError as e:
+            self._logger.log(f"Impossibile scrivere il report delle prestazioni: {str(e)}", Qgis.Warning)
+            return
+        self._logger.log(f"Report delle prestazioni salvato in {path}", Qgis.Info)
+
+    def _export_target_layer(
+        self,
+        layer: QgsMapLayer,
+        prepared: Optional[_PreparedLayer],
+        union_geom: Optional[QgsGeometry],
+    ) -> Optional[Tuple[str, QgsMapLayer]]:
+        """Esporta un singolo layer di destinazione.
+
+        I layer vettoriali vengono letti solo tramite prepared (vedi prepare_layers).
+
+        Returns:
+            Tupla (percorso, layer) da includere nel progetto, oppure None se il layer
+            non produce output
+        """
+        self._check_cancelled()
+
+        if self._atlas:
+            return self._export_atlas_layer(layer, prepared)
+
+        if layer.type() == QgsMapLayer.VectorLayer:
+            selection = None
+            keep_empty = False
+
+            # I layer senza geometria (tabelle) vengono esportati completamente, oppure
+            # solo per le righe collegate alle feature esportate dei layer genitori
+            # Gestisce sia NoGeometry che NullGeometry
+            geom_type = layer.geometryType()
+            related = self._related_tables.get(layer.id())
+            if geom_type == QgsWkbTypes.NoGeometry or geom_type == QgsWkbTypes.NullGeometry:
+                self._logger.log(
+                    f"Esportazione layer senza geometria (tabella): {layer.name()}"
+                    + (" (solo righe collegate)" if related else ""),
+                    Qgis.Info,
+                )
+                # I layer senza geometria vengono sempre esportati, anche se vuoti
+                keep_empty = True
+                if related:
+                    features_factory = lambda: self._related_features(layer, prepared, related)
                 else:
-                    # Esporta tutti gli elementi senza ritaglio
-                    features = self._all_features(layer)
-                    if not features:
-                        continue
+                    features_factory = lambda: self._all_features(layer, prepared)
+            elif union_geom is not None:
+                # Logica di esportazione per layer vettoriali con geometria (con filtro spaziale)
+                selection = self._selection_for_crs(layer.crs(), union_geom)
+                features_factory = lambda: self._features_within(layer, prepared, selection)
+            else:
+                # Esporta tutti gli elementi senza ritaglio
+                features_factory = lambda: self._all_features(layer, prepared)
+
+            collectors = self._relation_keys.get(layer.id())
+            if collectors:
+                # Le chiavi delle feature esportate selezionano le righe delle tabelle figlie
+                features_factory = self._collecting_relation_keys(features_factory, collectors)
+
+            fingerprint = None
+            # Un genitore delle tabelle ridotte va sempre letto per raccoglierne le chiavi
+            if self._incremental and not collectors:
+                fingerprint, details = self._layer_fingerprint(layer, prepared, selection)
+                previous = self._manifest.lookup(layer.id(), fingerprint) if fingerprint else None
+                if previous is not None:
+                    self._logger.log(f"Layer {layer.name()} invariato dall'esportazione precedente: output riutilizzato", Qgis.Info)
+                    self._report_for(layer).status = "reused"
+                    return (previous["output"], layer) if previous["output"] else None
+
+            if self._manifest is not None:
+                # L'output precedente sta per essere sovrascritto: se la scrittura fallisce o
+                # viene cancellata, l'esportazione successiva non deve riutilizzarlo
+                self._manifest.discard(layer.id())
+            path = self._export_features(layer, features_factory, keep_empty)
+
+            if fingerprint:
+                self._manifest.record(layer.id(), fingerprint, path, details)
+
+            if path is None:
+                # Nessuna feature da esportare per questo layer
+                return None
+            return path, layer
+
+        if layer.type() == QgsMapLayer.RasterLayer:
+            raster_path = self._local_raster_path(layer)
+            if self._clip_rasters and union_geom is not None and raster_path:
+                self._report_for(layer).status = "clipped"
+                selection = self._selection_for_crs(layer.crs(), union_geom)
+                output_path = os.path.join(self._export_subdirectory, f"{self._output_name(layer)}.tif")
+                return self._export_raster(layer, raster_path, selection, output_path), layer
+
+            url_template = self._xyz_url_template(layer)
+            if self._tile_cache and union_geom is not None and url_template:
+                self._report_for(layer).status = "tile_cache"
+                mercator = self._selection_for_crs(QgsCoordinateReferenceSystem("EPSG:3857"), union_geom)
+                output_path = os.path.join(self._export_subdirectory, f"{self._output_name(layer)}.mbtiles")
+                return self._export_tile_cache(layer, url_template, mercator, output_path), layer
+
+            # Per gli altri layer raster (come XYZ Tiles), li aggiungiamo direttamente al progetto senza esportazione di file
+            # semplicemente includendo il riferimento al layer originale.
+            self._report_for(layer).status = "referenced"
+            return layer.source(), layer
+
+        self._logger.log(
+            f"Tipo di layer non supportato per l'esportazione: {layer.name()} ({layer.type()})",
+            Qgis.Warning,
+        )
+        return None
+
+    def _export_atlas_layer(
+        self, layer: QgsMapLayer, prepared: Optional[_PreparedLayer]
+    ) -> Optional[Tuple[str, QgsMapLayer]]:
+        """Esporta il layer in tutte le aree dell'atlante leggendo la sorgente una sola volta.
+
+        Le feature vengono lette per l'estensione complessiva delle aree, assegnate alle
+        aree che intersecano tramite l'indice spaziale dei poligoni e scritte nei file
+        delle rispettive aree. Le tabelle vengono copiate in ogni area (oppure, se
+        collegate da relazioni, solo nelle aree delle feature genitore).
+
+        Returns:
+            Tupla (primo output, layer) se almeno un'area ha ricevuto un output, altrimenti None
+        """
+        report = self._report_for(layer)
+        all_areas = list(range(len(self._atlas_directories)))
+        outputs = {}
 
-                path = self._export_layer(layer, features)
-                exported_data.append((path, layer))
-            
-            elif layer.type() == QgsMapLayer.RasterLayer:
-                # Per i layer raster (come XYZ Tiles), li aggiungiamo direttamente al progetto senza esportazione di file
-                # Non effettuiamo ritagli di raster qui; semplicemente includiamo il riferimento al layer originale.
-                exported_data.append((layer.source(), layer))
-            
+        if layer.type() == QgsMapLayer.VectorLayer:
+            geom_type = layer.geometryType()
+            if geom_type == QgsWkbTypes.NoGeometry or geom_type == QgsWkbTypes.NullGeometry:
+                keep_empty = True
+                related = self._related_tables.get(layer.id())
+                if related:
+                    features_factory = lambda: self._related_features(layer, prepared, related, atlas=True)
+                else:
+                    features_factory = lambda: ((feature, all_areas) for feature in self._all_features(layer, prepared))
             else:
-                _log_message(
-                    f"Tipo di layer non supportato per l'esportazione: {layer.name()} ({layer.type()})",
-                    Qgis.Warning,
-                )
+                keep_empty = False
+                areas = self._areas_for_crs(layer.crs())
+                features_factory = lambda: self._atlas_features_within(layer, prepared, areas)
+
+            collectors = self._relation_keys.get(layer.id())
+            if collectors:
+                features_factory = self._collecting_relation_keys(features_factory, collectors, atlas=True)
+
+            outputs = self._export_features(layer, features_factory, keep_empty, atlas=True)
+
+        elif layer.type() == QgsMapLayer.RasterLayer:
+            raster_path = self._local_raster_path(layer)
+            url_template = self._xyz_url_template(layer)
+            if self._clip_rasters and raster_path:
+                report.status = "clipped"
+                areas = self._areas_for_crs(layer.crs())
+                for area, selection in enumerate(areas.selections):
+                    output_path = os.path.join(self._atlas_directories[area], f"{self._output_name(layer)}.tif")
+                    outputs[area] = self._export_raster(layer, raster_path, selection, output_path)
+            elif self._tile_cache and url_template:
+                report.status = "tile_cache"
+                areas = self._areas_for_crs(QgsCoordinateReferenceSystem("EPSG:3857"))
+                for area, selection in enumerate(areas.selections):
+                    output_path = os.path.join(self._atlas_directories[area], f"{self._output_name(layer)}.mbtiles")
+                    outputs[area] = self._export_tile_cache(layer, url_template, selection, output_path)
+            else:
+                # Servizi e raster remoti restano referenziati in ogni area
+                report.status = "referenced"
+                outputs = dict.fromkeys(all_areas, layer.source())
+
+        else:
+            self._logger.log(
+                f"Tipo di layer non supportato per l'esportazione: {layer.name()} ({layer.type()})",
+                Qgis.Warning,
+            )
+
+        self._atlas_outputs[layer.id()] = outputs
+        if not outputs:
+            return None
+        report.output = [outputs[area] for area in sorted(outputs)]
+        return outputs[min(outputs)], layer
+
+    @staticmethod
+    def prepare_layers(
+        layers: Iterable[QgsMapLayer], incremental: bool = False, change_tracking_field: str = "updated_at"
+    ) -> Dict[str, _PreparedLayer]:
+        """Prepara la lettura dei layer vettoriali in un unico passaggio.
+
+        Va chiamato sul thread che possiede i layer (quello principale) prima di
+        avviare l'esportazione in un altro thread, passando il risultato come
+        prepared_layers. Con incremental=True vengono letti anche numero di feature e
+        indicatore di ultima modifica usati dalle impronte dei layer.
+        """
+        prepared = {}
+        for layer in layers:
+            if layer.type() != QgsMapLayer.VectorLayer:
                 continue
+            prepared[layer.id()] = _PreparedLayer(
+                QgsVectorLayerFeatureSource(layer),
+                LayerExporter._keyset_field(layer),
+                LayerExporter._change_state(layer, change_tracking_field) if incremental else None,
+            )
+        return prepared
 
-        if not exported_data:
-            raise ExportError("Nessuna feature è stata esportata. Verifica le selezioni.")
+    @staticmethod
+    def _change_state(layer: QgsVectorLayer, change_tracking_field: str) -> dict:
+        """Numero di feature e indicatore di ultima modifica del layer: data del file per le
+        sorgenti su file, massimo di change_tracking_field per i database.
 
-        return exported_data
+        L'indicatore è None se non disponibile o se il layer ha modifiche non salvate.
+        """
+        last_modified = None
+        path = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source()).get("path")
+        if path and os.path.isfile(path):
+            last_modified = os.path.getmtime(path)
+        else:
+            field_index = layer.fields().lookupField(change_tracking_field) if change_tracking_field else -1
+            if field_index >= 0:
+                last_modified = str(layer.maximumValue(field_index))
+        if layer.isModified():
+            last_modified = None
+        return {"feature_count": layer.featureCount(), "last_modified": last_modified}
 
     def get_export_directory(self) -> str:
         """Restituisce la sottodirectory dove sono stati salvati i file esportati."""
         return self._export_subdirectory
 
+    def _layer_fingerprint(
+        self, layer: QgsVectorLayer, prepared: _PreparedLayer, selection: Optional[_PreparedSelection]
+    ) -> Tuple[Optional[str], dict]:
+        """Calcola l'impronta della sorgente del layer per l'esportazione incrementale.
+
+        L'impronta comprende sorgente (senza password), filtro, geometria di selezione,
+        schema, numero di feature e un indicatore di ultima modifica, questi ultimi letti
+        da prepare_layers (vedi _change_state). Se nessun indicatore di modifica è
+        disponibile restituisce None e il layer viene sempre riesportato, perché il solo
+        conteggio non rileva le modifiche agli attributi.
+        """
+        change_state = prepared.change_state or {}
+        details = {
+            "source": QgsDataSourceUri.removePassword(layer.source()),
+            "provider": layer.providerType(),
+            "subset": layer.subsetString(),
+            "fields": [f"{field.name()}:{field.typeName()}" for field in self._output_fields(layer)],
+            "selection": selection.wkb_hash if selection is not None else None,
+            "output": self._output_name(layer),
+            "single_geopackage": self._single_geopackage,
+            "feature_count": change_state.get("feature_count"),
+            "related_keys": [keys.digest() for keys in self._related_tables.get(layer.id(), [])],
+        }
+
+        last_modified = change_state.get("last_modified")
+        if last_modified is None:
+            self._logger.log(
+                f"Layer {layer.name()}: nessun indicatore di modifica disponibile, il layer viene riesportato",
+                Qgis.Info,
+            )
+            return None, details
+
+        details["last_modified"] = last_modified
+        fingerprint = hashlib.sha256(json.dumps(details, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return fingerprint, details
+
+    def _selection_for_crs(self, crs, union_geom: QgsGeometry) -> Union[_PreparedSelection, _PreparedAreas]:
+        """Restituisce la selezione riproiettata nel CRS indicato.
+
+        La riproiezione della geometria, la sua bbox e le bbox delle richieste vengono
+        calcolate una sola volta per ciascun CRS distinto e riusate da tutti i layer
+        dell'esportazione con quel CRS. Oltre POLYGON_INDEX_THRESHOLD poligoni la
+        selezione è l'indice spaziale dei singoli poligoni.
+        """
+        if self._index_polygons:
+            return self._areas_for_crs(crs)
+
+        key = crs.authid() or crs.toWkt()
+        with self._selections_lock:
+            selection = self._selections.get(key)
+            if selection is not None:
+                return selection
+
+            geometry = QgsGeometry(union_geom)
+            transform = None
+            if not geometry.isEmpty() and self._polygon_layer.crs() != crs:
+                transform = QgsCoordinateTransform(
+                    self._polygon_layer.crs(), crs, QgsProject.instance().transformContext()
+                )
+                geometry.transform(transform)
+                self._logger.debug("Geometria di selezione riproiettata in %s", key)
+
+            selection = _PreparedSelection(geometry, self._polygon_rectangles(transform))
+            self._selections[key] = selection
+            return selection
+
+    def _polygon_rectangles(self, transform: Optional[QgsCoordinateTransform] = None) -> List[QgsRectangle]:
+        """Restituisce le bbox dei singoli poligoni selezionati, eventualmente riproiettate."""
+        rectangles = []
+        for feature in self._polygon_features:
+            rect = feature.geometry().boundingBox()
+            if transform is not None:
+                rect = transform.transformBoundingBox(rect)
+            rectangles.append(rect)
+        return rectangles
+
     def _union_polygon_geometries(self) -> QgsGeometry:
-        """Unisce tutte le geometrie dei poligoni selezionati in un'unica geometria."""
+        """Unisce tutte le geometrie dei poligoni selezionati in un'unica geometria.
+
+        L'unione viene calcolata con un'unica unione a cascata (GEOS) su tutte le
+        geometrie e memorizzata per layer, id delle feature e stato delle geometrie,
+        così esportazioni ripetute della stessa area non la ricalcolano.
+        """
         if len(self._polygon_features) == 1:
             # Se c'è un solo poligono, restituisci direttamente la sua geometria
             return QgsGeometry(self._polygon_features[0].geometry())
-        
-        # Combina tutte le geometrie in una geometria multi-poligono
-        # combine() crea una geometria che contiene tutte le geometrie
-        combined_geom = QgsGeometry(self._polygon_features[0].geometry())
-        for feature in self._polygon_features[1:]:
-            feature_geom = QgsGeometry(feature.geometry())
-            combined_result = combined_geom.combine(feature_geom)
-            if combined_result and not combined_result.isEmpty():
-                combined_geom = combined_result
-        
-        # Se possibile, unisci effettivamente le geometrie sovrapposte usando unaryUnion
-        # Questo crea una singola geometria unificata invece di una multi-geometria
-        try:
-            if hasattr(combined_geom, 'unaryUnion'):
-                union_geom = combined_geom.unaryUnion()
-                if union_geom and not union_geom.isEmpty():
-                    return union_geom
-        except (AttributeError, Exception):
-            # Se unaryUnion non è disponibile o fallisce, usa la geometria combinata
-            pass
-        
-        return combined_geom
-
-    def _features_within(self, layer: QgsVectorLayer, polygon_geom: QgsGeometry) -> List[QgsFeature]:
-        result: List[QgsFeature] = []
-
-        # Usa una richiesta spaziale per limitare le features caricate
-        # Questo riduce significativamente il carico sul database
-        request = QgsFeatureRequest()
-        request.setFilterRect(polygon_geom.boundingBox())
 
-        # Aggiungi un piccolo buffer alla bounding box per essere sicuri di non perdere features
-        buffered_bbox = polygon_geom.boundingBox()
+        cache_key = self._union_cache_key()
+        with _union_cache_lock:
+            cached = _union_cache.get(cache_key)
+            if cached is not None:
+                _union_cache.move_to_end(cache_key)
+                self._logger.debug("Unione dei poligoni di selezione recuperata dalla cache")
+                return QgsGeometry(cached)
+
+        geometries = [QgsGeometry(feature.geometry()) for feature in self._polygon_features]
+        union_geom = QgsGeometry.unaryUnion(geometries)
+        if not union_geom or union_geom.isEmpty():
+            # Unione fallita (es. geometrie non valide): usa una multi-geometria con tutte le parti
+            union_geom = QgsGeometry.collectGeometry(geometries)
+
+        with _union_cache_lock:
+            _union_cache[cache_key] = QgsGeometry(union_geom)
+            while len(_union_cache) > _UNION_CACHE_SIZE:
+                _union_cache.popitem(last=False)
+
+        return union_geom
+
+    def _union_cache_key(self) -> tuple:
+        """Chiave di cache: layer, id delle feature selezionate e stato delle loro geometrie.
+
+        Lo stato include il flag di modifica del layer e un checksum del WKB delle
+        geometrie, molto più economico dell'unione, così una geometria modificata
+        (anche non ancora salvata) invalida sempre la cache.
+        """
+        features = sorted(self._polygon_features, key=lambda feature: feature.id())
+        checksum = 0
+        for feature in features:
+            checksum = zlib.crc32(bytes(feature.geometry().asWkb()), checksum)
+        return (
+            self._polygon_layer.id(),
+            tuple(feature.id() for feature in features),
+            (self._polygon_layer.isModified(), checksum),
+        )
+
+    def _check_cancelled(self) -> None:
+        """Solleva ExportError se l'operazione è stata cancellata dall'utente."""
+        if self._aborted:
+            raise ExportError("Esportazione interrotta a causa di un errore su un altro layer")
+        if self._cancellation_check and self._cancellation_check():
+            raise ExportError("Esportazione cancellata dall'utente")
+
+    def _features_within(
+        self, layer: QgsVectorLayer, prepared: _PreparedLayer, selection: _PreparedSelection
+    ) -> Iterator[QgsFeature]:
+        """Restituisce in streaming le features del layer che intersecano la selezione."""
+        report = self._report_for(layer)
+
+        # Se il database può eseguire il test esatto, solo le feature effettivamente
+        # intersecanti attraversano la rete e il test lato client non è più necessario
+        with report.timed("request_setup"):
+            filtered_layer = self._server_filtered_layer(layer, selection) if self._server_side_filter else None
+        filtered_on_server = filtered_layer is not None
+        if filtered_on_server:
+            # La copia filtrata è creata da questo thread, che ne crea anche la sorgente
+            prepared = _PreparedLayer(QgsVectorLayerFeatureSource(filtered_layer), prepared.keyset_field)
+
+        # Con più gruppi di poligoni distanti una feature può ricadere in più richieste:
+        # gli id già restituiti vengono scartati
+        multiple_requests = len(selection.rectangles) > 1
+        seen_ids = set()
+
+        for rect in selection.rectangles:
+            # Usa una richiesta spaziale per limitare le features caricate
+            # Questo riduce significativamente il carico sul database
+            buffered_bbox = self._request_rectangle(rect)
+
+            def build_request(rect=buffered_bbox):
+                request = QgsFeatureRequest()
+                request.setFilterRect(rect)
+                self._apply_attribute_subset(layer, request)
+                return request
+
+            for feature in self._resumable_features(layer, prepared, build_request, report):
+                # Controlla se l'operazione è stata cancellata
+                self._check_cancelled()
+
+                if multiple_requests:
+                    if feature.id() in seen_ids:
+                        continue
+                    seen_ids.add(feature.id())
+
+                geometry = feature.geometry()
+                if not geometry or geometry.isEmpty():
+                    continue
+
+                # Verifica se la geometria interseca il poligono (motore GEOS preparato)
+                if not filtered_on_server:
+                    predicate_start = time.perf_counter()
+                    intersects = selection.intersects(geometry)
+                    report.seconds["predicate"] += time.perf_counter() - predicate_start
+                    if not intersects:
+                        continue
+
+                # Includi la feature con la geometria originale, senza tagliare
+                report.accepted += 1
+                yield feature
+
+    def _related_features(
+        self,
+        layer: QgsVectorLayer,
+        prepared: _PreparedLayer,
+        relation_keys: List[_RelationKeys],
+        atlas: bool = False,
+    ) -> Iterator[Union[QgsFeature, Tuple[QgsFeature, List[int]]]]:
+        """Restituisce in streaming le righe della tabella che referenziano le feature esportate dei genitori.
+
+        Le righe vengono lette con richieste "campo IN (...)" di RELATION_KEY_BATCH_SIZE
+        chiavi, che i provider di database traducono in query sull'indice della chiave
+        esterna: il tempo di lettura dipende dalle righe collegate e non dalla tabella.
+        Con atlas=True ogni riga è accompagnata dalle aree delle sue feature genitore.
+        """
+        report = self._report_for(layer)
+
+        # Una riga collegata lungo più relazioni viene restituita una sola volta (per area)
+        multiple_relations = len(relation_keys) > 1
+        seen_ids = set()
+        seen_areas = {}
+
+        for keys in relation_keys:
+            self._logger.debug(
+                "%s: %d chiavi di collegamento dalla relazione %s", layer.name(), len(keys.keys), keys.name
+            )
+            child_indexes = [layer.fields().lookupField(name) for name in keys.child_fields]
+            for expression in keys.filter_expressions():
+                def build_request(expression=expression):
+                    request = QgsFeatureRequest()
+                    request.setFlags(request.flags() | QgsFeatureRequest.NoGeometry)
+                    request.setFilterExpression(expression)
+                    self._apply_attribute_subset(layer, request)
+                    return request
+
+                for feature in self._resumable_features(layer, prepared, build_request, report):
+                    self._check_cancelled()
+
+                    if atlas:
+                        key = tuple(feature.attribute(index) for index in child_indexes)
+                        feature_areas = keys.key_areas.get(key, set())
+                        if multiple_relations:
+                            feature_areas = feature_areas - seen_areas.get(feature.id(), set())
+                            seen_areas.setdefault(feature.id(), set()).update(feature_areas)
+                        if not feature_areas:
+                            continue
+                        report.accepted += 1
+                        yield feature, sorted(feature_areas)
+                        continue
+
+                    if multiple_relations:
+                        if feature.id() in seen_ids:
+                            continue
+                        seen_ids.add(feature.id())
+
+                    report.accepted += 1
+                    yield feature
+
+    @staticmethod
+    def _collecting_relation_keys(
+        features_factory: Callable[[], Iterable], collectors: List[_RelationKeys], atlas: bool = False
+    ) -> Callable[[], Iterator]:
+        """Avvolge features_factory registrando le chiavi delle feature esportate.
+
+        Con atlas=True features_factory produce coppie (feature, aree) e le chiavi
+        vengono associate alle aree. Un nuovo tentativo rilegge le stesse feature: le
+        chiavi sono in un insieme, per cui non vengono duplicate.
+        """
+        def factory():
+            for item in features_factory():
+                feature, areas = item if atlas else (item, None)
+                for keys in collectors:
+                    keys.collect(feature, areas)
+                yield item
+        return factory
+
+    @staticmethod
+    def _request_rectangle(rect: QgsRectangle) -> QgsRectangle:
+        """Bbox della richiesta al provider con un piccolo buffer per non perdere feature sui bordi."""
+        buffered_bbox = QgsRectangle(rect)
         buffer_distance = min(buffered_bbox.width(), buffered_bbox.height()) * 0.01  # 1% di buffer
         buffered_bbox.grow(buffer_distance)
+        return buffered_bbox
 
-        request.setFilterRect(buffered_bbox)
+    def _atlas_features_within(
+        self, layer: QgsVectorLayer, prepared: _PreparedLayer, areas: _PreparedAreas
+    ) -> Iterator[Tuple[QgsFeature, List[int]]]:
+        """Restituisce in streaming le feature del layer con le aree dell'atlante che intersecano.
 
-        def get_features_operation():
-            features_iterator = layer.getFeatures(request)
-            for feature in features_iterator:
-                # Controlla se l'operazione è stata cancellata
-                if self._cancellation_check and self._cancellation_check():
-                    raise ExportError("Esportazione cancellata dall'utente")
+        Il layer viene letto una sola volta per l'estensione di tutte le aree (una richiesta
+        per gruppo di aree vicine); le feature che non cadono in alcuna area vengono scartate.
+        """
+        report = self._report_for(layer)
+        multiple_requests = len(areas.rectangles) > 1
+        seen_ids = set()
+
+        for rect in areas.rectangles:
+            def build_request(rect=self._request_rectangle(rect)):
+                request = QgsFeatureRequest()
+                request.setFilterRect(rect)
+                self._apply_attribute_subset(layer, request)
+                return request
+
+            for feature in self._resumable_features(layer, prepared, build_request, report):
+                self._check_cancelled()
+
+                if multiple_requests:
+                    if feature.id() in seen_ids:
+                        continue
+                    seen_ids.add(feature.id())
 
                 geometry = feature.geometry()
                 if not geometry or geometry.isEmpty():
                     continue
-                
-                # Verifica se la geometria interseca il poligono
-                if not geometry.intersects(polygon_geom):
+
+                predicate_start = time.perf_counter()
+                feature_areas = areas.areas_for(geometry)
+                report.seconds["predicate"] += time.perf_counter() - predicate_start
+                if not feature_areas:
                     continue
 
-                # Includi la feature con la geometria originale, senza tagliare
-                new_feature = QgsFeature(feature)
-                result.append(new_feature)
+                report.accepted += 1
+                yield feature, feature_areas
 
-        try:
-            _execute_with_retry(get_features_operation)
-        except ExportError:
-            raise  # Re-raise ExportError as-is
-        except Exception as e:
-            # Gestione errori di connessione database
-            error_msg = f"Errore nell'accesso al layer {layer.name()}: {str(e)}"
-            if "password" in str(e).lower() or "connection" in str(e).lower():
-                error_msg += "\n\nPossibile timeout della connessione al database. Riprova con meno layer o una selezione più piccola."
-            raise ExportError(error_msg)
+    def _server_filtered_layer(self, layer: QgsVectorLayer, selection: _PreparedSelection) -> Optional[QgsVectorLayer]:
+        """Crea una copia del layer il cui filtro (subset string) esegue il test spaziale sul database.
 
-        return result
+        Supportato per PostGIS e SpatiaLite. Restituisce None se il provider non è supportato
+        o se il database rifiuta il filtro: in tal caso il test viene eseguito lato client.
+        """
+        provider_type = layer.providerType()
+        template = _SERVER_SIDE_FILTERS.get(provider_type)
+        if template is None:
+            return None
 
-    def _all_features(self, layer: QgsVectorLayer) -> List[QgsFeature]:
-        """Restituisce tutte le features di un layer senza applicare ritagli geometrici."""
-        result: List[QgsFeature] = []
+        uri = QgsDataSourceUri(layer.source())
+        geometry_column = uri.geometryColumn()
+        if not geometry_column:
+            return None
 
+        srid = uri.srid() or str(layer.crs().postgisSrid())
+        wkb_hex = bytes(selection.geometry.asWkb().toHex()).decode("ascii")
+        spatial_clause = template.format(
+            column='"{}"'.format(geometry_column.replace('"', '""')),
+            wkb=wkb_hex,
+            srid=srid,
+        )
+
+        subset = layer.subsetString()
+        if subset:
+            spatial_clause = f"({subset}) AND ({spatial_clause})"
+
+        options = QgsVectorLayer.LayerOptions(QgsProject.instance().transformContext())
+        options.loadDefaultStyle = False
+        options.skipCrsValidation = True
+        filtered_layer = QgsVectorLayer(layer.source(), layer.name(), provider_type, options)
+        if not filtered_layer.isValid() or not filtered_layer.setSubsetString(spatial_clause):
+            self._logger.log(
+                f"Filtro spaziale lato server non applicabile al layer {layer.name()}, uso il test lato client",
+                Qgis.Warning,
+            )
+            return None
+
+        self._logger.log(f"Filtro spaziale delegato al database ({provider_type}) per il layer {layer.name()}", Qgis.Info)
+        return filtered_layer
+
+    def _all_features(self, layer: QgsVectorLayer, prepared: _PreparedLayer) -> Iterator[QgsFeature]:
+        """Restituisce in streaming tutte le features di un layer senza applicare ritagli geometrici."""
         # Usa una richiesta senza limiti per esportare tutti gli elementi
         # Il controllo di cancellazione permette di interrompere esportazioni lunghe se necessario
-        request = QgsFeatureRequest()
+        report = self._report_for(layer)
 
         # Per layer senza geometria, non caricare la geometria (non esiste)
         # Gestisce sia NoGeometry che NullGeometry
         geom_type = layer.geometryType()
         has_geometry = geom_type != QgsWkbTypes.NoGeometry and geom_type != QgsWkbTypes.NullGeometry
-        if not has_geometry:
-            request.setFlags(request.flags() | QgsFeatureRequest.NoGeometry)
 
-        def get_all_features_operation():
-            features_iterator = layer.getFeatures(request)
-            for feature in features_iterator:
-                # Controlla se l'operazione è stata cancellata
-                if self._cancellation_check and self._cancellation_check():
-                    raise ExportError("Esportazione cancellata dall'utente")
+        def build_request():
+            request = QgsFeatureRequest()
+            if not has_geometry:
+                request.setFlags(request.flags() | QgsFeatureRequest.NoGeometry)
+            self._apply_attribute_subset(layer, request)
+            return request
 
-                # Per layer con geometria, verifica che sia valida
-                if has_geometry:
-                    geometry = feature.geometry()
-                    if not geometry or geometry.isEmpty():
-                        continue
-                
-                result.append(QgsFeature(feature))
+        for feature in self._resumable_features(layer, prepared, build_request, report):
+            # Controlla se l'operazione è stata cancellata
+            self._check_cancelled()
+
+            # Per layer con geometria, verifica che sia valida
+            if has_geometry:
+                geometry = feature.geometry()
+                if not geometry or geometry.isEmpty():
+                    continue
+
+            report.accepted += 1
+            yield feature
+
+    def _resumable_features(
+        self,
+        layer: QgsVectorLayer,
+        prepared: _PreparedLayer,
+        build_request: Callable[[], QgsFeatureRequest],
+        report: LayerReport,
+    ) -> Iterator[QgsFeature]:
+        """Legge le feature della richiesta riprendendo dal punto di interruzione se la connessione cade.
+
+        Le feature vengono lette da prepared.feature_source, mai dal layer, che fornisce
+        solo campi e nome.
+
+        Per i layer di database con una chiave primaria semplice le feature vengono lette
+        in ordine di chiave: dopo un errore di connessione la richiesta viene ripetuta
+        con il filtro chiave > ultima chiave letta (paginazione keyset), per cui nessuna
+        feature viene letta o scritta due volte. Negli altri casi l'errore viene propagato
+        e il layer viene esportato di nuovo da capo da _execute_with_retry.
+        """
+        key_field = prepared.keyset_field
+        if key_field is None:
+            with report.timed("request_setup"):
+                features = prepared.feature_source.getFeatures(build_request())
+            yield from report.fetched(features)
+            return
+
+        quoted_key = QgsExpression.quotedColumnRef(key_field)
+        key_index = layer.fields().lookupField(key_field)
+        last_key = None
+        resumes = 0
+        while True:
+            with report.timed("request_setup"):
+                request = build_request()
+                request.addOrderBy(quoted_key, True)
+                if request.flags() & QgsFeatureRequest.SubsetOfAttributes:
+                    # La chiave serve per riprendere anche se non è tra i campi esportati
+                    attributes = set(request.subsetOfAttributes())
+                    attributes.add(key_index)
+                    request.setSubsetOfAttributes(sorted(attributes))
+                if last_key is not None:
+                    request.combineFilterExpression(f"{quoted_key} > {QgsExpression.quotedValue(last_key)}")
+                features = prepared.feature_source.getFeatures(request)
+
+            try:
+                for feature in report.fetched(features):
+                    last_key = feature.attribute(key_index)
+                    yield feature
+                return
+            except ExportError:
+                raise
+            except Exception as e:
+                if not _is_connection_error(e) or resumes >= RESUME_MAX_RETRIES:
+                    raise
+                resumes += 1
+                self._logger.warning(
+                    f"Connessione persa durante la lettura di {layer.name()}, ripresa {resumes} "
+                    f"dopo {key_field} = {last_key}: {str(e)}"
+                )
+                time.sleep(RESUME_DELAY)
+
+    @staticmethod
+    def _keyset_field(layer: QgsVectorLayer) -> Optional[str]:
+        """Campo chiave primaria usato per riprendere la lettura, oppure None se non disponibile."""
+        if layer.providerType() not in _RESUMABLE_PROVIDERS:
+            return None
+        pk_indexes = layer.dataProvider().pkAttributeIndexes()
+        if len(pk_indexes) != 1:
+            return None
+        return layer.fields().at(pk_indexes[0]).name()
+
+    @staticmethod
+    def _local_raster_path(layer: QgsRasterLayer) -> Optional[str]:
+        """Percorso del file di un raster GDAL locale, oppure None per servizi e raster remoti."""
+        if layer.providerType() != "gdal":
+            return None
+        path = QgsProviderRegistry.instance().decodeUri("gdal", layer.source()).get("path")
+        return path if path and os.path.isfile(path) else None
+
+    def _export_raster(
+        self, layer: QgsRasterLayer, raster_path: str, selection: _PreparedSelection, output_path: str
+    ) -> str:
+        """Ritaglia un raster su file sulla selezione (nel CRS del raster) e restituisce output_path."""
+        # Importato solo quando serve: il modulo richiede GDAL Python (vedi _clip_rasters)
+        from .raster_exporter import RasterClipError, clip_raster
+
+        self._logger.log(f"Ritaglio raster {layer.name()} in {os.path.basename(output_path)}", Qgis.Info)
+        start = time.perf_counter()
+        try:
+            clip_raster(
+                raster_path,
+                output_path,
+                selection.geometry.asWkt(),
+                layer.crs().toWkt(),
+                cancellation_check=lambda: self._aborted or bool(self._cancellation_check and self._cancellation_check()),
+            )
+        except RasterClipError as e:
+            raise ExportError(f"Errore nel ritaglio del raster {layer.name()}: {str(e)}")
+
+        self._logger.log(
+            f"Raster {layer.name()} ritagliato in {time.perf_counter() - start:.2f} s "
+            f"({os.path.getsize(output_path)} bytes)",
+            Qgis.Info,
+        )
+        return output_path
+
+    @staticmethod
+    def _xyz_url_template(layer: QgsRasterLayer) -> Optional[str]:
+        """Modello di URL di un layer XYZ, oppure None per gli altri layer raster."""
+        if layer.providerType() != "wms":
+            return None
+        uri = QgsDataSourceUri()
+        uri.setEncodedUri(layer.source())
+        url = uri.param("url")
+        # I quadkey ({q}) non sono supportati dal downloader
+        if uri.param("type") != "xyz" or not url or "{q}" in url:
+            return None
+        return url
+
+    def _export_tile_cache(
+        self, layer: QgsRasterLayer, url_template: str, mercator: _PreparedSelection, output_path: str
+    ) -> str:
+        """Scarica in output_path (MBTiles) le tile del layer XYZ che intersecano la selezione in EPSG:3857."""
+        uri = QgsDataSourceUri()
+        uri.setEncodedUri(layer.source())
+        min_zoom = self._tile_cache_min_zoom
+        max_zoom = self._tile_cache_max_zoom
+        if uri.param("zmin"):
+            min_zoom = max(min_zoom, int(uri.param("zmin")))
+        if uri.param("zmax"):
+            max_zoom = min(max_zoom, int(uri.param("zmax")))
+        if min_zoom > max_zoom:
+            raise ExportError(f"Intervallo di zoom non disponibile per il layer {layer.name()}")
+
+        to_wgs84 = QgsCoordinateTransform(
+            QgsCoordinateReferenceSystem("EPSG:3857"),
+            QgsCoordinateReferenceSystem("EPSG:4326"),
+            QgsProject.instance().transformContext(),
+        )
+        bbox = to_wgs84.transformBoundingBox(mercator.bbox)
+        bbox_lonlat = (bbox.xMinimum(), bbox.yMinimum(), bbox.xMaximum(), bbox.yMaximum())
+
+        # Stima per eccesso (tile nella bbox) per evitare download di dimensioni impreviste,
+        # calcolata senza enumerare le tile (milioni ai livelli di zoom più alti)
+        estimated_tiles = count_tiles_in_bbox(bbox_lonlat, min_zoom, max_zoom)
+        if estimated_tiles > MAX_TILE_CACHE_TILES:
+            raise ExportError(
+                f"Troppe tile da scaricare per il layer {layer.name()} ({estimated_tiles}, "
+                f"massimo {MAX_TILE_CACHE_TILES}). Riduci lo zoom massimo o l'area selezionata."
+            )
+
+        def tiles_within_selection():
+            # Solo le tile che intersecano effettivamente la selezione
+            for tile in tiles_in_bbox(bbox_lonlat, min_zoom, max_zoom):
+                tile_geometry = QgsGeometry.fromRect(QgsRectangle(*tile_bounds_mercator(*tile)))
+                if mercator.intersects(tile_geometry):
+                    yield tile
+
+        self._logger.log(
+            f"Cache tile per {layer.name()} (zoom {min_zoom}-{max_zoom}) in {os.path.basename(output_path)}",
+            Qgis.Info,
+        )
+        store = MBTilesStore(output_path)
+        try:
+            stats = build_tile_cache(
+                url_template,
+                tiles_within_selection(),
+                store,
+                max_workers=TILE_CACHE_WORKERS,
+                cancellation_check=lambda: self._aborted or bool(self._cancellation_check and self._cancellation_check()),
+            )
+            image_format = "jpg" if url_template.lower().split("?")[0].endswith((".jpg", ".jpeg")) else "png"
+            store.set_metadata({
+                "name": layer.name(),
+                "format": image_format,
+                "type": "baselayer",
+                "version": "1.1",
+                "minzoom": min_zoom,
+                "maxzoom": max_zoom,
+                "bounds": ",".join(str(value) for value in bbox_lonlat),
+            })
+        except (TileCacheError, OSError) as e:
+            raise ExportError(f"Errore nella creazione della cache tile del layer {layer.name()}: {str(e)}")
+        finally:
+            store.close()
+
+        self._check_cancelled()
+        self._logger.log(
+            f"Cache tile {layer.name()}: {stats['downloaded']} scaricate, {stats['cached']} già presenti, "
+            f"{stats['deduplicated']} deduplicate, {stats['missing']} inesistenti, {stats['failed']} fallite",
+            Qgis.Warning if stats["failed"] else Qgis.Info,
+        )
+        return output_path
+
+    def _output_fields(self, layer: QgsVectorLayer) -> QgsFields:
+        """Campi da esportare per il layer: tutti, oppure il sottoinsieme scelto dall'utente."""
+        selected = self._attribute_subsets.get(layer.id())
+        if not selected:
+            return layer.fields()
+
+        selected_names = set(selected)
+        fields = QgsFields()
+        for field in layer.fields():
+            if field.name() in selected_names:
+                fields.append(field)
+        return fields
+
+    def _apply_attribute_subset(self, layer: QgsVectorLayer, request: QgsFeatureRequest) -> None:
+        """Limita la richiesta ai soli attributi esportati, riducendo il traffico di rete."""
+        if self._attribute_subsets.get(layer.id()):
+            names = self._output_fields(layer).names()
+            # I campi chiave delle relazioni servono anche se non sono esportati: quelli del
+            # genitore per raccogliere le chiavi, le chiavi esterne della tabella figlia per
+            # assegnarne le righe alle aree dell'atlante
+            for keys in self._relation_keys.get(layer.id(), []):
+                names.extend(name for name in keys.parent_fields if name not in names)
+            for keys in self._related_tables.get(layer.id(), []):
+                names.extend(name for name in keys.child_fields if name not in names)
+            request.setSubsetOfAttributes(names, layer.fields())
+
+    def _export_features(
+        self,
+        layer: QgsVectorLayer,
+        features_factory: Callable[[], Iterable],
+        keep_empty: bool = False,
+        atlas: bool = False,
+    ) -> Union[Optional[str], dict]:
+        """Esporta il layer scrivendo in streaming le features prodotte da features_factory.
+
+        Le perdite di connessione durante la lettura dei layer di database con chiave
+        primaria vengono recuperate da _resumable_features senza interrompere la scrittura.
+        Negli altri casi l'esportazione viene ripetuta da capo: il file (o il layer nel
+        GeoPackage unico) viene ricreato, per cui un nuovo tentativo non produce mai
+        feature duplicate.
+
+        Con atlas=True features_factory produce coppie (feature, aree) e ogni feature
+        viene scritta nell'output di ciascuna delle sue aree.
+
+        Returns:
+            Percorso del file creato, oppure None se non c'erano feature da esportare;
+            con atlas=True un dizionario area -> percorso delle sole aree con un output
+        """
+        # Un nuovo tentativo sovrascrive sempre lo stesso output
+        output_name = self._output_name(layer)
+
+        report = self._report_for(layer)
+
+        def export_operation():
+            if report.candidates or report.written:
+                report.reset()  # Nuovo tentativo dopo un errore di connessione
+            if atlas:
+                return self._export_layer_to_areas(layer, features_factory(), keep_empty, output_name)
+            return self._export_layer(layer, features_factory(), keep_empty, output_name)
 
         try:
-            _execute_with_retry(get_all_features_operation)
+            return _execute_with_retry(export_operation, logger=self._logger)
         except ExportError:
             raise  # Re-raise ExportError as-is
         except Exception as e:
             # Gestione errori di connessione database
             error_msg = f"Errore nell'accesso al layer {layer.name()}: {str(e)}"
             if "password" in str(e).lower() or "connection" in str(e).lower():
-                error_msg += "\n\nPossibile timeout della connessione al database. Riprova con meno layer o considera di filtrare i dati."
+                error_msg += "\n\nPossibile timeout della connessione al database. Riprova con meno layer o una selezione più piccola."
             raise ExportError(error_msg)
 
-        return result
+    def _assign_output_names(self) -> dict:
+        """Assegna a ogni layer un nome di output univoco basato sul suo nome."""
+        names = {}
+        used = set()
+        for layer in self._target_layers:
+            safe_name = self._sanitize_filename(layer.name())
+            name = safe_name
+            suffix = 2
+            while name.lower() in used:
+                name = f"{safe_name}_{suffix}"
+                suffix += 1
+            used.add(name.lower())
+            names[layer.id()] = name
+        return names
 
-    def _export_layer(self, layer: QgsVectorLayer, features: List[QgsFeature]) -> str:
-        safe_name = self._sanitize_filename(layer.name())
-        
-        # Crea un nome file basato sul nome del layer originale
-        filename = f"{safe_name}.gpkg"
-        
-        output_path = os.path.join(self._export_subdirectory, filename)
+    def _output_name(self, layer: QgsMapLayer) -> str:
+        return self._output_names.get(layer.id()) or self._sanitize_filename(layer.name())
 
-        options = QgsVectorFileWriter.SaveVectorOptions()
-        options.driverName = "GPKG"
-        options.fileEncoding = layer.dataProvider().encoding() or "UTF-8"
-        options.layerName = safe_name
-        options.symbologyExport = QgsVectorFileWriter.SymbologyExport.FeatureSymbology
+    def _export_layer(
+        self,
+        layer: QgsVectorLayer,
+        features: Iterable[QgsFeature],
+        keep_empty: bool = False,
+        output_name: Optional[str] = None,
+    ) -> Optional[str]:
+        """Crea l'output del layer e vi scrive le features a blocchi.
 
-        transform_context = QgsProject.instance().transformContext()
-        writer = QgsVectorFileWriter.create(
-            output_path,
-            layer.fields(),
-            layer.wkbType(),
-            layer.crs(),
-            transform_context,
-            options,
+        Il writer viene creato appena è disponibile la prima feature, quindi le feature
+        passano dal provider al file senza mai essere accumulate tutte in memoria.
+        Se non ci sono feature e keep_empty è False non viene creato alcun output.
+        """
+        output_name = output_name or self._sanitize_filename(layer.name())
+        features = iter(features)
+        first_feature = next(features, None)
+        if first_feature is None and not keep_empty:
+            return None
+
+        report = self._report_for(layer)
+        relaxed = self._bulk_load and self._writes_new_files([self._export_subdirectory])
+        environment = _bulk_load_environment() if relaxed else contextlib.nullcontext()
+        with environment:
+            with report.timed("write"):
+                writer = self._create_writer(layer, output_name)
+            output_path = writer.uri.split("|", 1)[0]
+            # Nel GeoPackage unico conta solo la crescita del file dovuta a questo layer
+            size_before = os.path.getsize(output_path) if self._single_geopackage and os.path.exists(output_path) else 0
+
+            try:
+                batch: List[QgsFeature] = [] if first_feature is None else [first_feature]
+                for feature in features:
+                    batch.append(feature)
+                    if len(batch) % FEATURE_BATCH_SIZE == 0:
+                        self._notify_feature_progress(layer, report)
+                    if len(batch) >= writer.batch_size:
+                        with report.timed("write"):
+                            writer.add_features(batch)
+                        report.written += len(batch)
+                        batch = []
+                if batch:
+                    with report.timed("write"):
+                        writer.add_features(batch)
+                    report.written += len(batch)
+                writer.finish()
+            finally:
+                # Chiude il file anche in caso di errore o cancellazione
+                writer.close()
+
+        report.seconds["index_build"] = writer.index_build_seconds
+        if writer.index_build_failed:
+            self._logger.warning(f"Impossibile creare l'indice spaziale per {writer.uri}")
+        if os.path.exists(output_path):
+            report.bytes_written = max(0, os.path.getsize(output_path) - size_before)
+
+        self._logger.log(
+            f"Layer {layer.name()}: {report.written} feature scritte in {writer.uri} "
+            f"(lettura {report.seconds['fetch']:.2f} s, test spaziale {report.seconds['predicate']:.2f} s, "
+            f"scrittura {report.seconds['write']:.2f} s, indice spaziale {writer.index_build_seconds:.2f} s)",
+            Qgis.Info,
         )
+        return writer.uri
 
-        if writer.hasError() != QgsVectorFileWriter.NoError:
-            raise ExportError(f"Errore nella creazione del file: {writer.errorMessage()}")
+    def _export_layer_to_areas(
+        self,
+        layer: QgsVectorLayer,
+        items: Iterable[Tuple[QgsFeature, List[int]]],
+        keep_empty: bool = False,
+        output_name: Optional[str] = None,
+    ) -> dict:
+        """Scrive le feature nei file delle aree dell'atlante a cui sono assegnate.
 
-        writer.addFeatures(features)
-        del writer
-        return output_path
+        Il writer di un'area viene creato alla prima feature dell'area (per tutte le aree
+        se keep_empty è True). Ogni area accumula al massimo FEATURE_BATCH_SIZE feature,
+        per cui la memoria dipende dal numero di aree e non dalla dimensione del layer.
+
+        Returns:
+            Dizionario area -> percorso dell'output
+        """
+        output_name = output_name or self._sanitize_filename(layer.name())
+        report = self._report_for(layer)
+        writers = {}
+        batches = {}
+
+        def write_batch(area):
+            writer = writers.get(area)
+            with report.timed("write"):
+                if writer is None:
+                    writer = self._create_writer(layer, output_name, self._atlas_directories[area])
+                    writers[area] = writer
+                if batches.get(area):
+                    writer.add_features(batches[area])
+            report.written += len(batches.get(area, []))
+            batches[area] = []
+
+        relaxed = self._bulk_load and self._writes_new_files(self._atlas_directories)
+        environment = _bulk_load_environment() if relaxed else contextlib.nullcontext()
+        with environment:
+            try:
+                read = 0
+                for feature, areas in items:
+                    for area in areas:
+                        batch = batches.setdefault(area, [])
+                        batch.append(feature)
+                        if len(batch) >= FEATURE_BATCH_SIZE:
+                            write_batch(area)
+                    read += 1
+                    if read % FEATURE_BATCH_SIZE == 0:
+                        self._notify_feature_progress(layer, report)
+
+                areas_to_write = range(len(self._atlas_directories)) if keep_empty else list(batches)
+                for area in areas_to_write:
+                    if area not in writers or batches.get(area):
+                        write_batch(area)
+                for writer in writers.values():
+                    writer.finish()
+            finally:
+                # Chiude i file anche in caso di errore o cancellazione
+                for writer in writers.values():
+                    writer.close()
+
+        outputs = {area: writer.uri for area, writer in writers.items()}
+        report.seconds["index_build"] = sum(writer.index_build_seconds for writer in writers.values())
+        for writer in writers.values():
+            if writer.index_build_failed:
+                self._logger.warning(f"Impossibile creare l'indice spaziale per {writer.uri}")
+        if not self._single_geopackage:
+            report.bytes_written = sum(
+                os.path.getsize(uri) for uri in outputs.values() if os.path.exists(uri)
+            )
+
+        self._logger.log(
+            f"Layer {layer.name()}: {report.written} feature scritte in {len(outputs)} aree "
+            f"(lettura {report.seconds['fetch']:.2f} s, assegnazione alle aree {report.seconds['predicate']:.2f} s, "
+            f"scrittura {report.seconds['write']:.2f} s)",
+            Qgis.Info,
+        )
+        return outputs
+
+    def _create_writer(self, layer: QgsVectorLayer, output_name: str, directory: Optional[str] = None):
+        """Crea il writer adatto alla modalità di output configurata, nella cartella indicata
+        (quella dell'esportazione se non specificata)."""
+        directory = directory or self._export_subdirectory
+        output_fields = self._output_fields(layer)
+        if self._single_geopackage:
+            path = self._single_geopackage_path(directory)
+            writer = _GeoPackageTransactionWriter(
+                path,
+                output_name,
+                layer,
+                overwrite_file=path not in self._created_geopackages,
+                bulk_load=self._bulk_load,
+                output_fields=output_fields,
+            )
+            self._created_geopackages.add(path)
+            return writer
+
+        path = os.path.join(directory, f"{output_name}.gpkg")
+        if self._bulk_load:
+            # Il caricamento massivo richiede transazioni esplicite anche per i file separati
+            return _GeoPackageTransactionWriter(
+                path, output_name, layer, overwrite_file=True, bulk_load=True, output_fields=output_fields
+            )
+        return _FileLayerWriter(path, output_name, layer, output_fields)
+
+    def _writes_new_files(self, directories: List[str]) -> bool:
+        """Indica se il layer viene scritto solo in file creati da questa scrittura.
+
+        Con il GeoPackage unico il file già creato da un layer precedente, o conservato
+        da un'esportazione incrementale, contiene altri layer: un'interruzione con i
+        pragma del caricamento massivo li danneggerebbe, anche quelli che il manifest
+        continua a riutilizzare.
+        """
+        if not self._single_geopackage:
+            return True
+        return not any(
+            self._single_geopackage_path(directory) in self._created_geopackages for directory in directories
+        )
+
+    def _single_geopackage_path(self, directory: Optional[str] = None) -> str:
+        """Percorso del GeoPackage unico che contiene tutti i layer esportati nella cartella
+        (quella dell'esportazione, oppure quella di un'area dell'atlante)."""
+        directory = directory or self._export_subdirectory
+        return os.path.join(directory, f"{os.path.basename(directory)}.gpkg")
 
     @staticmethod
     def _sanitize_filename(name: str) -> str:
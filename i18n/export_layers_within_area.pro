@@ -1,6 +1,9 @@
 SOURCES = ../export_layers_within_area_plugin.py \
           ../main_dialog.py \
-          ../config_dialog.py
+          ../config_dialog.py \
+          ../plan_dialog.py \
+          ../processing_provider.py \
+          ../processing_algorithm.py
 
 TRANSLATIONS = export_layers_within_area_en.ts \
                export_layers_within_area_it.ts
@@ -29,7 +29,6 @@ translations = {
     "Alcuni layer potrebbero avere problemi di connessione al database:\n\n{issues}\n\nVerifica le tue credenziali del database.": "Alcuni layer potrebbero avere problemi di connessione al database:\n\n{issues}\n\nVerifica le tue credenziali del database.",
     "Esportazione già in corso": "Esportazione già in corso",
     "È già in corso un'esportazione. Vuoi avviarne un'altra comunque?\n\nNota: L'esportazione precedente continuerà in background.": "È già in corso un'esportazione. Vuoi avviarne un'altra comunque?\n\nNota: L'esportazione precedente continuerà in background.",
-    "Errore nel salvataggio temporaneo del progetto.": "Errore nel salvataggio temporaneo del progetto.",
     "Errore nel caricamento della copia del progetto.": "Errore nel caricamento della copia del progetto.",
     "Errore nel salvataggio del progetto QGIS modificato.": "Errore nel salvataggio del progetto QGIS modificato.",
     "Progetto QGIS creato: {project_path}": "Progetto QGIS creato: {project_path}",
@@ -52,7 +51,81 @@ translations = {
     "1 polygon selected": "1 poligono selezionato",
     "{count} polygons selected": "{count} poligoni selezionati",
     "No polygon selected.": "Nessun poligono selezionato.",
-    "Select at least one layer to export.": "Seleziona almeno un layer da esportare."
+    "Select at least one layer to export.": "Seleziona almeno un layer da esportare.",
+    "Advanced options": "Opzioni avanzate",
+    "Run the spatial filter on the database server": "Esegui il filtro spaziale sul server del database",
+    "For PostGIS and SpatiaLite layers, only features actually intersecting the selection are transferred": "Per i layer PostGIS e SpatiaLite vengono trasferiti solo gli elementi che intersecano effettivamente la selezione",
+    "Layers exported in parallel:": "Layer esportati in parallelo:",
+    "Number of layers exported at the same time, each to its own file": "Numero di layer esportati contemporaneamente, ciascuno nel proprio file",
+    "Write all layers into a single GeoPackage": "Scrivi tutti i layer in un unico GeoPackage",
+    "Faster for exports with many small layers; layers are then written one at a time": "Più veloce per esportazioni con molti layer piccoli; i layer vengono scritti uno alla volta",
+    "Fast bulk load (build spatial index at the end)": "Caricamento massivo veloce (indice spaziale creato alla fine)",
+    "Writes in large transactions with relaxed SQLite durability and builds the spatial index in one pass": "Scrive in transazioni di grandi dimensioni con durabilità SQLite ridotta e crea l'indice spaziale in un solo passaggio",
+    "Reuse outputs of layers unchanged since the previous export": "Riutilizza l'output dei layer non modificati dall'esportazione precedente",
+    "Applies when exporting again into a folder with the same name": "Si applica quando si esporta di nuovo in una cartella con lo stesso nome",
+    "Field holding the last modification time of database records": "Campo con la data di ultima modifica dei record del database",
+    "Last modification field:": "Campo di ultima modifica:",
+    "Fields": "Campi",
+    "All": "Tutti",
+    "{selected} of {total}": "{selected} di {total}",
+    "Double-click a vector layer to choose the fields to export.": "Fai doppio clic su un layer vettoriale per scegliere i campi da esportare.",
+    "Fields to export: {layer_name}": "Campi da esportare: {layer_name}",
+    "Select all": "Seleziona tutti",
+    "Select none": "Deseleziona tutti",
+    "Clip file-based raster layers to the selection": "Ritaglia sulla selezione i layer raster su file",
+    "Writes a compressed tiled GeoTIFF with overviews instead of referencing the original raster": "Scrive un GeoTIFF tassellato e compresso con piramidi invece di referenziare il raster originale",
+    "Download XYZ tiles of the area for offline use": "Scarica le tile XYZ dell'area per l'uso offline",
+    "Tiles intersecting the selection are stored in an MBTiles file used by the exported project": "Le tile che intersecano la selezione vengono salvate in un file MBTiles usato dal progetto esportato",
+    "Zoom levels:": "Livelli di zoom:",
+    "Export layers within area": "Esporta layer nell'area",
+    "Exports the given layers limited to the features intersecting the chosen polygons, like the plugin dialog. Polygons are chosen by feature ids and/or an expression; without a polygon layer all features are exported. An optional project file is loaded first, so layers can be referenced by name or id when running from qgis_process.": "Esporta i layer indicati limitandoli alle feature che intersecano i poligoni scelti, come il dialog del plugin. I poligoni sono scelti per id delle feature e/o con un'espressione; senza layer poligonale vengono esportate tutte le feature. Un eventuale file di progetto viene caricato prima, così i layer possono essere indicati per nome o id quando si usa qgis_process.",
+    "Run the exact spatial test on the database when possible": "Esegui il test spaziale esatto sul database quando possibile",
+    "Layers exported in parallel": "Layer esportati in parallelo",
+    "Last modification field": "Campo di ultima modifica",
+    "Minimum tile zoom level": "Livello di zoom minimo delle tile",
+    "Maximum tile zoom level": "Livello di zoom massimo delle tile",
+    "QGIS project to load": "Progetto QGIS da caricare",
+    "QGIS projects (*.qgs *.qgz)": "Progetti QGIS (*.qgs *.qgz)",
+    "Selection polygon layer": "Layer poligonale di selezione",
+    "Polygon feature ids (comma separated)": "Id delle feature poligonali (separati da virgola)",
+    "Polygon filter expression": "Espressione di filtro dei poligoni",
+    "Export folder": "Cartella di esportazione",
+    "Export directory name": "Nome della cartella di esportazione",
+    "Export directory": "Cartella dell'esportazione",
+    "Exported layers": "Layer esportati",
+    "Unable to read project {path}: {error}": "Impossibile leggere il progetto {path}: {error}",
+    "Project loaded: {path}": "Progetto caricato: {path}",
+    "{count} selection polygons": "{count} poligoni di selezione",
+    "Layer {name} done ({completed}/{total})": "Layer {name} completato ({completed}/{total})",
+    "{count} layers exported to {path}": "{count} layer esportati in {path}",
+    "No polygon matches the given feature ids or expression.": "Nessun poligono corrisponde agli id o all'espressione indicati.",
+    "Invalid feature ids: {ids}": "Id delle feature non validi: {ids}",
+    "Parallel queries per database server": "Query parallele per server di database",
+    "One export per selected polygon (atlas)": "Un'esportazione per ogni poligono selezionato (atlante)",
+    "Create a QGIS project with the exported layers": "Crea un progetto QGIS con i layer esportati",
+    "QGIS project created: {project_path}": "Progetto QGIS creato: {project_path}",
+    "Each selected polygon gets its own folder and project; every layer is read only once": "Ogni poligono selezionato ha la propria cartella e il proprio progetto; ogni layer viene letto una sola volta",
+    "Atlas export completed: {count} areas in {path}": "Esportazione atlante completata: {count} aree in {path}",
+    "No layers selected for export.": "Nessun layer selezionato per l'esportazione.",
+    "Export only table rows related to the exported features": "Esporta solo le righe delle tabelle collegate alle feature esportate",
+    "Tables without geometry that are children of a project relation keep only the rows referencing the exported parent features": "Le tabelle senza geometria figlie di una relazione del progetto mantengono solo le righe che referenziano le feature genitore esportate",
+    "Log level:": "Livello di log:",
+    "Normal": "Normale",
+    "Debug": "Debug",
+    "Maximum number of layers read at the same time from the same database server": "Numero massimo di layer letti contemporaneamente dallo stesso server di database",
+    "Parallel queries per database server:": "Query parallele per server di database:",
+    "Show the export plan with estimates before exporting": "Mostra il piano di esportazione con le stime prima di esportare",
+    "Export plan": "Piano di esportazione",
+    "Estimating the export plan...": "Stima del piano di esportazione...",
+    "Cancel": "Annulla",
+    "Rows in area": "Righe nell'area",
+    "Exported features": "Elementi esportati",
+    "Size": "Dimensione",
+    "Time": "Tempo",
+    "Estimates are based on previous exports when available. Uncheck the layers you do not want to export.": "Le stime si basano sulle esportazioni precedenti, quando disponibili. Deseleziona i layer che non vuoi esportare.",
+    "Start export": "Avvia esportazione",
+    "Select at least one field": "Seleziona almeno un campo",
+    "Total: {layers} layers, about {size}, about {time}": "Totale: {layers} layer, circa {size}, circa {time}"
 }
 
 def translate_ts_file():
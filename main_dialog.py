@@ -2,7 +2,7 @@
 
 import os
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from qgis.PyQt.QtCore import Qt, QCoreApplication
 from qgis.PyQt.QtWidgets import (
@@ -11,8 +11,12 @@ from qgis.PyQt.QtWidgets import (
     QGroupBox,
     QLabel,
     QLineEdit,
+    QListWidget,
+    QListWidgetItem,
     QMessageBox,
+    QPushButton,
     QRadioButton,
+    QHBoxLayout,
     QVBoxLayout,
     QWidget,
     QTreeWidget,
@@ -22,6 +26,76 @@ from qgis.PyQt.QtWidgets import (
 from qgis.core import QgsMapLayer, QgsProject, QgsVectorLayer, QgsWkbTypes, QgsLayerTreeGroup, QgsLayerTreeLayer, QgsLayerTree
 from qgis.core import Qgis
 
+from .export_logger import ExportLogger
+
+
+class FieldSelectionDialog(QDialog):
+    """Dialog per scegliere i campi da esportare di un layer vettoriale."""
+
+    def tr(self, message: str) -> str:
+        """Traduzione delle stringhe."""
+        return QCoreApplication.translate("FieldSelectionDialog", message)
+
+    def __init__(self, parent: QWidget, layer: QgsVectorLayer, selected_fields: Optional[List[str]] = None) -> None:
+        super().__init__(parent)
+        self.setWindowTitle(self.tr("Fields to export: {layer_name}").format(layer_name=layer.name()))
+        self.resize(360, 420)
+
+        self._field_list = QListWidget(self)
+        for field in layer.fields():
+            item = QListWidgetItem(f"{field.name()} ({field.typeName()})", self._field_list)
+            item.setData(Qt.ItemDataRole.UserRole, field.name())
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            checked = not selected_fields or field.name() in selected_fields
+            item.setCheckState(Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked)
+
+        select_all_button = QPushButton(self.tr("Select all"), self)
+        select_all_button.clicked.connect(lambda: self._set_all_checked(True))
+        select_none_button = QPushButton(self.tr("Select none"), self)
+        select_none_button.clicked.connect(lambda: self._set_all_checked(False))
+        selection_buttons_layout = QHBoxLayout()
+        selection_buttons_layout.addWidget(select_all_button)
+        selection_buttons_layout.addWidget(select_none_button)
+
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel,
+            self,
+        )
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        self._ok_button = buttons.button(QDialogButtonBox.StandardButton.Ok)
+        # Una lista vuota significa "tutti i campi": almeno un campo deve restare selezionato
+        self._field_list.itemChanged.connect(self._refresh_ok_button)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self._field_list)
+        layout.addLayout(selection_buttons_layout)
+        layout.addWidget(buttons)
+
+        self._refresh_ok_button()
+
+    def _set_all_checked(self, checked: bool) -> None:
+        state = Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked
+        for row in range(self._field_list.count()):
+            self._field_list.item(row).setCheckState(state)
+
+    def _refresh_ok_button(self, *args) -> None:
+        checked = any(
+            self._field_list.item(row).checkState() == Qt.CheckState.Checked
+            for row in range(self._field_list.count())
+        )
+        self._ok_button.setEnabled(checked or self._field_list.count() == 0)
+        self._ok_button.setToolTip("" if checked else self.tr("Select at least one field"))
+
+    def selected_fields(self) -> List[str]:
+        """Restituisce i campi selezionati; lista vuota se sono selezionati tutti."""
+        names = []
+        for row in range(self._field_list.count()):
+            item = self._field_list.item(row)
+            if item.checkState() == Qt.CheckState.Checked:
+                names.append(item.data(Qt.ItemDataRole.UserRole))
+        return [] if len(names) == self._field_list.count() else names
+
 
 class MainDialog(QDialog):
     """Dialog che permette di selezionare i layer da esportare e il poligono."""
@@ -30,14 +104,16 @@ class MainDialog(QDialog):
         """Traduzione delle stringhe."""
         return QCoreApplication.translate("MainDialog", message)
 
-    def __init__(self, parent: QWidget, polygon_layer: QgsVectorLayer, previously_selected_layer_ids: Optional[List[str]] = None, logging_enabled: bool = True, last_export_mode: str = "all_features") -> None:
+    def __init__(self, parent: QWidget, polygon_layer: QgsVectorLayer, previously_selected_layer_ids: Optional[List[str]] = None, logger: Optional[ExportLogger] = None, last_export_mode: str = "all_features", previous_field_selection: Optional[Dict[str, List[str]]] = None) -> None:
         super().__init__(parent)
         self._polygon_layer = polygon_layer
         self._selected_feature_ids = [feature.id() for feature in polygon_layer.selectedFeatures()]
         self._layers_to_export: List[str] = []
         self._previously_selected_layer_ids = previously_selected_layer_ids or []
         self._export_mode = last_export_mode  # Usa la modalità precedente invece di default
-        self._logging_enabled = logging_enabled
+        self._logger = logger if logger is not None else ExportLogger(enabled=False)
+        # Campi da esportare per layer (id layer -> nomi dei campi); assente = tutti i campi
+        self._field_selection: Dict[str, List[str]] = dict(previous_field_selection or {})
 
         self.setWindowTitle(self.tr("Export Layers Within Area"))
         self.resize(540, 480)
@@ -47,9 +123,14 @@ class MainDialog(QDialog):
         self._refresh_feature_label()
 
         self._layer_tree = QTreeWidget(self)
-        self._layer_tree.setHeaderLabel(self.tr("Layer"))
-        self._layer_tree.setColumnCount(1)
+        self._layer_tree.setColumnCount(2)
+        self._layer_tree.setHeaderLabels([self.tr("Layer"), self.tr("Fields")])
+        self._layer_tree.itemDoubleClicked.connect(self._on_layer_item_double_clicked)
         self._populate_layer_list(self._previously_selected_layer_ids)
+        self._layer_tree.resizeColumnToContents(0)
+
+        fields_hint_label = QLabel(self.tr("Double-click a vector layer to choose the fields to export."), self)
+        fields_hint_label.setWordWrap(True)
 
         # Campo per il nome della directory
         self._directory_name_edit = QLineEdit(self)
@@ -64,6 +145,7 @@ class MainDialog(QDialog):
         selection_box = QGroupBox(self.tr("Layers to export"), self)
         selection_layout = QVBoxLayout(selection_box)
         selection_layout.addWidget(self._layer_tree)
+        selection_layout.addWidget(fields_hint_label)
 
         # Sezione modalità di esportazione
         export_mode_box = QGroupBox(self.tr("Export mode"), self)
@@ -75,8 +157,15 @@ class MainDialog(QDialog):
         self._export_within_area_radio = QRadioButton(self.tr("Export only features within selected polygons"), self)
         self._export_within_area_radio.toggled.connect(self._on_export_mode_changed)
 
+        self._export_atlas_radio = QRadioButton(self.tr("One export per selected polygon (atlas)"), self)
+        self._export_atlas_radio.setToolTip(
+            self.tr("Each selected polygon gets its own folder and project; every layer is read only once")
+        )
+        self._export_atlas_radio.toggled.connect(self._on_export_mode_changed)
+
         export_mode_layout.addWidget(self._export_all_radio)
         export_mode_layout.addWidget(self._export_within_area_radio)
+        export_mode_layout.addWidget(self._export_atlas_radio)
 
         # Sezione informazioni poligono (visibile solo se si sceglie "within_area")
         self._polygon_info_box = QGroupBox(self.tr("Clipping polygon"), self)
@@ -85,6 +174,8 @@ class MainDialog(QDialog):
         # (dopo aver creato _polygon_info_box per evitare errori)
         if self._export_mode == "all_features":
             self._export_all_radio.setChecked(True)
+        elif self._export_mode == "atlas":
+            self._export_atlas_radio.setChecked(True)
         else:
             self._export_within_area_radio.setChecked(True)
         polygon_info_layout = QVBoxLayout(self._polygon_info_box)
@@ -106,7 +197,7 @@ class MainDialog(QDialog):
         layout.addWidget(buttons)
 
         # Inizializza lo stato della sezione poligoni basato sulla modalità selezionata
-        self._polygon_info_box.setEnabled(self._export_mode == "within_area")
+        self._polygon_info_box.setEnabled(self._export_mode in ("within_area", "atlas"))
 
     def _set_default_directory_name(self) -> None:
         """Imposta il nome predefinito della directory nel formato YYYY-MM-DD_nome_progetto."""
@@ -133,6 +224,7 @@ class MainDialog(QDialog):
         self._layer_tree.clear()
         root_node = QgsProject.instance().layerTreeRoot()
         self._add_children_to_tree(root_node, self._layer_tree.invisibleRootItem(), previously_selected_layer_ids)
+        self._logger.flush()
         self._layer_tree.expandAll()
 
     def _add_children_to_tree(self, node: QgsLayerTreeGroup, parent_item: QTreeWidgetItem, previously_selected_layer_ids: List[str]) -> None:
@@ -140,8 +232,8 @@ class MainDialog(QDialog):
             if child.nodeType() == QgsLayerTree.NodeLayer:
                 layer = child.layer()
                 
-                # Log dettagliato per ogni layer trovato
-                if layer is not None:
+                # Log dettagliato per ogni layer trovato (calcolato solo con il livello debug)
+                if layer is not None and self._logger.debug_enabled:
                     if layer.type() == QgsMapLayer.VectorLayer:
                         geom_type = layer.geometryType()
                         if geom_type == QgsWkbTypes.NoGeometry or geom_type == QgsWkbTypes.NullGeometry:
@@ -150,32 +242,31 @@ class MainDialog(QDialog):
                             geom_type_str = f"GeomType:{geom_type}"
                     else:
                         geom_type_str = "N/A"
-                    self._log_message(
-                        f"[DEBUG] Layer trovato: {layer.name()} | Tipo: {layer.type()} | {geom_type_str}",
-                        Qgis.Info
-                    )
+                    self._logger.debug("Layer trovato: %s | Tipo: %s | %s", layer.name(), layer.type(), geom_type_str)
                 
                 # Modificato per includere layer Raster (come XYZ Tiles) e layer senza geometria (tabelle)
                 if layer is None or (layer.type() != QgsMapLayer.VectorLayer and layer.type() != QgsMapLayer.RasterLayer):
                     if layer is not None:
-                        self._log_message(f"[DEBUG] Layer escluso (tipo non supportato): {layer.name()}", Qgis.Info)
+                        self._logger.debug("Layer escluso (tipo non supportato): %s", layer.name())
                     continue
                 
                 if layer == self._polygon_layer: # Escludi il layer poligonale di riferimento
-                    self._log_message(f"[DEBUG] Layer escluso (poligono di riferimento): {layer.name()}", Qgis.Info)
+                    self._logger.debug("Layer escluso (poligono di riferimento): %s", layer.name())
                     continue
 
                 # Log per layer che vengono aggiunti alla lista
-                self._log_message(f"[DEBUG] Layer aggiunto alla lista: {layer.name()} (ID: {layer.id()})", Qgis.Info)
+                self._logger.debug("Layer aggiunto alla lista: %s (ID: %s)", layer.name(), layer.id())
 
                 item = QTreeWidgetItem(parent_item)
                 item.setText(0, layer.name())
                 item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
                 item.setData(0, Qt.ItemDataRole.UserRole, layer.id())
 
+                self._refresh_fields_column(item, layer)
+
                 if layer.id() in previously_selected_layer_ids:
                     item.setCheckState(0, Qt.CheckState.Checked)
-                    self._log_message(f"[DEBUG] _add_children_to_tree: Layer pre-selezionato: {layer.name()}", Qgis.Info)
+                    self._logger.debug("_add_children_to_tree: Layer pre-selezionato: %s", layer.name())
                 else:
                     item.setCheckState(0, Qt.CheckState.Unchecked)
 
@@ -186,6 +277,38 @@ class MainDialog(QDialog):
                 # group_item.setFlags(group_item.flags() | Qt.ItemFlag.ItemIsTristate)
                 self._add_children_to_tree(child, group_item, previously_selected_layer_ids)
 
+    def _refresh_fields_column(self, item: QTreeWidgetItem, layer: QgsMapLayer) -> None:
+        """Mostra quanti campi del layer verranno esportati."""
+        if layer.type() != QgsMapLayer.VectorLayer:
+            return
+
+        total = layer.fields().count()
+        # Ignora i campi salvati che non esistono più nel layer
+        selected = [name for name in self._field_selection.get(layer.id(), []) if layer.fields().lookupField(name) >= 0]
+        if selected and len(selected) < total:
+            self._field_selection[layer.id()] = selected
+            item.setText(1, self.tr("{selected} of {total}").format(selected=len(selected), total=total))
+        else:
+            self._field_selection.pop(layer.id(), None)
+            item.setText(1, self.tr("All"))
+
+    def _on_layer_item_double_clicked(self, item: QTreeWidgetItem, column: int) -> None:
+        layer_id = item.data(0, Qt.ItemDataRole.UserRole)
+        layer = QgsProject.instance().mapLayer(layer_id) if layer_id else None
+        if not isinstance(layer, QgsVectorLayer):
+            return
+
+        dialog = FieldSelectionDialog(self, layer, self._field_selection.get(layer_id))
+        if dialog.exec_() != dialog.Accepted:
+            return
+
+        fields = dialog.selected_fields()
+        if fields:
+            self._field_selection[layer_id] = fields
+        else:
+            self._field_selection.pop(layer_id, None)
+        self._refresh_fields_column(item, layer)
+
     def _refresh_feature_label(self) -> None:
         if not self._selected_feature_ids:
             self._feature_label.setText(
@@ -201,6 +324,9 @@ class MainDialog(QDialog):
         if self._export_within_area_radio.isChecked():
             self._export_mode = "within_area"
             self._polygon_info_box.setEnabled(True)
+        elif self._export_atlas_radio.isChecked():
+            self._export_mode = "atlas"
+            self._polygon_info_box.setEnabled(True)
         else:
             self._export_mode = "all_features"
             self._polygon_info_box.setEnabled(False)
@@ -210,7 +336,7 @@ class MainDialog(QDialog):
         self._get_checked_layers_from_tree(self._layer_tree.invisibleRootItem())
 
         # Validazione basata sulla modalità selezionata
-        if self._export_mode == "within_area":
+        if self._export_mode in ("within_area", "atlas"):
             if not self._selected_feature_ids:
                 QMessageBox.warning(self, self.tr("Export Layers Within Area"), self.tr("No polygon selected."))
                 return
@@ -246,6 +372,18 @@ class MainDialog(QDialog):
     def layers_to_export(self) -> List[str]:
         return list(self._layers_to_export)
 
+    def field_selection(self) -> Dict[str, List[str]]:
+        """Restituisce i campi da esportare per i layer con un sottoinsieme di campi."""
+        return {layer_id: list(fields) for layer_id, fields in self._field_selection.items() if fields}
+
+    def selected_field_subsets(self) -> Dict[str, List[str]]:
+        """Restituisce i sottoinsiemi di campi dei soli layer selezionati per l'esportazione."""
+        return {
+            layer_id: list(fields)
+            for layer_id, fields in self._field_selection.items()
+            if fields and layer_id in self._layers_to_export
+        }
+
     def selected_polygon_layer(self) -> QgsVectorLayer:
         return self._polygon_layer
 
@@ -262,9 +400,4 @@ class MainDialog(QDialog):
         """Restituisce la modalità di esportazione selezionata."""
         return self._export_mode
 
-    def _log_message(self, message: str, level: Qgis.MessageLevel = Qgis.Info) -> None:
-        """Logga un messaggio solo se il logging è abilitato."""
-        if self._logging_enabled:
-            from qgis.core import QgsMessageLog
-            QgsMessageLog.logMessage(message, "ExportLayersWithinArea", level)
 
@@ -0,0 +1,118 @@
+"""Dialog con il piano di esportazione stimato."""
+
+from typing import List
+
+from qgis.PyQt.QtCore import Qt, QCoreApplication
+from qgis.PyQt.QtWidgets import (
+    QDialog,
+    QDialogButtonBox,
+    QHeaderView,
+    QLabel,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+from qgis.core import QgsMapLayer
+
+from .export_plan import LayerEstimate, format_duration, format_size, total_seconds
+
+
+class ExportPlanDialog(QDialog):
+    """Mostra per ogni layer le righe, la dimensione e la durata stimate dell'esportazione.
+
+    L'utente può deselezionare i layer più onerosi prima di avviare l'esportazione.
+    """
+
+    def tr(self, message: str) -> str:
+        """Traduzione delle stringhe."""
+        return QCoreApplication.translate("ExportPlanDialog", message)
+
+    def __init__(self, parent: QWidget, estimates: List[LayerEstimate], parallel_layers: int = 1) -> None:
+        super().__init__(parent)
+        self.setWindowTitle(self.tr("Export plan"))
+        self.resize(640, 420)
+        self._estimates = estimates
+        self._parallel_layers = parallel_layers
+
+        self._table = QTableWidget(len(estimates), 5, self)
+        self._table.setHorizontalHeaderLabels([
+            self.tr("Layer"),
+            self.tr("Rows in area"),
+            self.tr("Exported features"),
+            self.tr("Size"),
+            self.tr("Time"),
+        ])
+        self._table.verticalHeader().setVisible(False)
+        self._table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self._table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+
+        for row, estimate in enumerate(estimates):
+            name_item = QTableWidgetItem(estimate.layer.name())
+            name_item.setFlags(name_item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            name_item.setCheckState(Qt.CheckState.Checked)
+            self._table.setItem(row, 0, name_item)
+
+            if estimate.candidates is None:
+                # Raster e layer senza conteggio: non stimabili
+                values = ["–", "–", "–", "–"]
+            else:
+                prefix = "" if estimate.exact_count else "~"
+                values = [
+                    f"{prefix}{estimate.candidates:,}".replace(",", "."),
+                    f"~{estimate.features:,}".replace(",", "."),
+                    f"~{format_size(estimate.bytes)}",
+                    f"~{format_duration(estimate.seconds)}",
+                ]
+            for column, value in enumerate(values, start=1):
+                item = QTableWidgetItem(value)
+                item.setTextAlignment(int(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter))
+                self._table.setItem(row, column, item)
+        self._table.itemChanged.connect(self._refresh_totals)
+
+        hint_label = QLabel(
+            self.tr("Estimates are based on previous exports when available. "
+                    "Uncheck the layers you do not want to export."),
+            self,
+        )
+        hint_label.setWordWrap(True)
+        self._totals_label = QLabel(self)
+
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel,
+            self,
+        )
+        buttons.button(QDialogButtonBox.StandardButton.Ok).setText(self.tr("Start export"))
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        self._ok_button = buttons.button(QDialogButtonBox.StandardButton.Ok)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(hint_label)
+        layout.addWidget(self._table)
+        layout.addWidget(self._totals_label)
+        layout.addWidget(buttons)
+
+        self._refresh_totals()
+
+    def _checked_estimates(self) -> List[LayerEstimate]:
+        return [
+            estimate
+            for row, estimate in enumerate(self._estimates)
+            if self._table.item(row, 0).checkState() == Qt.CheckState.Checked
+        ]
+
+    def _refresh_totals(self, *args) -> None:
+        checked = self._checked_estimates()
+        size = sum(estimate.bytes or 0 for estimate in checked)
+        seconds = total_seconds(checked, self._parallel_layers)
+        self._totals_label.setText(
+            self.tr("Total: {layers} layers, about {size}, about {time}").format(
+                layers=len(checked), size=format_size(size), time=format_duration(seconds)
+            )
+        )
+        self._ok_button.setEnabled(bool(checked))
+
+    def selected_layers(self) -> List[QgsMapLayer]:
+        """Restituisce i layer lasciati selezionati dall'utente."""
+        return [estimate.layer for estimate in self._checked_estimates()]
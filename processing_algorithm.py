@@ -0,0 +1,300 @@
+"""Algoritmo Processing per esportare i layer nell'area senza interfaccia (anche da qgis_process)."""
+
+import os
+import re
+from typing import Set
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (
+    QgsFeatureRequest,
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingOutputFolder,
+    QgsProcessingOutputNumber,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterDefinition,
+    QgsProcessingParameterExpression,
+    QgsProcessingParameterFile,
+    QgsProcessingParameterFolderDestination,
+    QgsProcessingParameterMultipleLayers,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterString,
+    QgsProcessingParameterVectorLayer,
+    QgsProject,
+)
+
+from .export_layers_within_area_plugin import ExportLayersWithinAreaPlugin
+from .export_logger import ExportLogger
+from .exporter import ExportError, LayerExporter
+from .project_builder import ExportedProjectBuilder, ProjectBuildError
+
+# Limiti dei parametri numerici delle opzioni avanzate (come nel dialog di configurazione)
+_OPTION_RANGES = {
+    "max_parallel_layers": (1, 16),
+    "max_connections_per_host": (1, 16),
+    "tile_cache_min_zoom": (0, 22),
+    "tile_cache_max_zoom": (0, 22),
+}
+
+
+class ExportLayersWithinAreaAlgorithm(QgsProcessingAlgorithm):
+    """Esporta i layer nei poligoni indicati con le stesse opzioni del plugin.
+
+    I poligoni sono scelti per id e/o espressione invece che dalla selezione, e le
+    opzioni avanzate sono parametri dell'algoritmo con i valori predefiniti del
+    plugin, per cui esportazioni pianificate non dipendono dalle impostazioni utente.
+    """
+
+    PROJECT = "PROJECT"
+    POLYGON_LAYER = "POLYGON_LAYER"
+    FEATURE_IDS = "FEATURE_IDS"
+    EXPRESSION = "EXPRESSION"
+    LAYERS = "LAYERS"
+    OUTPUT_FOLDER = "OUTPUT_FOLDER"
+    EXPORT_NAME = "EXPORT_NAME"
+    ATLAS = "ATLAS"
+    CREATE_PROJECT = "CREATE_PROJECT"
+    OUTPUT = "OUTPUT"
+    EXPORTED_LAYERS = "EXPORTED_LAYERS"
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Progetto letto dal parametro PROJECT: deve restare in vita finché il contesto lo usa
+        self._loaded_project = None
+
+    def tr(self, message: str) -> str:
+        return QCoreApplication.translate("ExportLayersWithinAreaAlgorithm", message)
+
+    def createInstance(self) -> "ExportLayersWithinAreaAlgorithm":
+        return ExportLayersWithinAreaAlgorithm()
+
+    def flags(self):
+        # Progetti e layer del progetto appartengono al thread principale: niente thread in background
+        return super().flags() | QgsProcessingAlgorithm.FlagNoThreading
+
+    def name(self) -> str:
+        return "exportwithinarea"
+
+    def displayName(self) -> str:
+        return self.tr("Export layers within area")
+
+    def shortHelpString(self) -> str:
+        return self.tr(
+            "Exports the given layers limited to the features intersecting the chosen polygons, "
+            "like the plugin dialog. Polygons are chosen by feature ids and/or an expression; "
+            "without a polygon layer all features are exported. An optional project file is "
+            "loaded first, so layers can be referenced by name or id when running from qgis_process."
+        )
+
+    def _option_descriptions(self) -> dict:
+        return {
+            "server_side_filter": self.tr("Run the exact spatial test on the database when possible"),
+            "max_parallel_layers": self.tr("Layers exported in parallel"),
+            "max_connections_per_host": self.tr("Parallel queries per database server"),
+            "single_geopackage": self.tr("Write all layers into a single GeoPackage"),
+            "bulk_load": self.tr("Fast bulk load (build spatial index at the end)"),
+            "incremental": self.tr("Reuse outputs of layers unchanged since the previous export"),
+            "change_tracking_field": self.tr("Last modification field"),
+            "clip_rasters": self.tr("Clip file-based raster layers to the selection"),
+            "tile_cache": self.tr("Download XYZ tiles of the area for offline use"),
+            "tile_cache_min_zoom": self.tr("Minimum tile zoom level"),
+            "tile_cache_max_zoom": self.tr("Maximum tile zoom level"),
+            "related_tables_only": self.tr("Export only table rows related to the exported features"),
+        }
+
+    def initAlgorithm(self, config=None) -> None:
+        self.addParameter(QgsProcessingParameterFile(
+            self.PROJECT,
+            self.tr("QGIS project to load"),
+            behavior=QgsProcessingParameterFile.File,
+            fileFilter=self.tr("QGIS projects (*.qgs *.qgz)"),
+            optional=True,
+        ))
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.POLYGON_LAYER,
+            self.tr("Selection polygon layer"),
+            [QgsProcessing.TypeVectorPolygon],
+            optional=True,
+        ))
+        self.addParameter(QgsProcessingParameterString(
+            self.FEATURE_IDS,
+            self.tr("Polygon feature ids (comma separated)"),
+            optional=True,
+        ))
+        self.addParameter(QgsProcessingParameterExpression(
+            self.EXPRESSION,
+            self.tr("Polygon filter expression"),
+            parentLayerParameterName=self.POLYGON_LAYER,
+            optional=True,
+        ))
+        self.addParameter(QgsProcessingParameterMultipleLayers(
+            self.LAYERS,
+            self.tr("Layers to export"),
+            QgsProcessing.TypeMapLayer,
+        ))
+        self.addParameter(QgsProcessingParameterFolderDestination(
+            self.OUTPUT_FOLDER,
+            self.tr("Export folder"),
+        ))
+        self.addParameter(QgsProcessingParameterString(
+            self.EXPORT_NAME,
+            self.tr("Export directory name"),
+            optional=True,
+        ))
+        self.addParameter(QgsProcessingParameterBoolean(
+            self.ATLAS,
+            self.tr("One export per selected polygon (atlas)"),
+            False,
+        ))
+        self.addParameter(QgsProcessingParameterBoolean(
+            self.CREATE_PROJECT,
+            self.tr("Create a QGIS project with the exported layers"),
+            True,
+        ))
+
+        descriptions = self._option_descriptions()
+        for key, default in ExportLayersWithinAreaPlugin.EXPORT_OPTION_DEFAULTS.items():
+            description = descriptions.get(key, key)
+            if isinstance(default, bool):
+                parameter = QgsProcessingParameterBoolean(key.upper(), description, default)
+            elif isinstance(default, int):
+                minimum, maximum = _OPTION_RANGES.get(key, (0, 2147483647))
+                parameter = QgsProcessingParameterNumber(
+                    key.upper(), description, QgsProcessingParameterNumber.Integer, default,
+                    minValue=minimum, maxValue=maximum,
+                )
+            else:
+                parameter = QgsProcessingParameterString(key.upper(), description, default, optional=True)
+            parameter.setFlags(parameter.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+            self.addParameter(parameter)
+
+        self.addOutput(QgsProcessingOutputFolder(self.OUTPUT, self.tr("Export directory")))
+        self.addOutput(QgsProcessingOutputNumber(self.EXPORTED_LAYERS, self.tr("Exported layers")))
+
+    def processAlgorithm(self, parameters, context, feedback) -> dict:
+        project_path = self.parameterAsFile(parameters, self.PROJECT, context)
+        if not project_path:
+            return self._export(parameters, context, feedback)
+
+        # I layer indicati per nome o id vengono cercati nel progetto caricato, che
+        # appartiene all'algoritmo; al termine il contesto torna al progetto del chiamante
+        self._loaded_project = QgsProject()
+        if not self._loaded_project.read(project_path):
+            raise QgsProcessingException(
+                self.tr("Unable to read project {path}: {error}").format(
+                    path=project_path, error=self._loaded_project.error()
+                )
+            )
+        previous_project = context.project()
+        context.setProject(self._loaded_project)
+        feedback.pushInfo(self.tr("Project loaded: {path}").format(path=project_path))
+        try:
+            return self._export(parameters, context, feedback)
+        finally:
+            context.setProject(previous_project)
+
+    def _export(self, parameters, context, feedback) -> dict:
+        """Esporta i layer con il progetto del contesto (quello caricato da PROJECT, se indicato)."""
+        polygon_layer = self.parameterAsVectorLayer(parameters, self.POLYGON_LAYER, context)
+        polygon_features = []
+        if polygon_layer is not None:
+            polygon_features = self._polygon_features(parameters, context, polygon_layer)
+            feedback.pushInfo(self.tr("{count} selection polygons").format(count=len(polygon_features)))
+
+        layers = self.parameterAsLayerList(parameters, self.LAYERS, context)
+        if not layers:
+            raise QgsProcessingException(self.tr("No layers selected for export."))
+
+        output_folder = self.parameterAsString(parameters, self.OUTPUT_FOLDER, context)
+        os.makedirs(output_folder, exist_ok=True)
+
+        export_options = {}
+        for key, default in ExportLayersWithinAreaPlugin.EXPORT_OPTION_DEFAULTS.items():
+            if isinstance(default, bool):
+                export_options[key] = self.parameterAsBoolean(parameters, key.upper(), context)
+            elif isinstance(default, int):
+                export_options[key] = self.parameterAsInt(parameters, key.upper(), context)
+            else:
+                export_options[key] = self.parameterAsString(parameters, key.upper(), context).strip()
+
+        def layer_finished(layer, completed, total):
+            feedback.setProgress(completed * 100.0 / total)
+            feedback.pushInfo(self.tr("Layer {name} done ({completed}/{total})").format(
+                name=layer.name(), completed=completed, total=total
+            ))
+
+        logger = ExportLogger.from_settings()
+        try:
+            exporter = LayerExporter(
+                polygon_layer,
+                polygon_features,
+                layers,
+                output_folder,
+                self.parameterAsString(parameters, self.EXPORT_NAME, context),
+                cancellation_check=feedback.isCanceled,
+                layer_finished_callback=layer_finished,
+                logger=logger,
+                project=context.project(),
+                atlas=self.parameterAsBoolean(parameters, self.ATLAS, context),
+                **export_options
+            )
+            exported_data = exporter.export()
+        except ExportError as e:
+            raise QgsProcessingException(str(e))
+        finally:
+            logger.flush()
+
+        export_directory = exporter.get_export_directory()
+        feedback.pushInfo(self.tr("{count} layers exported to {path}").format(
+            count=len(exported_data), path=export_directory
+        ))
+        for area_directory, area_data in exporter.atlas_results():
+            feedback.pushInfo(self.tr("{count} layers exported to {path}").format(
+                count=len(area_data), path=area_directory
+            ))
+
+        if self.parameterAsBoolean(parameters, self.CREATE_PROJECT, context):
+            self._create_projects(context.project(), exporter, exported_data, logger, feedback)
+        return {self.OUTPUT: export_directory, self.EXPORTED_LAYERS: len(exported_data)}
+
+    def _create_projects(self, project, exporter, exported_data, logger, feedback) -> None:
+        """Crea il progetto esportato (uno per area in modalità atlante) dall'XML del progetto."""
+        outputs = exporter.atlas_results() or [(exporter.get_export_directory(), exported_data)]
+        try:
+            builder = ExportedProjectBuilder(project, logger)
+            for directory, data in outputs:
+                if data:
+                    project_path = builder.build(data, directory)
+                    feedback.pushInfo(self.tr("QGIS project created: {project_path}").format(project_path=project_path))
+        except ProjectBuildError as e:
+            feedback.reportError(str(e))
+        finally:
+            logger.flush()
+
+    def _polygon_features(self, parameters, context, polygon_layer) -> list:
+        """Poligoni di selezione indicati per id e/o espressione (tutti se nessuno dei due è indicato)."""
+        expression = self.parameterAsExpression(parameters, self.EXPRESSION, context)
+        feature_ids = self._parse_feature_ids(self.parameterAsString(parameters, self.FEATURE_IDS, context))
+
+        request = QgsFeatureRequest()
+        if expression:
+            request.setFilterExpression(expression)
+        elif feature_ids:
+            request.setFilterFids(sorted(feature_ids))
+
+        features = [
+            feature
+            for feature in polygon_layer.getFeatures(request)
+            if (not feature_ids or feature.id() in feature_ids)
+            and feature.hasGeometry() and not feature.geometry().isEmpty()
+        ]
+        if not features:
+            raise QgsProcessingException(self.tr("No polygon matches the given feature ids or expression."))
+        return features
+
+    def _parse_feature_ids(self, text: str) -> Set[int]:
+        try:
+            return {int(value) for value in re.split(r"[,;\s]+", text or "") if value}
+        except ValueError:
+            raise QgsProcessingException(self.tr("Invalid feature ids: {ids}").format(ids=text))
@@ -0,0 +1,25 @@
+"""Provider Processing del plugin, usabile anche da qgis_process."""
+
+import os
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.PyQt.QtGui import QIcon
+from qgis.core import QgsProcessingProvider
+
+from .processing_algorithm import ExportLayersWithinAreaAlgorithm
+
+
+class ExportLayersWithinAreaProvider(QgsProcessingProvider):
+    """Espone l'esportazione come algoritmo Processing, senza dialog né interfaccia."""
+
+    def id(self) -> str:
+        return "exportlayerswithinarea"
+
+    def name(self) -> str:
+        return QCoreApplication.translate("ExportLayersWithinAreaProvider", "Export Layers Within Area")
+
+    def icon(self) -> QIcon:
+        return QIcon(os.path.join(os.path.dirname(__file__), "icons", "export_map.svg"))
+
+    def loadAlgorithms(self) -> None:
+        self.addAlgorithm(ExportLayersWithinAreaAlgorithm())
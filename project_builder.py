@@ -0,0 +1,302 @@
+"""Creazione del progetto QGIS esportato modificando direttamente l'XML del progetto corrente."""
+
+import os
+import tempfile
+import zipfile
+from typing import List, Optional, Set, Tuple
+from xml.etree import ElementTree as ET
+
+from qgis.PyQt.QtXml import QDomDocument
+from qgis.core import Qgis, QgsMapLayer, QgsProject, QgsReadWriteContext
+
+from .export_logger import ExportLogger
+
+_DOCTYPE = "<!DOCTYPE qgis PUBLIC 'http://mrcc.com/qgis.dtd' 'SYSTEM'>\n"
+
+
+class ProjectBuildError(RuntimeError):
+    """Errore nella creazione del progetto esportato."""
+
+
+def project_xml(project: QgsProject) -> Tuple[bytes, str, Optional[bytes]]:
+    """Restituisce l'XML del progetto, la cartella rispetto a cui sono scritti i percorsi
+    relativi e il database degli auxiliary storage (.qgd), oppure None se il progetto non
+    ne ha (etichette spostate a mano, campi ausiliari).
+
+    Un progetto salvato e senza modifiche viene letto direttamente dal file (anche
+    .qgz). Altrimenti viene scritto una volta in un .qgs temporaneo non compresso,
+    che viene letto solo come testo: nessun layer viene ricaricato.
+
+    La scrittura di un progetto non salvato o modificato passa per QgsProject.write(),
+    che sposta il progetto aperto sul file temporaneo: nome del file e stato di
+    modifica vengono ripristinati subito dopo, e i segnali del progetto restano
+    bloccati per tutta l'operazione, così chi li ascolta (titolo della finestra,
+    progetti recenti, altri plugin) non vede né il file temporaneo né un salvataggio.
+    Di conseguenza i dati che altri plugin aggiungono al progetto tramite il segnale
+    writeProject non compaiono nel progetto esportato: salvando il progetto prima di
+    esportare viene invece letto il file salvato.
+    """
+    path = project.fileName()
+    if path and os.path.isfile(path) and not project.isDirty():
+        if path.lower().endswith(".qgz"):
+            with zipfile.ZipFile(path) as archive:
+                names = [name for name in archive.namelist() if name.lower().endswith(".qgs")]
+                if not names:
+                    raise ProjectBuildError(f"Nessun file .qgs nell'archivio {path}")
+                auxiliary_names = [name for name in archive.namelist() if name.lower().endswith(".qgd")]
+                auxiliary = archive.read(auxiliary_names[0]) if auxiliary_names else None
+                return archive.read(names[0]), os.path.dirname(path), auxiliary
+        with open(path, "rb") as project_file:
+            return project_file.read(), os.path.dirname(path), _read_auxiliary_storage(path)
+
+    # write() sposta il progetto sul nuovo file: nome e stato di modifica vengono ripristinati
+    was_dirty = project.isDirty()
+    signals_blocked = project.blockSignals(True)
+    with tempfile.TemporaryDirectory() as temp_directory:
+        temp_path = os.path.join(temp_directory, "project.qgs")
+        try:
+            if not project.write(temp_path):
+                raise ProjectBuildError(f"Impossibile salvare il progetto temporaneo: {project.error()}")
+        finally:
+            project.setFileName(path)
+            project.setDirty(was_dirty)
+            project.blockSignals(signals_blocked)
+        with open(temp_path, "rb") as project_file:
+            # Per un .qgs gli auxiliary storage vengono scritti accanto al progetto
+            return project_file.read(), temp_directory, _read_auxiliary_storage(temp_path)
+
+
+def _read_auxiliary_storage(project_path: str) -> Optional[bytes]:
+    """Contenuto del .qgd accanto a un progetto .qgs, oppure None se non esiste."""
+    auxiliary_path = f"{os.path.splitext(project_path)[0]}.qgd"
+    if not os.path.isfile(auxiliary_path):
+        return None
+    with open(auxiliary_path, "rb") as auxiliary_file:
+        return auxiliary_file.read()
+
+
+class ExportedProjectBuilder:
+    """Crea i progetti esportati a partire dall'XML del progetto corrente.
+
+    I layer non esportati vengono rimossi e le sorgenti di quelli esportati
+    sostituite a livello di XML, prima che qualsiasi provider venga caricato: la
+    durata non dipende dal numero di layer di database del progetto originale.
+    L'XML viene letto una sola volta e riusato per tutti i progetti (es. le aree
+    dell'atlante).
+    """
+
+    def __init__(self, project: QgsProject, logger: Optional[ExportLogger] = None) -> None:
+        self._logger = logger if logger is not None else ExportLogger.from_settings()
+        self._base_name = project.baseName() or "exported_project"
+        self._xml, self._source_directory, self._auxiliary_storage = project_xml(project)
+
+    def build(self, exported_data: List[Tuple[str, QgsMapLayer]], output_directory: str) -> str:
+        """Scrive in output_directory il progetto con i soli layer esportati e ne restituisce il percorso.
+
+        Args:
+            exported_data: Lista di tuple (percorso_file, layer_originale)
+            output_directory: Directory dove salvare il progetto
+        """
+        try:
+            root = ET.fromstring(self._xml)
+        except ET.ParseError as e:
+            raise ProjectBuildError(f"XML del progetto non valido: {str(e)}")
+
+        exported = {layer.id(): (path, layer) for path, layer in exported_data}
+        removed_ids = self._remove_layers(root, exported)
+        self._add_missing_layers(root, exported)
+        self._update_datasources(root, exported, output_directory)
+        self._remove_layer_references(root, removed_ids)
+        self._remove_empty_groups(root)
+
+        project_path = os.path.join(output_directory, f"{self._base_name}_exported.qgz")
+        self._write_qgz(root, project_path)
+
+        relations = root.find("relations")
+        self._logger.log(
+            f"Progetto esportato creato: {project_path} - Layer esportati: {len(exported)}, "
+            f"Layer nel progetto: {len(root.findall('projectlayers/maplayer'))}, "
+            f"Relazioni: {len(relations) if relations is not None else 0}",
+            Qgis.Info,
+        )
+        return project_path
+
+    def _remove_layers(self, root: ET.Element, exported: dict) -> Set[str]:
+        """Rimuove i layer non esportati e ne restituisce gli id."""
+        removed_ids = set()
+        removed_names = []
+        project_layers = root.find("projectlayers")
+        if project_layers is None:
+            return removed_ids
+        for map_layer in list(project_layers.findall("maplayer")):
+            layer_id = map_layer.findtext("id")
+            if layer_id in exported:
+                continue
+            removed_ids.add(layer_id)
+            removed_names.append(map_layer.findtext("layername") or layer_id)
+            project_layers.remove(map_layer)
+
+        if removed_names:
+            self._logger.log(f"Layer rimossi dal progetto esportato: {', '.join(removed_names)}", Qgis.Info)
+        return removed_ids
+
+    def _add_missing_layers(self, root: ET.Element, exported: dict) -> None:
+        """Aggiunge i layer esportati che non fanno parte del progetto.
+
+        Succede per i layer che Processing apre dai percorsi dei file (ad esempio con
+        qgis_process senza progetto): vengono serializzati con writeLayerXml e aggiunti
+        in fondo all'albero dei layer.
+        """
+        present = {map_layer.findtext("id") for map_layer in root.findall("projectlayers/maplayer")}
+        missing = [layer for layer_id, (_, layer) in exported.items() if layer_id not in present]
+        if not missing:
+            return
+
+        project_layers = root.find("projectlayers")
+        if project_layers is None:
+            project_layers = ET.SubElement(root, "projectlayers")
+        tree_root = root.find("layer-tree-group")
+        if tree_root is None:
+            tree_root = ET.SubElement(root, "layer-tree-group")
+        custom_order = tree_root.find("custom-order")
+
+        added = []
+        for layer in missing:
+            document = QDomDocument("qgis")
+            element = document.createElement("maplayer")
+            document.appendChild(element)
+            if not layer.writeLayerXml(element, document, QgsReadWriteContext()):
+                self._logger.warning(f"Layer {layer.name()} non serializzabile: escluso dal progetto esportato")
+                continue
+            project_layers.append(ET.fromstring(document.toString()))
+
+            tree_layer = ET.Element("layer-tree-layer", {
+                "id": layer.id(),
+                "name": layer.name(),
+                "source": layer.source(),
+                "providerKey": layer.providerType(),
+                "checked": "Qt::Checked",
+                "expanded": "1",
+            })
+            ET.SubElement(tree_layer, "customproperties")
+            if custom_order is not None:
+                # Il nuovo nodo precede l'ordine personalizzato, che resta in fondo al gruppo
+                tree_root.insert(list(tree_root).index(custom_order), tree_layer)
+                ET.SubElement(custom_order, "item").text = layer.id()
+            else:
+                tree_root.append(tree_layer)
+            added.append(layer.name())
+
+        if added:
+            self._logger.log(f"Layer esterni al progetto aggiunti al progetto esportato: {', '.join(added)}", Qgis.Info)
+
+    def _update_datasources(self, root: ET.Element, exported: dict, output_directory: str) -> None:
+        """Punta i layer esportati ai file creati; i percorsi relativi degli altri vengono resi assoluti."""
+        sources = {}
+        updated = []
+        for map_layer in root.findall("projectlayers/maplayer"):
+            layer_id = map_layer.findtext("id")
+            path, layer = exported[layer_id]
+            datasource = map_layer.find("datasource")
+            provider = map_layer.find("provider")
+
+            if layer.type() == QgsMapLayer.VectorLayer or (
+                layer.type() == QgsMapLayer.RasterLayer and path != layer.source()
+            ):
+                # Layer vettoriale o raster ritagliato: percorso relativo al nuovo progetto
+                new_source = self._relative_source(path, output_directory)
+                provider_key = "ogr" if layer.type() == QgsMapLayer.VectorLayer else "gdal"
+                if datasource is not None:
+                    datasource.text = new_source
+                if provider is not None:
+                    provider.text = provider_key
+                sources[layer_id] = (new_source, provider_key)
+                updated.append(layer.name())
+            elif datasource is not None and datasource.text:
+                # Layer referenziato: i percorsi relativi valevano per la posizione del progetto originale
+                datasource.text = self._absolute_source(datasource.text)
+                sources[layer_id] = (datasource.text, provider.text if provider is not None else None)
+
+        for tree_layer in root.iter("layer-tree-layer"):
+            source = sources.get(tree_layer.get("id"))
+            if source is not None:
+                tree_layer.set("source", source[0])
+                if source[1]:
+                    tree_layer.set("providerKey", source[1])
+
+        if updated:
+            self._logger.log(
+                f"Progetto esportato aggiornato: {len(updated)} layer ora puntano ai file esportati "
+                f"({', '.join(updated)})",
+                Qgis.Info,
+            )
+
+    @staticmethod
+    def _relative_source(path: str, output_directory: str) -> str:
+        file_path, separator, options = path.partition("|")
+        relative = os.path.relpath(file_path, output_directory).replace(os.sep, "/")
+        if not relative.startswith("../"):
+            relative = f"./{relative}"
+        return relative + separator + options
+
+    def _absolute_source(self, source: str) -> str:
+        file_path, separator, options = source.partition("|")
+        if not file_path.startswith(("./", "../")):
+            return source
+        absolute = os.path.normpath(os.path.join(self._source_directory, file_path))
+        return absolute.replace(os.sep, "/") + separator + options
+
+    @staticmethod
+    def _remove_layer_references(root: ET.Element, removed_ids: Set[str]) -> None:
+        """Rimuove dall'albero dei layer, dall'ordine personalizzato e dalle relazioni i layer eliminati."""
+        for parent in list(root.iter()):
+            for child in list(parent):
+                if child.tag == "layer-tree-layer" and child.get("id") in removed_ids:
+                    parent.remove(child)
+                elif child.tag == "item" and parent.tag == "custom-order" and child.text in removed_ids:
+                    parent.remove(child)
+
+        # Solo le relazioni tra layer entrambi esportati
+        for relations_tag in ("relations", "polymorphicRelations"):
+            relations = root.find(relations_tag)
+            if relations is None:
+                continue
+            for relation in list(relations):
+                if relation.get("referencingLayer") in removed_ids or relation.get("referencedLayer") in removed_ids:
+                    relations.remove(relation)
+
+    def _remove_empty_groups(self, root: ET.Element) -> None:
+        """Rimuove i gruppi dell'albero dei layer che non contengono più alcun layer."""
+        def has_layers(group: ET.Element) -> bool:
+            non_empty = False
+            for child in list(group):
+                if child.tag == "layer-tree-group":
+                    if has_layers(child):
+                        non_empty = True
+                    else:
+                        group.remove(child)
+                        self._logger.log(f"Gruppo vuoto rimosso: {child.get('name')}", Qgis.Info)
+                elif child.tag == "layer-tree-layer":
+                    non_empty = True
+            return non_empty
+
+        tree_root = root.find("layer-tree-group")
+        if tree_root is not None:
+            has_layers(tree_root)
+
+    def _write_qgz(self, root: ET.Element, project_path: str) -> None:
+        """Scrive il progetto compresso (.qgz) tramite un file temporaneo sostituito al termine.
+
+        Come QgsProject.write(), l'archivio contiene anche gli auxiliary storage (.qgd)
+        del progetto originale.
+        """
+        content = _DOCTYPE + ET.tostring(root, encoding="unicode")
+        temp_path = f"{project_path}.tmp"
+        try:
+            with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr(f"{self._base_name}_exported.qgs", content.encode("utf-8"))
+                if self._auxiliary_storage is not None:
+                    archive.writestr(f"{self._base_name}_exported.qgd", self._auxiliary_storage)
+            os.replace(temp_path, project_path)
+        except OSError as e:
+            raise ProjectBuildError(f"Impossibile salvare il progetto {project_path}: {str(e)}")
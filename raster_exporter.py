@@ -0,0 +1,126 @@
+"""Ritaglio dei layer raster su file sull'area di selezione."""
+
+import os
+import uuid
+from typing import Callable, Optional
+
+from osgeo import gdal, ogr, osr
+
+# Memoria massima usata da GDAL per ciascun blocco di elaborazione: la memoria
+# occupata dipende da questo valore e non dalla dimensione del raster sorgente
+RASTER_WARP_MEMORY_MB = 256
+
+# Le piramidi vengono generate finché il lato minore supera questa dimensione
+_OVERVIEW_MIN_SIZE = 256
+
+_GTIFF_CREATION_OPTIONS = [
+    "TILED=YES",
+    "BLOCKXSIZE=512",
+    "BLOCKYSIZE=512",
+    "COMPRESS=DEFLATE",
+    "BIGTIFF=IF_SAFER",
+    "NUM_THREADS=ALL_CPUS",
+]
+
+
+class RasterClipError(RuntimeError):
+    """Errore durante il ritaglio di un raster."""
+
+
+def clip_raster(
+    source_path: str,
+    output_path: str,
+    geometry_wkt: str,
+    crs_wkt: str,
+    cancellation_check: Optional[Callable[[], bool]] = None,
+) -> None:
+    """Ritaglia il raster sul poligono e lo scrive in un GeoTIFF tassellato e compresso.
+
+    Il ritaglio usa gdalwarp con linea di taglio: GDAL legge e scrive il raster a
+    finestre di al massimo RASTER_WARP_MEMORY_MB, elaborandole su più thread, per cui
+    anche un mosaico di decine di GB viene ritagliato con memoria limitata. Al termine
+    vengono costruite le piramidi interne.
+
+    Args:
+        source_path: Percorso del raster sorgente (qualsiasi formato GDAL)
+        output_path: Percorso del GeoTIFF da creare
+        geometry_wkt: Poligono di ritaglio in WKT, nel CRS del raster
+        crs_wkt: CRS del poligono in WKT
+        cancellation_check: Funzione che restituisce True se l'operazione va interrotta
+
+    Raises:
+        RasterClipError: Se il raster non può essere letto o scritto
+    """
+    source = gdal.Open(source_path)
+    if source is None:
+        raise RasterClipError(f"Impossibile aprire il raster {source_path}")
+
+    cutline_path = _write_cutline(geometry_wkt, crs_wkt)
+    try:
+        # Senza nodata l'area esterna al poligono viene resa trasparente con un canale alpha
+        has_nodata = source.GetRasterBand(1).GetNoDataValue() is not None
+
+        def progress(complete, message, data):
+            # Restituire 0 interrompe l'elaborazione di GDAL
+            return 0 if cancellation_check and cancellation_check() else 1
+
+        options = gdal.WarpOptions(
+            format="GTiff",
+            cutlineDSName=cutline_path,
+            cropToCutline=True,
+            dstAlpha=not has_nodata,
+            multithread=True,
+            warpMemoryLimit=RASTER_WARP_MEMORY_MB * 1024 * 1024,
+            warpOptions=["NUM_THREADS=ALL_CPUS", "OPTIMIZE_SIZE=YES"],
+            creationOptions=_GTIFF_CREATION_OPTIONS,
+            callback=progress,
+        )
+        result = gdal.Warp(output_path, source, options=options)
+        if result is None:
+            if cancellation_check and cancellation_check():
+                raise RasterClipError("Ritaglio raster cancellato dall'utente")
+            raise RasterClipError(f"Errore nel ritaglio del raster {source_path}: {gdal.GetLastErrorMsg()}")
+
+        _build_overviews(result)
+        result = None  # Chiude e scrive il file
+    finally:
+        source = None
+        gdal.Unlink(cutline_path)
+        for extension in (".shx", ".dbf", ".prj", ".cpg"):
+            gdal.Unlink(os.path.splitext(cutline_path)[0] + extension)
+
+
+def _write_cutline(geometry_wkt: str, crs_wkt: str) -> str:
+    """Scrive il poligono di ritaglio in un dataset in memoria (/vsimem) leggibile da gdalwarp."""
+    path = f"/vsimem/export_layers_cutline_{uuid.uuid4().hex}.shp"
+    srs = osr.SpatialReference()
+    srs.ImportFromWkt(crs_wkt)
+    srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    driver = ogr.GetDriverByName("ESRI Shapefile")
+    dataset = driver.CreateDataSource(path)
+    layer = dataset.CreateLayer("cutline", srs, ogr.wkbPolygon)
+    feature = ogr.Feature(layer.GetLayerDefn())
+    feature.SetGeometry(ogr.CreateGeometryFromWkt(geometry_wkt))
+    layer.CreateFeature(feature)
+    feature = None
+    dataset = None
+    return path
+
+
+def _build_overviews(dataset) -> None:
+    """Costruisce le piramidi interne del GeoTIFF."""
+    factors = []
+    factor = 2
+    while min(dataset.RasterXSize, dataset.RasterYSize) // factor >= _OVERVIEW_MIN_SIZE:
+        factors.append(factor)
+        factor *= 2
+    if not factors:
+        return
+
+    previous = gdal.GetThreadLocalConfigOption("COMPRESS_OVERVIEW", None)
+    gdal.SetThreadLocalConfigOption("COMPRESS_OVERVIEW", "DEFLATE")
+    try:
+        dataset.BuildOverviews("AVERAGE", factors)
+    finally:
+        gdal.SetThreadLocalConfigOption("COMPRESS_OVERVIEW", previous)
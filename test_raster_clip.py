@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Script di test per il ritaglio dei raster con molti poligoni di selezione adiacenti.
+
+Oltre POLYGON_INDEX_THRESHOLD poligoni la selezione non viene unita: la linea di
+taglio passata a GDAL deve comunque essere valida anche quando i poligoni
+condividono i lati, come le particelle catastali.
+
+Richiede un'installazione di QGIS con GDAL (viene avviata una QgsApplication senza interfaccia).
+"""
+
+import importlib
+import os
+import sys
+import tempfile
+
+from osgeo import gdal, osr
+from qgis.core import QgsApplication, QgsFeature, QgsGeometry, QgsRasterLayer, QgsRectangle, QgsVectorLayer
+
+# Il plugin usa import relativi: viene importato come pacchetto dalla cartella superiore
+plugin_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(plugin_dir))
+PLUGIN_PACKAGE = os.path.basename(plugin_dir)
+
+# Griglia di particelle quadrate adiacenti (in metri, EPSG:3857)
+GRID_COLUMNS = 10
+GRID_ROWS = 6
+CELL_SIZE = 100.0
+RASTER_PIXEL_SIZE = 10.0
+
+
+def _create_raster(path: str) -> None:
+    """Crea un GeoTIFF che copre la griglia con un margine di una particella."""
+    size = int((max(GRID_COLUMNS, GRID_ROWS) + 2) * CELL_SIZE / RASTER_PIXEL_SIZE)
+    dataset = gdal.GetDriverByName("GTiff").Create(path, size, size, 1, gdal.GDT_Byte)
+    dataset.SetGeoTransform((-CELL_SIZE, RASTER_PIXEL_SIZE, 0, size * RASTER_PIXEL_SIZE - CELL_SIZE, 0, -RASTER_PIXEL_SIZE))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(3857)
+    dataset.SetProjection(srs.ExportToWkt())
+    dataset.GetRasterBand(1).Fill(1)
+    dataset = None
+
+
+def _create_parcels() -> QgsVectorLayer:
+    layer = QgsVectorLayer("Polygon?crs=EPSG:3857", "parcels", "memory")
+    features = []
+    for column in range(GRID_COLUMNS):
+        for row in range(GRID_ROWS):
+            feature = QgsFeature()
+            feature.setGeometry(QgsGeometry.fromRect(QgsRectangle(
+                column * CELL_SIZE, row * CELL_SIZE, (column + 1) * CELL_SIZE, (row + 1) * CELL_SIZE
+            )))
+            features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+def test_clip_raster_adjacent_polygons():
+    """Test del ritaglio di un raster su più di POLYGON_INDEX_THRESHOLD poligoni adiacenti."""
+    exporter_module = importlib.import_module(f"{PLUGIN_PACKAGE}.exporter")
+    assert GRID_COLUMNS * GRID_ROWS > exporter_module.POLYGON_INDEX_THRESHOLD
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        raster_path = os.path.join(temp_dir, "dem.tif")
+        _create_raster(raster_path)
+        raster_layer = QgsRasterLayer(raster_path, "dem", "gdal")
+        assert raster_layer.isValid()
+
+        parcels = _create_parcels()
+        polygon_features = list(parcels.getFeatures())
+
+        # La raccolta dei poligoni adiacenti non è valida, la loro unione sì
+        collected = QgsGeometry.collectGeometry([feature.geometry() for feature in polygon_features])
+        assert not collected.isGeosValid()
+        areas = exporter_module._PreparedAreas([QgsGeometry(feature.geometry()) for feature in polygon_features])
+        assert areas.geometry.isGeosValid()
+
+        output_directory = os.path.join(temp_dir, "output")
+        os.makedirs(output_directory)
+        exporter = exporter_module.LayerExporter(
+            parcels, polygon_features, [raster_layer], output_directory, "parcels", clip_rasters=True
+        )
+        exported_data = exporter.export()
+
+        assert len(exported_data) == 1
+        output_path, _ = exported_data[0]
+        assert output_path.endswith(".tif") and os.path.exists(output_path)
+
+        # Il raster ritagliato copre esattamente la griglia delle particelle
+        clipped = gdal.Open(output_path)
+        assert clipped.RasterXSize == int(GRID_COLUMNS * CELL_SIZE / RASTER_PIXEL_SIZE), clipped.RasterXSize
+        assert clipped.RasterYSize == int(GRID_ROWS * CELL_SIZE / RASTER_PIXEL_SIZE), clipped.RasterYSize
+        clipped = None
+    print("✓ Ritaglio raster con molti poligoni adiacenti")
+
+
+if __name__ == "__main__":
+    app = QgsApplication([], False)
+    app.initQgis()
+    try:
+        test_clip_raster_adjacent_polygons()
+    finally:
+        app.exitQgis()
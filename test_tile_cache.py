@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Script di test per la cache offline delle tile (non richiede QGIS).
+
+Avvia un server HTTP locale che simula un servizio XYZ: alcune tile sono identiche
+(per verificare la deduplicazione), una risponde 503 al primo tentativo (per
+verificare i tentativi ripetuti) e una non esiste (404).
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Aggiungi il percorso del plugin
+plugin_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, plugin_dir)
+
+from tile_cache import MBTilesStore, build_tile_cache, count_tiles_in_bbox, fetch_tile, tiles_in_bbox  # noqa: E402
+
+EMPTY_TILE = b"\x89PNG empty tile"
+
+
+class _TileHandler(BaseHTTPRequestHandler):
+    requests_count = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.requests_count[self.path] = self.requests_count.get(self.path, 0) + 1
+            count = self.requests_count[self.path]
+
+        zoom, x, y = (int(part) for part in self.path.strip("/").split(".")[0].split("/"))
+        if (x, y) == (1, 1):
+            self.send_error(404)
+            return
+        if (x, y) == (0, 1) and count == 1:
+            self.send_error(503)
+            return
+
+        # Le tile con x pari sono tutte uguali (come le tile vuote di mare)
+        body = EMPTY_TILE if x % 2 == 0 else f"tile {zoom}/{x}/{y}".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _TileHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _fast_fetch(url, retries):
+    return fetch_tile(url, retries=retries, timeout=5, backoff=0.01)
+
+
+def test_tile_cache():
+    """Test del download, della deduplicazione e della ripresa della cache."""
+    server = _start_server()
+    template = f"http://127.0.0.1:{server.server_port}/{{z}}/{{x}}/{{y}}.png"
+    tiles = [(1, x, y) for x in range(2) for y in range(2)]
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "cache.mbtiles")
+
+            store = MBTilesStore(path)
+            stats = build_tile_cache(template, tiles, store, max_workers=4, fetcher=_fast_fetch)
+            store.close()
+            assert stats == {"downloaded": 3, "cached": 0, "deduplicated": 1, "missing": 1, "failed": 0}, stats
+
+            connection = sqlite3.connect(path)
+            assert connection.execute("SELECT COUNT(*) FROM tiles").fetchone()[0] == 3
+            assert connection.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 2
+            # Schema TMS: la tile XYZ (1, 1, 0) ha tile_row = 1
+            row = connection.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = 1 AND tile_column = 1 AND tile_row = 1"
+            ).fetchone()
+            assert row[0] == b"tile 1/1/0"
+            connection.close()
+
+            # Una seconda esecuzione scarica solo le tile mancanti
+            store = MBTilesStore(path)
+            stats = build_tile_cache(template, tiles, store, max_workers=4, fetcher=_fast_fetch)
+            store.close()
+            assert stats["cached"] == 3 and stats["downloaded"] == 0, stats
+    finally:
+        server.shutdown()
+        server.server_close()
+    print("✓ Cache tile")
+
+
+def test_tiles_in_bbox():
+    """Test del calcolo delle tile che coprono una bbox."""
+    assert list(tiles_in_bbox((-180, -85, 180, 85), 0, 0)) == [(0, 0, 0)]
+    assert len(list(tiles_in_bbox((-180, -85, 180, 85), 2, 2))) == 16
+    # Bbox piccola a cavallo del meridiano 11.25°, confine tra due tile a zoom 5
+    assert list(tiles_in_bbox((11.24, 43.76, 11.26, 43.78), 5, 5)) == [(5, 16, 11), (5, 17, 11)]
+    # Il conteggio aritmetico coincide con le tile enumerate
+    for bbox, min_zoom, max_zoom in [((-180, -85, 180, 85), 0, 4), ((11.1, 43.7, 11.3, 43.85), 10, 15)]:
+        assert count_tiles_in_bbox(bbox, min_zoom, max_zoom) == len(list(tiles_in_bbox(bbox, min_zoom, max_zoom)))
+    print("✓ Tile nella bbox")
+
+
+if __name__ == "__main__":
+    test_tiles_in_bbox()
+    test_tile_cache()
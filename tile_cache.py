@@ -0,0 +1,240 @@
+"""Cache offline delle tile XYZ in formato MBTiles.
+
+Il modulo non dipende da QGIS: calcola le tile da scaricare, le scarica in parallelo
+con tentativi ripetuti e le salva in un file MBTiles in cui le immagini identiche
+(es. mare o aree vuote) vengono memorizzate una sola volta.
+"""
+
+import hashlib
+import math
+import sqlite3
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+# Semiasse dello sferoide di Web Mercator (EPSG:3857)
+_EARTH_RADIUS = 6378137.0
+_ORIGIN_SHIFT = math.pi * _EARTH_RADIUS
+_MAX_LATITUDE = 85.0511287798066
+
+USER_AGENT = "QGIS-ExportLayersWithinArea"
+
+Tile = Tuple[int, int, int]  # (zoom, x, y) nello schema XYZ
+
+
+class TileCacheError(RuntimeError):
+    """Errore durante la creazione della cache delle tile."""
+
+
+def lonlat_to_tile(lon: float, lat: float, zoom: int) -> Tuple[int, int]:
+    """Restituisce la tile XYZ che contiene il punto (in gradi WGS84)."""
+    lat = max(-_MAX_LATITUDE, min(_MAX_LATITUDE, lat))
+    count = 2 ** zoom
+    x = int((lon + 180.0) / 360.0 * count)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * count)
+    return min(max(x, 0), count - 1), min(max(y, 0), count - 1)
+
+
+def tile_bounds_mercator(zoom: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Restituisce (xmin, ymin, xmax, ymax) della tile in EPSG:3857."""
+    size = 2 * _ORIGIN_SHIFT / (2 ** zoom)
+    xmin = -_ORIGIN_SHIFT + x * size
+    ymax = _ORIGIN_SHIFT - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def tiles_in_bbox(bbox_lonlat: Tuple[float, float, float, float], min_zoom: int, max_zoom: int) -> Iterator[Tile]:
+    """Genera le tile che coprono la bbox (lon_min, lat_min, lon_max, lat_max) ai livelli indicati."""
+    lon_min, lat_min, lon_max, lat_max = bbox_lonlat
+    for zoom in range(min_zoom, max_zoom + 1):
+        x_min, y_min = lonlat_to_tile(lon_min, lat_max, zoom)
+        x_max, y_max = lonlat_to_tile(lon_max, lat_min, zoom)
+        for x in range(x_min, x_max + 1):
+            for y in range(y_min, y_max + 1):
+                yield zoom, x, y
+
+
+def count_tiles_in_bbox(bbox_lonlat: Tuple[float, float, float, float], min_zoom: int, max_zoom: int) -> int:
+    """Numero di tile generate da tiles_in_bbox, calcolato dagli intervalli x/y di ogni livello."""
+    lon_min, lat_min, lon_max, lat_max = bbox_lonlat
+    count = 0
+    for zoom in range(min_zoom, max_zoom + 1):
+        x_min, y_min = lonlat_to_tile(lon_min, lat_max, zoom)
+        x_max, y_max = lonlat_to_tile(lon_max, lat_min, zoom)
+        count += max(0, x_max - x_min + 1) * max(0, y_max - y_min + 1)
+    return count
+
+
+def tile_url(template: str, tile: Tile) -> str:
+    """Compone l'URL di una tile da un modello XYZ ({x}, {y}, {z}, {-y} per lo schema TMS)."""
+    zoom, x, y = tile
+    return (
+        template.replace("{z}", str(zoom))
+        .replace("{x}", str(x))
+        .replace("{-y}", str(2 ** zoom - 1 - y))
+        .replace("{y}", str(y))
+    )
+
+
+class MBTilesStore:
+    """File MBTiles con deduplicazione delle immagini.
+
+    Usa lo schema a tabelle separate (map + images, con la vista tiles richiesta dalla
+    specifica): ogni immagine è salvata una volta sola, identificata dal suo hash.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS map (
+                zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT,
+                PRIMARY KEY (zoom_level, tile_column, tile_row)
+            );
+            CREATE TABLE IF NOT EXISTS images (tile_id TEXT PRIMARY KEY, tile_data BLOB);
+            CREATE VIEW IF NOT EXISTS tiles AS
+                SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column,
+                       map.tile_row AS tile_row, images.tile_data AS tile_data
+                FROM map JOIN images ON images.tile_id = map.tile_id;
+            """
+        )
+
+    def has_tile(self, tile: Tile) -> bool:
+        zoom, x, y = tile
+        cursor = self._connection.execute(
+            "SELECT 1 FROM map WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (zoom, x, self._tms_row(zoom, y)),
+        )
+        return cursor.fetchone() is not None
+
+    def add_tile(self, tile: Tile, data: bytes) -> bool:
+        """Salva la tile; restituisce True se l'immagine era già presente (deduplicata)."""
+        zoom, x, y = tile
+        tile_id = hashlib.sha1(data).hexdigest()
+        cursor = self._connection.execute(
+            "INSERT OR IGNORE INTO images (tile_id, tile_data) VALUES (?, ?)", (tile_id, sqlite3.Binary(data))
+        )
+        self._connection.execute(
+            "INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id) VALUES (?, ?, ?, ?)",
+            (zoom, x, self._tms_row(zoom, y), tile_id),
+        )
+        return cursor.rowcount == 0
+
+    def set_metadata(self, metadata: Dict[str, str]) -> None:
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)",
+            [(name, str(value)) for name, value in metadata.items()],
+        )
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.commit()
+        self._connection.close()
+
+    @staticmethod
+    def _tms_row(zoom: int, y: int) -> int:
+        # MBTiles usa lo schema TMS, con le righe numerate dal basso
+        return 2 ** zoom - 1 - y
+
+
+def fetch_tile(url: str, retries: int = 3, timeout: float = 30.0, backoff: float = 0.5) -> Optional[bytes]:
+    """Scarica una tile con tentativi ripetuti (attesa crescente tra un tentativo e l'altro).
+
+    Restituisce None se il server risponde 404/204 (tile inesistente).
+
+    Raises:
+        TileCacheError: Se la tile non può essere scaricata dopo tutti i tentativi
+    """
+    last_error = None
+    for attempt in range(retries):
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                if response.status == 204:
+                    return None
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            last_error = e
+            # Gli errori client (tranne il rate limiting) non migliorano ripetendo la richiesta
+            if 400 <= e.code < 500 and e.code != 429:
+                break
+        except (urllib.error.URLError, OSError) as e:
+            last_error = e
+
+        if attempt < retries - 1:
+            time.sleep(backoff * (2 ** attempt))
+
+    raise TileCacheError(f"Impossibile scaricare {url}: {last_error}")
+
+
+def build_tile_cache(
+    url_template: str,
+    tiles: Iterable[Tile],
+    store: MBTilesStore,
+    max_workers: int = 8,
+    retries: int = 3,
+    cancellation_check: Optional[Callable[[], bool]] = None,
+    fetcher: Callable[..., Optional[bytes]] = fetch_tile,
+) -> Dict[str, int]:
+    """Scarica le tile mancanti nel MBTiles usando più connessioni contemporanee.
+
+    Le tile già presenti nel file vengono saltate, così una cache interrotta può essere
+    completata rieseguendo l'operazione. Le scritture su SQLite avvengono solo nel thread
+    chiamante; al massimo 4 * max_workers download sono in attesa contemporaneamente.
+
+    Returns:
+        Statistiche: tile scaricate, già presenti, deduplicate, inesistenti e fallite
+    """
+    stats = {"downloaded": 0, "cached": 0, "deduplicated": 0, "missing": 0, "failed": 0}
+    max_pending = max_workers * 4
+    commit_every = 500
+
+    def store_result(tile: Tile, future) -> None:
+        try:
+            data = future.result()
+        except TileCacheError:
+            stats["failed"] += 1
+            return
+        if data is None:
+            stats["missing"] += 1
+            return
+        if store.add_tile(tile, data):
+            stats["deduplicated"] += 1
+        stats["downloaded"] += 1
+        if stats["downloaded"] % commit_every == 0:
+            store.commit()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for tile in tiles:
+            if cancellation_check and cancellation_check():
+                break
+            if store.has_tile(tile):
+                stats["cached"] += 1
+                continue
+
+            future = executor.submit(fetcher, tile_url(url_template, tile), retries)
+            pending[future] = tile
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    store_result(pending.pop(future), future)
+
+        if cancellation_check and cancellation_check():
+            for future in pending:
+                future.cancel()
+        for future in list(pending):
+            if not future.cancelled():
+                store_result(pending.pop(future), future)
+
+    store.commit()
+    return stats